@@ -13,6 +13,8 @@ from task_construction.get_api_signatures   import get_API_calls_from_funcnode
 from task_construction.api_extractor        import build_package_version_dict
 from task_construction.version_resolver     import get_all_dependencies
 from task_construction.arg_validity_checker import ArgumentsAnalyser
+from knowledge_builder.api_index           import APISignatureIndex, pinned_version
+from task_construction.version_range        import VersionRangeResolver
 
 DATA_BASE_DIR = GITHUB_CODE_DOWNLOAD_BASE_DIR
 REPAIR_TASK_DIR = os.path.join(RESULT_BASE_DIR, 'to_repair')
@@ -20,11 +22,17 @@ REPAIR_TASK_DIR = os.path.join(RESULT_BASE_DIR, 'to_repair')
 arg_parser = argparse.ArgumentParser()
 arg_parser.add_argument('-m', '--model', help='model name', type=str, required=True)
 arg_parser.add_argument('-f', '--func', help='complete function level tasks', action='store_true')
+arg_parser.add_argument('-i', '--index', help='API signature index snapshot (knowledge_builder/api_index.py or kb_snapshot.py)', type=str, default=None)
 
 # DB connection
 conn = pymysql.connect(**DB_CONFIG)
 cursor = conn.cursor()
 
+# 内存中的 API 签名索引，通过 --index 加载
+API_INDEX = None
+# 版本约束 -> 知识库中的版本列表
+VERSION_RESOLVER = VersionRangeResolver(conn)
+
 def get_task(tid):
     if API:
         cursor.execute(f"SELECT * FROM api_calls WHERE id={tid}" )
@@ -83,6 +91,22 @@ def get_normed_fqn(task, stmt, rtn_str=False):
     if rtn_str: return full_name, call_str, call_node
     else:       return full_name
 
+def lookup_gt_signature(task, gt_fqn):
+    """
+    从 API 签名索引中查询 GT API 在任务指定版本下的签名，查不到时返回 None
+    范围约束取满足约束、且包含该 API 的最新版本
+    """
+    if API_INDEX is None or not gt_fqn:
+        return None
+    tpl = gt_fqn.split('.')[0]
+    version = pinned_version(task.version)
+    versions = [version] if version else reversed(VERSION_RESOLVER.resolve(tpl, task.version))
+    for version in versions:
+        api_sig = API_INDEX.signature(tpl, version, gt_fqn)
+        if api_sig is not None:
+            return api_sig
+    return None
+
 def eval_task(pred_stmt, task):
     if not pred_stmt:
         return CompletionType.EMPTY, '', ''
@@ -117,7 +141,8 @@ def eval_task(pred_stmt, task):
         diff_arg_num  = ((len(pred_args['keyword_args'])+len(pred_args['positional_args']))!=(len(gt_args['keyword_args'])+len(gt_args['positional_args'])))
 
         if diff_keywords or diff_arg_num:
-            c_type, desc = get_completion_type(api_sig, pred_stmt, pred_fqn, gt_fqn)
+            gt_sig = lookup_gt_signature(task, gt_fqn) or api_sig
+            c_type, desc = get_completion_type(gt_sig, pred_stmt, pred_fqn, gt_fqn)
             return c_type, desc, pred_fqn
         else:
             return CompletionType.CR, '', ''
@@ -129,6 +154,9 @@ if __name__ == '__main__':
     MODEL = args.model
     API   = not args.func
     print(f'[LOG] Evaluating {MODEL} in 「{"API" if API else "Func"}」Level Tasks')
+    if args.index:
+        API_INDEX = APISignatureIndex.load(args.index)
+        print(f'[LOG] Loaded {len(API_INDEX)} API signatures from {args.index}')
 
     # init 
     v_types = ['pinned', 'range', 'unconstrained']
@@ -167,9 +195,11 @@ if __name__ == '__main__':
                 param_ids = set(a_ids['parameter'])
                 retn_ids  = set(a_ids['returntype'])
 
+        constraints = {}
         for todo in tqdm(todos):
             tid = todo[0]
             task = get_task(tid)
+            constraints[tid] = (task.tpl.split('.')[0], task.version)
 
             if API:
                 pred_stmt = todo[1]
@@ -221,9 +251,11 @@ if __name__ == '__main__':
                 and tid in pinned_ids\
                 and c_type == CompletionType.BCR:
                 
-                cursor.execute(f"SELECT api_name, parameters, has_return FROM {'api' if API else 'func'}_gt_info WHERE tid={tid}")
-                api_name, parameters, has_return = cursor.fetchone()
-                api_sig = (api_name, json.loads(parameters), True if has_return else False)
+                api_sig = lookup_gt_signature(task, get_normed_fqn(task, task.gt))
+                if api_sig is None:
+                    cursor.execute(f"SELECT api_name, parameters, has_return FROM {'api' if API else 'func'}_gt_info WHERE tid={tid}")
+                    api_name, parameters, has_return = cursor.fetchone()
+                    api_sig = (api_name, json.loads(parameters), True if has_return else False)
 
                 to_repair.append((tid, pred_stmt, _pred_fqn, desc, api_sig))
         
@@ -243,13 +275,19 @@ if __name__ == '__main__':
         ))
 
         if not OMIT:
+            # 约束能解析到知识库中至少一个版本的任务数
+            tids = list(constraints)
+            resolved = dict(zip(tids, VERSION_RESOLVER.resolve_many(constraints[tid] for tid in tids)))
+            v_id_sets = {'pinned': pinned_ids, 'range': range_ids, 'unconstrained': uncon_ids}
+
             print(f'## Version Constrain Type')
             data = []
             for v_t in v_types:
-                data.append([v_t] + v_cnt[v_t])
+                in_kb = sum(1 for tid in tids if tid in v_id_sets[v_t] and resolved[tid])
+                data.append([v_t] + v_cnt[v_t] + [in_kb])
             print(tabulate(
                 data, 
-                headers= ['Constrain Type'] + [m.name for m in CompletionType], 
+                headers= ['Constrain Type'] + [m.name for m in CompletionType] + ['IN KB'], 
                 tablefmt="simple", 
             ))
 
@@ -1,10 +1,16 @@
-import os
+import os, sys
 from pathlib import Path
 import shutil
+import tarfile
+import zipfile
 import tempfile
 import logging
+import argparse
 from packaging.version import parse as parse_version
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from knowledge_builder.source_provider import is_wanted_member, safe_member_parts
 
 log_file = 'unpack_log.txt'
 logging.basicConfig(
@@ -68,9 +74,85 @@ def unpack_single_package(project_path, packages_dir, ff):
     except Exception as e:
         logger.error(f"解压失败 {ff}: {e}")
 
-def main():
+"""
+stream 模式：直接从 tar / zip 中逐个读取成员写到目标目录，只保留源码、egg-info / dist-info 中的 top_level.txt / SOURCES.txt / RECORD 与 pyproject.toml，
+不经过临时目录拷贝；在进程池中执行（tar.gz 解压是 CPU 密集的），日志由主进程统一写入。
+保留哪些成员与 knowledge_builder/source_provider.py 直接读取归档时相同（is_wanted_member / safe_member_parts）。
+"""
+def iter_archive_members(src_file):
+    """逐个产出 (parts, is_dir, 打开成员的函数)，tar 按流读取，zip 按中央目录读取"""
+    if zipfile.is_zipfile(src_file):
+        with zipfile.ZipFile(src_file) as zf:
+            for info in zf.infolist():
+                yield info.filename, info.is_dir(), (lambda info=info: zf.open(info))
+    else:
+        with tarfile.open(src_file, mode='r|*') as tf:
+            for member in tf:
+                if member.isdir():
+                    yield member.name, True, None
+                elif member.isfile():
+                    # 流式读取时成员只能在迭代到它时读取
+                    yield member.name, False, (lambda member=member: tf.extractfile(member))
+
+def stream_unpack_single_package(project_path, packages_dir, ff):
+    """返回 (ff, 状态, 信息)，状态为 'skip' / 'ok' / 'error'"""
+    src_file = project_path / ff
+    version_folder_name = ff.replace('.zip', '').replace('.tar.gz', '')
+    dest_dir = packages_dir / version_folder_name
+
+    if dest_dir.exists():
+        return ff, 'skip', f"{ff} 已存在，跳过"
+
+    # 先写到同级的 .partial 目录，完成后再 rename，中断时不会留下不完整的 dest_dir
+    partial_dir = packages_dir / (version_folder_name + '.partial')
+    try:
+        if partial_dir.exists():
+            shutil.rmtree(partial_dir)
+        partial_dir.mkdir()
+
+        # 与 unpack_single_package 一致：归档内只有一个顶层目录时去掉这一层（按全部成员判断，而非只看保留的文件）
+        top_names, top_is_dir = set(), False
+        n_kept = 0
+        for name, is_dir, open_member in iter_archive_members(src_file):
+            parts = safe_member_parts(name)
+            if parts is None:
+                continue
+            top_names.add(parts[0])
+            if is_dir or len(parts) > 1:
+                top_is_dir = True
+            if is_dir or not is_wanted_member(parts):
+                continue
+
+            target = partial_dir.joinpath(*parts)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open_member() as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            n_kept += 1
+
+        if len(top_names) == 1 and top_is_dir:
+            inner = partial_dir / next(iter(top_names))
+            if inner.exists():
+                inner.rename(dest_dir)
+                shutil.rmtree(partial_dir)
+            else:
+                partial_dir.rename(dest_dir)
+        else:
+            partial_dir.rename(dest_dir)
+        return ff, 'ok', f"成功解压: {ff} ({n_kept} files)"
+    except Exception as e:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        return ff, 'error', f"解压失败 {ff}: {e}"
+
+def main(mode='stream', workers=None):
     tasks = []
-    with ThreadPoolExecutor(max_workers=8) as executor:
+    if mode == 'stream':
+        executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        unpack = stream_unpack_single_package
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers or 8)
+        unpack = unpack_single_package
+
+    with executor:
         for f in os.listdir(projects):
             project_path = Path(projects) / f
             packages_dir = Path(packages) / f
@@ -78,12 +160,19 @@ def main():
 
             if project_path.is_dir():
                 for ff in get_packages_path_order_by_time(project_path):
-                    future = executor.submit(unpack_single_package, project_path, packages_dir, ff)
+                    future = executor.submit(unpack, project_path, packages_dir, ff)
                     tasks.append(future)
 
         # 等待所有任务完成
         for future in as_completed(tasks):
-            future.result()
+            result = future.result()
+            if result is None:
+                continue
+            ff, status, msg = result
+            if status == 'error':
+                logger.error(msg)
+            else:
+                logger.info(msg)
 
     logger.info("全部解压完成！")
 
@@ -91,4 +180,10 @@ if __name__ == '__main__':
     current_folder = Path(__file__).resolve().parent
     projects = current_folder.parent / 'projects'
     packages = current_folder.parent / 'packages'
-    main()
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-m', '--mode', choices=['stream', 'copy'], default='stream',
+                            help='stream: extract only source files in a process pool; copy: unpack everything via a temp dir')
+    arg_parser.add_argument('-w', '--workers', type=int, default=None)
+    args = arg_parser.parse_args()
+    main(args.mode, args.workers)
@@ -0,0 +1,184 @@
+"""
+存储后端抽象：knowledge_builder/db.py 与 task_construction/db.py 通过 get_backend() 获取连接，
+由 global_config.DB_BACKEND 选择 MySQL（默认）或嵌入式 SQLite。
+
+两个 db 模块中的 SQL 按 MySQL 方言书写，SQLite 后端在执行前做少量改写：
+    %s                                   -> ?
+    INSERT IGNORE                        -> INSERT OR IGNORE
+    ON DUPLICATE KEY UPDATE c=VALUES(c)  -> ON CONFLICT DO UPDATE SET c=excluded.c  (SQLite >= 3.35)
+"""
+import os
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+
+from global_config import DB_BACKEND, DB_NAME, DB_CONFIG_BASE, SQLITE_PATH
+
+try:
+    import pymysql
+    IntegrityError = (sqlite3.IntegrityError, pymysql.IntegrityError)
+except ImportError:  # 只使用 SQLite 时可以不安装 pymysql
+    pymysql = None
+    IntegrityError = (sqlite3.IntegrityError,)
+
+
+class MySQLBackend:
+    name = 'mysql'
+
+    def __init__(self):
+        if pymysql is None:
+            raise ImportError("pymysql is required for the MySQL backend")
+
+    def create_database(self):
+        with pymysql.connect(**DB_CONFIG_BASE) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    CREATE DATABASE IF NOT EXISTS {DB_NAME}
+                    CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci
+                """)
+
+    def get_connection(self):
+        from db_pool import get_pool
+        return get_pool().connection()
+
+    def reserve_connections(self, n):
+        from db_pool import reserve_connections
+        reserve_connections(n)
+
+    def create_index(self, cursor, table, index_name, columns):
+        # 必须用 SHOW 判断，不支持 IF NOT EXISTS
+        cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index_name,))
+        if cursor.fetchone() is None:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table}({columns})")
+
+
+_RE_INSERT_IGNORE = re.compile(r'\bINSERT\s+IGNORE\b', re.I)
+_RE_ON_DUPLICATE = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.I)
+_RE_VALUES_REF = re.compile(r'\bVALUES\((\w+)\)', re.I)
+
+@lru_cache(maxsize=256)
+def translate_sql(sql):
+    """MySQL 方言 -> SQLite"""
+    sql = sql.replace('%s', '?')
+    sql = _RE_INSERT_IGNORE.sub('INSERT OR IGNORE', sql)
+    match = _RE_ON_DUPLICATE.search(sql)
+    if match:
+        update = _RE_VALUES_REF.sub(r'excluded.\1', sql[match.end():])
+        sql = sql[:match.start()] + 'ON CONFLICT DO UPDATE SET' + update
+    return sql
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._cursor.close()
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate_sql(sql), params or ())
+        return self._cursor.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate_sql(sql), seq_of_params)
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+
+class SQLiteConnection:
+    """接口与 pymysql 连接一致：默认 autocommit，begin()/commit()/rollback() 显式控制事务"""
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.rollback()
+        self.close()
+
+    def cursor(self):
+        return SQLiteCursor(self._conn.cursor())
+
+    def begin(self):
+        self._conn.execute("BEGIN")
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._wal_lock = threading.Lock()
+        self._wal_enabled = False
+
+    def create_database(self):
+        db_dir = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(db_dir, exist_ok=True)
+
+    def get_connection(self):
+        conn = SQLiteConnection(self.path)
+        if not self._wal_enabled:
+            # WAL 模式写入数据库文件后持久生效，每个进程只需设置一次
+            with self._wal_lock:
+                conn._conn.execute("PRAGMA journal_mode=WAL")
+                self._wal_enabled = True
+        return conn
+
+    def reserve_connections(self, n):
+        pass  # 每次 get_connection 新建连接，没有连接池
+
+    def create_index(self, cursor, table, index_name, columns):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}({columns})")
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+}
+
+_backend = None
+
+def set_backend(name, **kwargs):
+    """切换当前进程使用的后端（benchmark 等场景），返回新的后端"""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB backend: {name}, choose from {list(BACKENDS)}")
+    _backend = BACKENDS[name](**kwargs)
+    return _backend
+
+def get_backend():
+    if _backend is None:
+        set_backend(DB_BACKEND)
+    return _backend
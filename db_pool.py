@@ -0,0 +1,173 @@
+"""
+线程安全的有界 MySQL 连接池，knowledge_builder/db.py 与 task_construction/db.py 共用。
+
+get_connection() 返回的 PooledConnection 用法与 pymysql.Connection 相同：
+    with get_connection() as conn:
+        with conn.cursor() as cursor: ...
+with 块结束时连接归还到池中而不是关闭。
+
+规则：持有一个连接时不要再取第二个（包括调用内部自己取连接的 db 函数，需要时把 cursor 传进去）。
+每个使用者最多占一个连接时，只要池不小于并发的使用者数就不会互相等待；
+开线程池的调用方先用 reserve_connections(线程数) 把池扩到至少这么大（进程池中每个进程有自己的池）。
+"""
+import os
+import time
+import threading
+from collections import deque
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+from global_config import DB_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_PING_IDLE
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class PooledConnection:
+    """代理 pymysql.Connection，退出 with 块或 close() 时归还连接池"""
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._broken = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(exc, (pymysql.OperationalError, pymysql.InterfaceError)):
+            self._broken = True
+        self.close()
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.release(conn, self._broken)
+
+
+class ConnectionPool:
+    def __init__(self, connect_kwargs, size, timeout=60, ping_idle=30):
+        self.connect_kwargs = connect_kwargs
+        self.size = size
+        self.timeout = timeout
+        self.ping_idle = ping_idle
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._in_use = 0
+        self._idle = deque()  # (conn, 归还时间)
+
+    def ensure_size(self, min_size):
+        """把池扩到至少 min_size 个连接（只增不减），正在等待的使用者立即可用新名额"""
+        self._check_fork()
+        with self._lock:
+            if min_size > self.size:
+                self.size = min_size
+                self._lock.notify_all()
+
+    def _acquire_slot(self):
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            while self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"No free connection in {self.timeout}s (pool size {self.size})")
+                self._lock.wait(remaining)
+            self._in_use += 1
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_use -= 1
+            self._lock.notify()
+
+    def _check_fork(self):
+        # fork 出的子进程不能复用父进程的 socket，丢弃后重新建池
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _healthy(self, conn, idle_since):
+        if not conn.open:
+            return False
+        if time.monotonic() - idle_since < self.ping_idle:
+            return True
+        try:
+            conn.ping(reconnect=True)
+            return True
+        except pymysql.Error:
+            return False
+
+    def acquire(self):
+        self._check_fork()
+        self._acquire_slot()
+
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return PooledConnection(self, pymysql.connect(**self.connect_kwargs))
+                conn, idle_since = item
+                if self._healthy(conn, idle_since):
+                    return PooledConnection(self, conn)
+                self._discard(conn)
+        except Exception:
+            self._release_slot()
+            raise
+
+    def release(self, conn, broken=False):
+        if self._pid != os.getpid():
+            return  # 父进程的连接，不归还
+        try:
+            if not broken and conn.open and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                conn.rollback()  # 未提交的事务不能带给下一个使用者
+        except pymysql.Error:
+            broken = True
+
+        if broken or not conn.open:
+            self._discard(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        self._release_slot()
+
+    def connection(self):
+        return self.acquire()
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """进程内共享的连接池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_PING_IDLE)
+    return _pool
+
+def get_connection():
+    return get_pool().connection()
+
+def reserve_connections(n):
+    """保证连接池至少有 n 个连接：n 个线程各持有一个连接时不会等待池"""
+    get_pool().ensure_size(n)
@@ -19,3 +19,26 @@ DB_CONFIG = {
     **DB_CONFIG_BASE,
     "database": DB_NAME
 }
+
+# knowledge_builder: content-addressed AST parse cache (set to '' to disable)
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(RESULT_BASE_DIR, 'parse_cache'))
+
+# DB connection pool (shared by knowledge_builder/db.py and task_construction/db.py)
+# 每个使用者同一时刻最多持有一个连接（持有连接时不要再取第二个，把 cursor 传给内层函数）；
+# 线程池调用方用 reserve_connections(线程数) 把池扩到不小于线程数，这里只是下限
+DB_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", 16))
+DB_POOL_TIMEOUT = int(os.getenv("MYSQL_POOL_TIMEOUT", 60))      # 等待空闲连接的最长秒数
+DB_POOL_PING_IDLE = int(os.getenv("MYSQL_POOL_PING_IDLE", 30))  # 空闲超过该秒数的连接取出时先 ping
+
+# knowledge_builder: delete a version's api_signatures rows once its diff and api_lifetimes are written;
+# readers derive them from api_lifetimes (see knowledge_builder/api_lifetime.py, migrate existing DBs first)
+PRUNE_API_SIGNATURES = os.getenv("PRUNE_API_SIGNATURES", "0") == "1"
+
+# storage backend: "mysql" (default) or "sqlite" (single-node batch runs / CI)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(RESULT_BASE_DIR, f'{DB_NAME}.sqlite'))
+
+# task_construction: local PyPI release-date index used by version_resolver
+# (PYPI_OFFLINE=1: answer only from the index, e.g. one pre-seeded with `release_index.py load`)
+PYPI_RELEASE_INDEX = os.getenv("PYPI_RELEASE_INDEX", os.path.join(RESULT_BASE_DIR, 'pypi_releases.sqlite'))
+PYPI_OFFLINE = os.getenv("PYPI_OFFLINE", "0") == "1"
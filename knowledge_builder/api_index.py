@@ -0,0 +1,140 @@
+"""
+进程内的版本化 API 签名索引：(package, version, api_name) -> (params, has_return)
+
+一次性从数据库（api_signatures + top_level）或 pickle 快照构建，之后的查询都是内存中的 dict 查找，
+供 code_completion/eval.py 与 lightweight_repair 判断 "lib==V 中是否存在 API X、参数是什么"。
+package 既可以是 PyPI 包名，也可以是 top_level 中的导入名（如 scikit-learn / sklearn）。
+
+    python api_index.py -o ../data/api_index.pkl    # 从数据库构建并保存快照
+
+APISignatureIndex.load 也接受 kb_snapshot.py 导出的列式快照（mmap 打开，不需要整体读入内存）。
+"""
+import os, sys
+import json
+import pickle
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+try:
+    from kb_snapshot import KBSnapshot, is_snapshot
+    from api_lifetime import iter_derived_signatures
+except ImportError:  # 作为 knowledge_builder.api_index 导入
+    from knowledge_builder.kb_snapshot import KBSnapshot, is_snapshot
+    from knowledge_builder.api_lifetime import iter_derived_signatures
+
+_intern = sys.intern
+
+
+def pinned_version(constrain_str):
+    """'==1.2.3' / '~~1.2.3' -> '1.2.3'，范围约束返回 None"""
+    if not constrain_str:
+        return None
+    if constrain_str.startswith(('==', '~~')):
+        version = constrain_str[2:].strip()
+        if version and not any(op in version for op in [',', '<', '>', '=', '!', '*']):
+            return version
+    return None
+
+
+class APISignatureIndex:
+    def __init__(self):
+        self._apis = {}        # (package, version) -> {api_name: (params, has_return)}
+        self._top_levels = {}  # (top_level, version) -> package
+        self._entries = {}     # 相同的 (params, has_return) 只保存一份
+
+    def __len__(self):
+        return sum(len(apis) for apis in self._apis.values())
+
+    def add(self, package, version, api_name, params, has_return):
+        key = (_intern(package), _intern(version))
+        apis = self._apis.get(key)
+        if apis is None:
+            apis = self._apis[key] = {}
+        entry = (tuple(_intern(p) for p in params), bool(has_return))
+        apis[_intern(api_name)] = self._entries.setdefault(entry, entry)
+
+    def add_top_level(self, package, version, top_level):
+        if top_level and top_level != package:
+            self._top_levels[(_intern(top_level), _intern(version))] = _intern(package)
+
+    def _version_apis(self, package, version):
+        apis = self._apis.get((package, version))
+        if apis is None:
+            real_package = self._top_levels.get((package, version))
+            if real_package is not None:
+                apis = self._apis.get((real_package, version))
+        return apis
+
+    def get(self, package, version, api_name):
+        """返回 (params, has_return)，不存在时返回 None"""
+        apis = self._version_apis(package, version)
+        return apis.get(api_name) if apis is not None else None
+
+    def exists(self, package, version, api_name):
+        return self.get(package, version, api_name) is not None
+
+    def signature(self, package, version, api_name):
+        """返回与 api_gt_info 相同格式的 (api_name, [params], has_return)，不存在时返回 None"""
+        entry = self.get(package, version, api_name)
+        if entry is None:
+            return None
+        return (api_name, list(entry[0]), entry[1])
+
+    def has_version(self, package, version):
+        return self._version_apis(package, version) is not None
+
+    def versions(self, package):
+        versions = {v for (p, v) in self._apis if p == package}
+        versions |= {v for (t, v), p in self._top_levels.items() if t == package}
+        return versions
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump((self._apis, self._top_levels), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """path 为 kb_snapshot 导出的列式快照时直接 mmap 打开，返回具有相同查询接口的 KBSnapshot"""
+        if is_snapshot(path):
+            return KBSnapshot(path)
+        index = cls()
+        with open(path, 'rb') as f:
+            index._apis, index._top_levels = pickle.load(f)
+        return index
+
+    @classmethod
+    def from_db(cls, conn=None, batch_size=100000):
+        """conn 为空时使用 global_config 中配置的后端"""
+        if conn is None:
+            from db_backend import get_backend
+            with get_backend().get_connection() as conn:
+                return cls.from_db(conn, batch_size)
+
+        index = cls()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT package_name, package_version, api_name, parameters, has_return FROM api_signatures")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for package, version, api_name, params_json, has_return in rows:
+                    params = json.loads(params_json) if params_json else []
+                    index.add(package, version, api_name, params, has_return)
+            # 签名行已删除的版本（PRUNE_API_SIGNATURES）由 api_lifetimes 还原
+            for package, version, api_name, params_json, has_return in iter_derived_signatures(cursor):
+                index.add(package, version, api_name, json.loads(params_json), has_return)
+
+            cursor.execute("SELECT package_name, package_version, top_level FROM top_level")
+            for package, version, top_level in cursor.fetchall():
+                index.add_top_level(package, version, top_level)
+        return index
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-o', '--output', help='snapshot path', type=str, default='../data/api_index.pkl')
+    args = arg_parser.parse_args()
+
+    index = APISignatureIndex.from_db()
+    index.save(args.output)
+    print(f"Saved {len(index)} API signatures to {args.output}")
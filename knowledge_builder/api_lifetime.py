@@ -0,0 +1,329 @@
+"""
+API 生命周期（区间编码）存储。
+
+api_signatures 中每个 API 在每个版本各存一行；api_lifetimes 中每个不同的签名
+(api_name, parameters, has_return) 只存一行，intervals 记录其存在的 version_id 区间：
+    [[0, 3], [5, null]]   -> version_id 0,1,2 与 5 及之后的版本（左闭右开，null 表示至今仍存在）
+version_id 为 diff 阶段按 parse_version 顺序分配的序号（见 sniffer_thread.save_package_diff），
+生命周期由同一批 diff 结果（'=' / '+' / '-'）增量维护。
+
+查询：
+    signature_at(package, api_name, version)   # lib==V 中 api_name 的签名
+    versions_with_api(package, api_name)       # api_name 存在的所有版本
+    api_in_range(package, api_name, '>=1.2,<2.0')
+
+api_signatures 仍是抽取阶段写入、diff 阶段读取的中间表。PRUNE_API_SIGNATURES=1 时，版本的 diff 与生命周期
+在同一事务中写入后即删除该版本的签名行，存储才真正按签名数而不是 版本数 x API 数 增长；
+此后这些版本的签名由生命周期还原（derive_version_signatures），db.get_api_signatures、api_index、kb_snapshot
+读取时自动补上。已有数据库先迁移（为引入 api_lifetimes 之前 diff 的库重建生命周期，--prune 同时删除签名行）：
+    python api_lifetime.py migrate [-p requests numpy] [--prune]
+"""
+import os, sys
+import json
+import argparse
+import hashlib
+import contextlib
+
+from packaging.version import InvalidVersion
+from packaging.specifiers import SpecifierSet, InvalidSpecifier
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from db_backend import get_backend
+
+
+def signature_hash(api_name, params, has_return):
+    data = json.dumps([api_name, list(params), int(has_return)], ensure_ascii=False)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def contains(intervals, version_id):
+    for start, end in intervals:
+        if start <= version_id and (end is None or version_id < end):
+            return True
+    return False
+
+
+def intersect(intervals, lo, hi):
+    """intervals 与 [lo, hi) 的交集"""
+    result = []
+    for start, end in intervals:
+        s, e = max(start, lo), hi if end is None else min(end, hi)
+        if s < e:
+            result.append([s, e])
+    return result
+
+
+def to_intervals(version_ids):
+    """有序 version_id 列表 -> 区间列表"""
+    intervals = []
+    for vid in version_ids:
+        if intervals and intervals[-1][1] == vid:
+            intervals[-1][1] = vid + 1
+        else:
+            intervals.append([vid, vid + 1])
+    return intervals
+
+
+class LifetimeBuilder:
+    """在内存中按版本顺序应用 diff，维护每个签名的区间，并记录需要写回的签名"""
+    def __init__(self, lifetimes=None):
+        self.lifetimes = lifetimes or {}  # (api_name, params tuple, has_return) -> [[start, end]]
+        self.dirty = set()
+
+    def truncate(self, version_id):
+        """回退到 version_id 之前的状态，之后从 version_id 开始重新 apply"""
+        for sig, intervals in self.lifetimes.items():
+            kept = []
+            for start, end in intervals:
+                if start >= version_id:
+                    continue
+                if end is not None and end >= version_id:
+                    end = None  # 在 version_id-1 仍存在，是否延续由重放的 diff 决定
+                kept.append([start, end])
+            if kept != intervals:
+                self.lifetimes[sig] = kept
+                self.dirty.add(sig)
+
+    def apply(self, version_id, diff):
+        """diff: {(api_name, params, has_return): '=' / '+' / '-'}"""
+        for (api_name, params, has_return), flag in diff.items():
+            if not api_name:
+                continue  # 无变更版本的占位记录
+            sig = (api_name, tuple(params), int(has_return))
+            intervals = self.lifetimes.setdefault(sig, [])
+            is_open = bool(intervals) and intervals[-1][1] is None
+            if flag in ('=', '+'):
+                if not is_open:
+                    intervals.append([version_id, None])
+                    self.dirty.add(sig)
+            elif flag == '-' and is_open:
+                intervals[-1][1] = version_id
+                self.dirty.add(sig)
+
+    def copy(self):
+        return LifetimeBuilder({sig: [list(interval) for interval in intervals] for sig, intervals in self.lifetimes.items()})
+
+    def signatures_at(self, version_id):
+        """version_id 对应版本中存在的签名 [(api_name, params, has_return)]"""
+        return [sig for sig, intervals in self.lifetimes.items() if contains(intervals, version_id)]
+
+    def pop_dirty(self):
+        dirty = {sig: self.lifetimes.get(sig, []) for sig in self.dirty}
+        self.dirty = set()
+        return dirty
+
+
+def load_package_lifetimes(cursor, package_name):
+    cursor.execute(
+        "SELECT api_name, parameters, has_return, intervals FROM api_lifetimes WHERE package_name=%s",
+        (package_name,)
+    )
+    lifetimes = {}
+    for api_name, params_json, has_return, intervals in cursor.fetchall():
+        params = tuple(json.loads(params_json)) if params_json else ()
+        lifetimes[(api_name, params, int(has_return))] = json.loads(intervals)
+    return LifetimeBuilder(lifetimes)
+
+
+def save_package_lifetimes(cursor, package_name, dirty):
+    """写回有变化的签名；区间为空的签名删除"""
+    upserts, deletes = [], []
+    for (api_name, params, has_return), intervals in dirty.items():
+        sig_hash = signature_hash(api_name, params, has_return)
+        if intervals:
+            upserts.append((package_name, sig_hash, api_name, json.dumps(list(params)), has_return, json.dumps(intervals)))
+        else:
+            deletes.append((package_name, sig_hash))
+    if deletes:
+        cursor.executemany("DELETE FROM api_lifetimes WHERE package_name=%s AND sig_hash=%s", deletes)
+    if upserts:
+        cursor.executemany("""
+            INSERT INTO api_lifetimes (package_name, sig_hash, api_name, parameters, has_return, intervals)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE intervals=VALUES(intervals)
+        """, upserts)
+
+
+"""查询接口"""
+def _connection(conn):
+    """conn 为空时使用 global_config 中配置的后端；调用方传入的连接不在这里关闭"""
+    if conn is None:
+        return get_backend().get_connection()
+    return contextlib.nullcontext(conn)
+
+
+def get_version_ids(package_name, conn=None):
+    """返回按 version_id 排序的 [(version_id, version)]，只包含已完成 diff 的版本"""
+    with _connection(conn) as conn:
+        with conn.cursor() as cursor:
+            return version_ids(cursor, package_name)
+
+
+def version_ids(cursor, package_name):
+    # version_id 默认值为 0，未 diff 的版本（如待补录的旧版本）也是 0：只取 differences 中有记录的 top_level 行
+    cursor.execute("""
+        SELECT t.package_version, t.version_id FROM top_level t
+        WHERE t.package_name=%s AND EXISTS (SELECT 1 FROM differences d WHERE d.package_version=t.id)
+    """, (package_name,))
+    ids = {}
+    for version, version_id in cursor.fetchall():
+        ids[version] = max(version_id, ids.get(version, version_id))
+    return sorted((version_id, version) for version, version_id in ids.items())
+
+
+def _api_lifetimes(cursor, package_name, api_name):
+    cursor.execute("""
+        SELECT api_name, parameters, has_return, intervals FROM api_lifetimes
+        WHERE package_name=%s AND api_name=%s
+    """, (package_name, api_name))
+    return [
+        ((name, json.loads(params) if params else [], bool(has_return)), json.loads(intervals))
+        for name, params, has_return, intervals in cursor.fetchall()
+    ]
+
+
+def signature_at(package_name, api_name, version, conn=None):
+    """lib==version 中 api_name 的签名 (api_name, params, has_return)，不存在时返回 None"""
+    with _connection(conn) as conn:
+        ids = {v: vid for vid, v in get_version_ids(package_name, conn)}
+        if version not in ids:
+            return None
+        with conn.cursor() as cursor:
+            for sig, intervals in _api_lifetimes(cursor, package_name, api_name):
+                if contains(intervals, ids[version]):
+                    return sig
+    return None
+
+
+def versions_with_api(package_name, api_name, conn=None):
+    """api_name（任意签名）存在的所有版本，按版本顺序"""
+    with _connection(conn) as conn:
+        versions = get_version_ids(package_name, conn)
+        with conn.cursor() as cursor:
+            lifetimes = _api_lifetimes(cursor, package_name, api_name)
+    return [v for vid, v in versions if any(contains(intervals, vid) for _, intervals in lifetimes)]
+
+
+def spec_to_intervals(versions, spec):
+    """
+    versions: get_version_ids 的结果；spec: PEP 440 约束，如 '>=1.2,<2.0'
+    返回满足约束的 version_id 区间（连续范围约束只得到一个区间）
+    """
+    try:
+        spec_set = SpecifierSet(spec)
+    except InvalidSpecifier:
+        return []
+    matched = []
+    for vid, version in versions:
+        try:
+            if spec_set.contains(version, prereleases=True):
+                matched.append(vid)
+        except InvalidVersion:
+            continue
+    return to_intervals(matched)
+
+
+def api_in_range(package_name, api_name, spec, conn=None):
+    """
+    约束 spec 内 api_name 的各个签名及其所在版本：{(api_name, params, has_return): [version, ...]}
+    每个签名的区间与约束区间求交即可得到结果
+    """
+    with _connection(conn) as conn:
+        versions = get_version_ids(package_name, conn)
+        with conn.cursor() as cursor:
+            lifetimes = _api_lifetimes(cursor, package_name, api_name)
+
+    id2version = dict(versions)
+    result = {}
+    for lo, hi in spec_to_intervals(versions, spec):
+        for (name, params, has_return), intervals in lifetimes:
+            for start, end in intersect(intervals, lo, hi):
+                sig = (name, tuple(params), has_return)
+                result.setdefault(sig, []).extend(id2version[vid] for vid in range(start, end) if vid in id2version)
+    return result
+
+
+"""由生命周期还原已删除的 api_signatures 行"""
+def pruned_versions(cursor, package_name=None):
+    """已 diff（top_level 中有记录）但 api_signatures 中没有签名行的版本：{package: [version]}"""
+    sql = """
+        SELECT DISTINCT t.package_name, t.package_version FROM top_level t
+        WHERE NOT EXISTS (SELECT 1 FROM api_signatures s
+                          WHERE s.package_name=t.package_name AND s.package_version=t.package_version)
+    """
+    if package_name is None:
+        cursor.execute(sql)
+    else:
+        cursor.execute(sql + " AND t.package_name=%s", (package_name,))
+    result = {}
+    for package, version in cursor.fetchall():
+        result.setdefault(package, []).append(version)
+    return result
+
+
+def derive_version_signatures(cursor, package_name, versions):
+    """{version: [(api_name, params, has_return)]}，没有 version_id 的版本不在结果中"""
+    ids = {version: vid for vid, version in version_ids(cursor, package_name)}
+    lifetimes = load_package_lifetimes(cursor, package_name)
+    return {version: lifetimes.signatures_at(ids[version]) for version in versions if version in ids}
+
+
+def iter_derived_signatures(cursor, package_name=None):
+    """已删除签名行的版本，按 api_signatures 的列产出 (package, version, api_name, parameters, has_return)"""
+    for package, versions in pruned_versions(cursor, package_name).items():
+        for version, sigs in derive_version_signatures(cursor, package, versions).items():
+            for api_name, params, has_return in sigs:
+                yield package, version, api_name, json.dumps(list(params)), has_return
+
+
+"""迁移"""
+def rebuild_package_lifetimes(cursor, package_name, prune=False):
+    """
+    按 version_id 顺序重放 package 已 diff 的版本，重建其全部生命周期（给 api_lifetimes 之前 diff 的库补数据）。
+    已删除签名行的版本由现有的生命周期还原；prune 时随后删除这些版本的签名行。返回 (版本数, 签名数)
+    """
+    versions = version_ids(cursor, package_name)
+    pruned = set(pruned_versions(cursor, package_name).get(package_name, ()))
+    existing = load_package_lifetimes(cursor, package_name)
+
+    builder, base = LifetimeBuilder(), set()
+    for vid, version in versions:
+        if version in pruned:
+            current = set(existing.signatures_at(vid))
+        else:
+            cursor.execute("SELECT api_name, parameters, has_return FROM api_signatures WHERE package_name=%s AND package_version=%s",
+                           (package_name, version))
+            current = {(api_name, tuple(json.loads(params)) if params else (), int(has_return))
+                       for api_name, params, has_return in cursor.fetchall()}
+        diff = {sig: '=' for sig in current}
+        diff.update({sig: '-' for sig in base - current})
+        builder.apply(vid, diff)
+        base = current
+
+    cursor.execute("DELETE FROM api_lifetimes WHERE package_name=%s", (package_name,))
+    save_package_lifetimes(cursor, package_name, builder.pop_dirty())
+    if prune:
+        cursor.executemany("DELETE FROM api_signatures WHERE package_name=%s AND package_version=%s",
+                           [(package_name, version) for _, version in versions])
+    return len(versions), len(builder.lifetimes)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    sub_parsers = arg_parser.add_subparsers(dest='command', required=True)
+    p = sub_parsers.add_parser('migrate', help='rebuild api_lifetimes from api_signatures for already-diffed packages')
+    p.add_argument('-p', '--packages', help='packages to migrate (default: every package in top_level)', nargs='*', default=None)
+    p.add_argument('--prune', help='delete the api_signatures rows of the migrated versions afterwards', action='store_true')
+    args = arg_parser.parse_args()
+
+    with get_backend().get_connection() as conn:
+        with conn.cursor() as cursor:
+            packages = args.packages
+            if not packages:
+                cursor.execute("SELECT DISTINCT package_name FROM top_level")
+                packages = [row[0] for row in cursor.fetchall()]
+            for package in packages:
+                conn.begin()
+                n_versions, n_sigs = rebuild_package_lifetimes(cursor, package, args.prune)
+                conn.commit()
+                print(f"{package}: {n_versions} versions -> {n_sigs} signatures{' (api_signatures pruned)' if args.prune else ''}")
@@ -0,0 +1,44 @@
+"""
+内存中的 API 签名记录，抽取、diff 与写库全程使用，不再经过 "限定名,参数;参数,返回标志" 字符串来回转换。
+
+    sig = make_signature('requests.api.get', ['url', 'params'], 1)
+    sig.api_name, sig.parameters, sig.has_return
+
+APISignature 是 NamedTuple，与普通元组 (限定名, 参数元组, 返回标志) 相等、哈希相同，可直接作为集合元素参与 diff。
+make_signature 对限定名和参数名做 sys.intern，相同的参数列表共享同一个元组：
+同一个包相邻版本的绝大多数签名相同，每个版本只多出列表与 NamedTuple 本身的开销。
+"""
+import sys
+from typing import NamedTuple, Tuple
+
+
+class APISignature(NamedTuple):
+    api_name: str
+    parameters: Tuple[str, ...]
+    has_return: int
+
+
+# 参数元组的共享表；长时间运行的进程中超过上限后清空，已创建的签名不受影响
+MAX_SHARED_PARAMETERS = 500000
+_parameters = {(): ()}
+
+
+def intern_parameters(params):
+    params = tuple(params)
+    shared = _parameters.get(params)
+    if shared is None:
+        if len(_parameters) >= MAX_SHARED_PARAMETERS:
+            _parameters.clear()
+        shared = _parameters[params] = tuple(sys.intern(p) for p in params)
+    return shared
+
+
+def make_signature(api_name, params, has_return):
+    return APISignature(sys.intern(api_name), intern_parameters(params), 1 if has_return else 0)
+
+
+def as_signature(api):
+    """(api_name, params, has_return) 形式的列表 / 元组 / 数据库行 -> APISignature"""
+    if type(api) is APISignature:
+        return api
+    return make_signature(*api)
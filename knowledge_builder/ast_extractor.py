@@ -0,0 +1,174 @@
+"""
+单次遍历的 AST 签名抽取器。
+
+sniffer 的 SourceVisitor + get_keywords 对每个函数再跑一次 ast.walk 判断 return，
+parse_import 又对整棵模块树 ast.walk 一遍；get_all_apis_update 的 has_return_value 也是如此。
+extract_module 只遍历一次模块树，同时得到：
+    - cargo:    与 SourceVisitor.result 相同的 {函数名: (args, has_return)} / {类名: {方法名: ...}}
+    - imports:  与 parse_import 相同的 {module 或 level: [names]}
+    - defs:     与 get_all_apis_from_source 相同范围的 [(相对限定名, FunctionInfo)]（模块级函数 + 类的直接方法）
+    - import_froms: 按 ast.walk 顺序排列的 ImportFrom 节点
+
+return 标志按子节点向外层函数传播：外层函数的标志 = 自身的 return | 嵌套函数的标志，
+与对每个函数单独 ast.walk 的结果一致。
+函数定义、类定义、return 与 import 都是语句，表达式中不会出现语句，因此只需沿语句列表
+（body / orelse / finalbody / handlers / cases）遍历，不必进入表达式子树。
+"""
+import ast
+from typing import NamedTuple, Tuple, Optional
+
+
+class FunctionInfo(NamedTuple):
+    name: str
+    posonlyargs: Tuple[str, ...]
+    args: Tuple[str, ...]
+    kwonlyargs: Tuple[str, ...]
+    vararg: Optional[str]
+    kwarg: Optional[str]
+    defaults: Tuple[str, ...]       # 带默认值的参数名（位置参数与 kwonly 参数）
+    has_return: bool                # 任意 return（含嵌套函数），同 sniffer.get_keywords
+    has_return_value: bool          # 带值的 return（含嵌套函数），同 get_all_apis_update.has_return_value
+
+    def keywords(self):
+        """sniffer.get_keywords 的格式"""
+        return (list(self.args), int(self.has_return))
+
+    def parameters(self):
+        """get_all_apis_update.extract_parameters 的格式"""
+        params = list(self.args) + list(self.kwonlyargs)
+        if self.vararg:
+            params.append(self.vararg)
+        if self.kwarg:
+            params.append(self.kwarg)
+        return params
+
+
+class ModuleInfo:
+    __slots__ = ('cargo', 'imports', 'defs', 'import_froms')
+
+    def __init__(self, cargo, imports, defs, import_froms):
+        self.cargo = cargo
+        self.imports = imports
+        self.defs = defs
+        self.import_froms = import_froms
+
+
+def _function_info(node, has_return, has_return_value):
+    args = node.args
+    positional = [a.arg for a in args.posonlyargs] + [a.arg for a in args.args]
+    defaults = positional[len(positional) - len(args.defaults):] if args.defaults else []
+    defaults += [a.arg for a, d in zip(args.kwonlyargs, args.kw_defaults) if d is not None]
+    return FunctionInfo(
+        node.name,
+        tuple(a.arg for a in args.posonlyargs),
+        tuple(a.arg for a in args.args),
+        tuple(a.arg for a in args.kwonlyargs),
+        args.vararg.arg if args.vararg else None,
+        args.kwarg.arg if args.kwarg else None,
+        tuple(defaults),
+        has_return,
+        has_return_value,
+    )
+
+
+def _import_map(import_froms):
+    """与 parse_import 相同（包括 `from . import x` 第二次出现时多出的 None 键）"""
+    module_item_dict = {}
+    for node in import_froms:
+        if node.module is None and node.level not in module_item_dict:
+            module_item_dict[node.level] = []
+        elif node.module not in module_item_dict:
+            module_item_dict[node.module] = []
+        for alias in node.names:
+            if node.module is None:
+                module_item_dict[node.level].append(alias.name)
+            else:
+                module_item_dict[node.module].append(alias.name)
+    return module_item_dict
+
+
+# 记录作用域的类型：模块级（SourceVisitor）/ 类内（ClassVisitor）
+_MODULE, _CLASS = 0, 1
+_EXIT = object()
+
+# 语句节点中可能包含语句的字段，按 _fields 顺序（与 ast.iter_child_nodes 一致）
+_BLOCK_FIELDS = ('body', 'handlers', 'orelse', 'finalbody', 'cases')
+_block_fields_cache = {}
+
+def _block_fields(node_type):
+    fields = _block_fields_cache.get(node_type)
+    if fields is None:
+        fields = _block_fields_cache[node_type] = tuple(f for f in node_type._fields if f in _BLOCK_FIELDS)
+    return fields
+
+
+def extract_module(tree):
+    cargo = {}
+    infos = {}         # FunctionDef 节点 -> FunctionInfo
+    import_froms = []  # (depth, 先序编号, node)
+    flags = []         # 正在遍历的函数的 [has_return, has_return_value]，栈
+
+    order = 0
+    # (node, depth, scope, scope_kind)；scope 为 None 表示在已记录的函数内部，不再记录定义
+    stack = [(tree, 0, cargo, _MODULE)]
+    while stack:
+        item = stack.pop()
+        if item[0] is _EXIT:
+            _, node, scope, name = item
+            has_return, has_return_value = flags.pop()
+            if flags:
+                flags[-1][0] |= has_return
+                flags[-1][1] |= has_return_value
+            info = infos[node] = _function_info(node, has_return, has_return_value)
+            if scope is not None and isinstance(node, ast.FunctionDef):
+                scope[name] = info.keywords()
+            continue
+
+        node, depth, scope, kind = item
+        order += 1
+        child_scope, child_kind = scope, kind
+
+        if isinstance(node, ast.FunctionDef):
+            if scope is not None:
+                scope[node.name] = None  # 先占位，保持与 visitor 相同的插入顺序
+            flags.append([False, False])
+            stack.append((_EXIT, node, scope, node.name))
+            child_scope = None
+        elif isinstance(node, ast.AsyncFunctionDef):
+            # visitor 没有 visit_AsyncFunctionDef，会继续进入其内部记录定义
+            flags.append([False, False])
+            stack.append((_EXIT, node, None, node.name))
+        elif isinstance(node, ast.ClassDef):
+            if scope is not None and kind == _MODULE:
+                child_scope, child_kind = {}, _CLASS
+                scope[node.name] = child_scope
+            # 类内的嵌套类：ClassVisitor 会把其中的方法平铺记录到外层类
+        elif isinstance(node, ast.Return):
+            if flags:
+                flags[-1][0] = True
+                if node.value is not None:
+                    flags[-1][1] = True
+        elif isinstance(node, ast.ImportFrom):
+            import_froms.append((depth, order, node))
+
+        children = []
+        for field in _block_fields(type(node)):
+            children.extend(getattr(node, field))
+        for child in reversed(children):
+            stack.append((child, depth + 1, child_scope, child_kind))
+
+    # ast.walk 是广度优先：同一深度内的先后与先序一致
+    import_froms = [node for _, _, node in sorted(import_froms, key=lambda x: (x[0], x[1]))]
+
+    defs = []
+    body = getattr(tree, 'body', [])
+    for node in body:
+        if isinstance(node, ast.FunctionDef):
+            defs.append((node.name, infos[node]))
+    for node in body:
+        if isinstance(node, ast.ClassDef):
+            for m in node.body:
+                if isinstance(m, ast.FunctionDef):
+                    defs.append((f"{node.name}.{m.name}", infos[m]))
+
+    return ModuleInfo(cargo, _import_map(import_froms), defs, import_froms)
@@ -0,0 +1,609 @@
+"""
+knowledge_builder 性能基准
+
+    # 比较 MySQL / SQLite 后端的写入与查询吞吐（同一份数据集）
+    python benchmark.py backends -r ../packages -p requests
+    python benchmark.py backends --synthetic 50 2000 -b sqlite
+
+    # 内存签名索引（api_index）的构建耗时与点查吞吐
+    python benchmark.py index --synthetic 200 20000
+
+    # export_map 前缀索引 vs 逐条 fnmatch 扫描（get_all_apis_update.get_all_exposed_paths）
+    python benchmark.py exports -d ../packages/numpy/numpy-1.21.0
+    python benchmark.py exports --synthetic 2000 20000
+
+    # 单次遍历的 ast_extractor vs SourceVisitor + parse_import + has_return_value
+    python benchmark.py extract -d ../packages/numpy
+
+    # 每个版本的签名列表：原 "限定名,参数;参数,返回标志" 字符串拆分 vs 驻留的 APISignature
+    python benchmark.py signatures -r ../packages -p requests
+    python benchmark.py signatures --synthetic 50 20000
+
+    # ModuleIndex vs 原 Tree + go_to_that_node（sniffer_thread.process_single_module 的 import 解析），
+    # 以及单趟 re-export 传播 vs 不动点传播（resolve_exports）的覆盖与内存
+    python benchmark.py modules -d ../packages/botocore/botocore-1.31.0/botocore
+    python benchmark.py modules --synthetic 40 200
+
+    # 列式 mmap 快照（kb_snapshot）vs pickle 快照（api_index）：打开耗时、常驻内存与点查吞吐
+    python benchmark.py snapshot --synthetic 200 20000
+"""
+import io
+import os
+import ast
+import time
+import gc
+import random
+import fnmatch
+import argparse
+import pickle
+import tempfile
+import contextlib
+import tracemalloc
+
+import db
+import db_backend
+from sniffer_thread import list_package_versions, extract_version_apis
+from sniffer_thread import parse_source_bytes, make_API_signatures
+from api_index import APISignatureIndex
+from kb_snapshot import SnapshotWriter, KBSnapshot
+from get_all_apis_update import ExportMap, build_export_map, get_all_sources_module_from_package_dir
+from get_all_apis_update import extract_parameters, has_return_value
+from ast_extractor import extract_module
+from module_index import ModuleIndex, SKIP_DIRS, is_private_module
+from api_signature import make_signature
+import sniffer as legacy
+
+BENCH_PACKAGE = '__bench__'
+
+
+def load_dataset(root_dir, package_name):
+    """从解压后的包目录中抽取所有版本的签名：{version: [[api, params, has_return]]}"""
+    dataset = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for version, v_dir in list_package_versions(package_name, root_dir):
+            apis = extract_version_apis(package_name, version, v_dir)
+            if apis:
+                dataset[version] = apis
+    return dataset
+
+
+def synthetic_dataset(n_versions, n_apis, seed=0):
+    rnd = random.Random(seed)
+    base = [[f"pkg.mod{i % 50}.func{i}", [f"arg{j}" for j in range(rnd.randint(0, 6))], rnd.randint(0, 1)]
+            for i in range(n_apis)]
+    dataset = {}
+    for v in range(n_versions):
+        # 每个版本改动约 2% 的 API
+        for api in rnd.sample(base, max(1, n_apis // 50)):
+            api[1] = api[1] + [f"new{v}"]
+        dataset[f"1.{v}.0"] = [list(api) for api in base]
+    return dataset
+
+
+def clear_bench_rows():
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM api_signatures WHERE package_name=%s", (BENCH_PACKAGE,))
+
+
+def bench_backend(dataset, n_point_lookups):
+    db.init_db()
+    clear_bench_rows()
+    n_rows = sum(len(apis) for apis in dataset.values())
+
+    # 写入：每个版本一个事务
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for version, apis in dataset.items():
+            db.bulk_save_api_signatures(BENCH_PACKAGE, version, apis)
+    ingest = time.perf_counter() - start
+
+    # 按版本读取全部签名
+    start = time.perf_counter()
+    n_read = 0
+    for version in dataset:
+        n_read += len(db.get_api_signatures(BENCH_PACKAGE, version))
+    scan = time.perf_counter() - start
+
+    # 点查：(package, version, api_name)
+    rnd = random.Random(1)
+    keys = [(version, rnd.choice(apis)[0]) for version, apis in dataset.items() for _ in range(n_point_lookups // len(dataset) + 1)]
+    start = time.perf_counter()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            for version, api_name in keys:
+                cursor.execute(
+                    """SELECT parameters, has_return FROM api_signatures
+                    WHERE package_name=%s AND package_version=%s AND api_name=%s""",
+                    (BENCH_PACKAGE, version, api_name)
+                )
+                cursor.fetchone()
+    lookup = time.perf_counter() - start
+
+    clear_bench_rows()
+    return {
+        'ingest rows/s': n_rows / ingest,
+        'scan rows/s': n_read / scan,
+        'point lookups/s': len(keys) / lookup,
+    }
+
+
+def get_dataset(args):
+    if args.synthetic:
+        dataset = synthetic_dataset(*args.synthetic)
+    else:
+        dataset = load_dataset(args.root, args.package)
+    n_rows = sum(len(apis) for apis in dataset.values())
+    print(f"Dataset: {len(dataset)} versions, {n_rows} rows")
+    return dataset
+
+
+def run_backends(args):
+    dataset = get_dataset(args)
+    if not dataset:
+        print('[Err] empty dataset')
+        return
+
+    results = {}
+    for name in args.backends:
+        kwargs = {}
+        if name == 'sqlite':
+            kwargs['path'] = args.sqlite_path or os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+        try:
+            db_backend.set_backend(name, **kwargs)
+            results[name] = bench_backend(dataset, args.lookups)
+        except Exception as e:
+            print(f"[Err] {name} backend unavailable: {e}")
+
+    metrics = ['ingest rows/s', 'scan rows/s', 'point lookups/s']
+    print(f"{'backend':10}" + ''.join(f"{m:>18}" for m in metrics))
+    for name, res in results.items():
+        print(f"{name:10}" + ''.join(f"{res[m]:>18.0f}" for m in metrics))
+
+
+def run_index(args):
+    dataset = get_dataset(args)
+    if not dataset:
+        print('[Err] empty dataset')
+        return
+
+    start = time.perf_counter()
+    index = APISignatureIndex()
+    for version, apis in dataset.items():
+        for api_name, params, has_return in apis:
+            index.add(BENCH_PACKAGE, version, api_name, params, has_return)
+    build = time.perf_counter() - start
+
+    rnd = random.Random(1)
+    keys = [(BENCH_PACKAGE, version, rnd.choice(apis)[0]) for version, apis in dataset.items() for _ in range(args.lookups // len(dataset) + 1)]
+    # 一半的查询使用不存在的 API 名
+    keys += [(p, v, a + '_missing') for p, v, a in keys]
+
+    start = time.perf_counter()
+    for package, version, api_name in keys:
+        index.get(package, version, api_name)
+    lookup = time.perf_counter() - start
+
+    print(f"build: {len(index)} signatures in {build:.2f}s, {len(index._entries)} distinct (params, has_return)")
+    print(f"lookup: {len(keys) / lookup:.0f} lookups/s")
+
+
+def scan_exposed_paths(export_map, fullname):
+    """原实现：对每个名字扫描整个 export_map"""
+    fullname = fullname.lstrip('.')
+    results = {fullname}
+    for k, v in export_map.items():
+        if '*' in k:
+            if fnmatch.fnmatch(fullname, k):
+                prefix = k.split('*')[0]
+                suffix = fullname[len(prefix):]
+                if '*' in v:
+                    results.add(v.replace('*', suffix))
+        else:
+            if fullname == k:
+                results.add(v)
+            elif fullname.startswith(k + '.'):
+                results.add(v + fullname[len(k):])
+    return results
+
+
+def package_api_names(package_dir):
+    """与 get_all_apis_from_source 相同的方式收集一个版本中的模块级函数与类方法限定名"""
+    sources = get_all_sources_module_from_package_dir(package_dir)
+    names = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        export_map = build_export_map(sources)
+    for module_py, source_path in sources.items():
+        module_call_path = module_py.replace('.py', '').replace('/', '.').replace('\\', '.')
+        try:
+            with open(source_path, 'r') as f:
+                module_ast = ast.parse(f.read())
+        except Exception:
+            continue
+        for node in module_ast.body:
+            if isinstance(node, ast.FunctionDef):
+                names.append(f"{module_call_path}.{node.name}")
+            elif isinstance(node, ast.ClassDef):
+                names.extend(f"{module_call_path}.{node.name}.{m.name}" for m in node.body if isinstance(m, ast.FunctionDef))
+    return export_map, names
+
+
+def synthetic_exports(n_exports, n_names, seed=0):
+    rnd = random.Random(seed)
+    modules = [f"pkg.sub{i % 40}._mod{i}" for i in range(n_exports // 4 + 1)]
+    export_map = ExportMap()
+    for i in range(n_exports):
+        module = rnd.choice(modules)
+        parent = module.rsplit('.', 1)[0]
+        if i % 10 == 0:
+            export_map[f"{module}.*"] = f"{parent}.*"
+        else:
+            export_map[f"{module}.Obj{i}"] = f"{parent}.Obj{i}"
+    names = [f"{rnd.choice(modules)}.Obj{rnd.randrange(n_exports)}.method{j % 7}" for j in range(n_names)]
+    return export_map.build_index(), names
+
+
+def run_exports(args):
+    if args.synthetic:
+        export_map, names = synthetic_exports(*args.synthetic)
+    else:
+        export_map, names = package_api_names(args.dir)
+    print(f"Dataset: {len(export_map)} exports, {len(names)} names")
+    if not names:
+        print('[Err] empty dataset')
+        return
+
+    start = time.perf_counter()
+    expected = [scan_exposed_paths(export_map, name) for name in names]
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    export_map.build_index()
+    actual = [export_map.exposed_paths(name) for name in names]
+    indexed = time.perf_counter() - start
+
+    mismatch = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"scan:    {scan:.3f}s ({len(names) / scan:.0f} names/s)")
+    print(f"indexed: {indexed:.3f}s ({len(names) / indexed:.0f} names/s), speedup x{scan / indexed:.1f}")
+    print(f"mismatch: {mismatch}")
+
+
+def load_corpus(corpus_dir):
+    """解析目录下所有 .py 文件，解析耗时不计入对比"""
+    trees = []
+    for root, dirs, files in os.walk(corpus_dir):
+        for f in files:
+            if f.endswith('.py'):
+                try:
+                    with open(os.path.join(root, f), 'rb') as fp:
+                        trees.append(ast.parse(fp.read()))
+                except Exception:
+                    continue
+    return trees
+
+
+def visitor_extract(tree):
+    """原实现：sniffer 的 SourceVisitor + parse_import，get_all_apis_update 的逐函数 ast.walk"""
+    visitor = legacy.SourceVisitor()
+    visitor.visit(tree)
+    imports = legacy.parse_import(tree)
+    defs = [(n.name, extract_parameters(n), has_return_value(n)) for n in tree.body if isinstance(n, ast.FunctionDef)]
+    defs += [(f"{c.name}.{m.name}", extract_parameters(m), has_return_value(m))
+             for c in tree.body if isinstance(c, ast.ClassDef) for m in c.body if isinstance(m, ast.FunctionDef)]
+    return visitor.result, imports, defs
+
+
+def single_pass_extract(tree):
+    info = extract_module(tree)
+    return info.cargo, info.imports, [(name, f.parameters(), f.has_return_value) for name, f in info.defs]
+
+
+def run_extract(args):
+    trees = load_corpus(args.dir)
+    print(f"Corpus: {len(trees)} files")
+    if not trees:
+        print('[Err] empty corpus')
+        return
+
+    expected, actual = [], []
+    start = time.perf_counter()
+    for tree in trees:
+        try:
+            expected.append(visitor_extract(tree))
+        except RecursionError:
+            expected.append(None)
+    old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for tree in trees:
+        actual.append(single_pass_extract(tree))
+    new = time.perf_counter() - start
+
+    mismatch = sum(1 for a, b in zip(expected, actual) if a is not None and a != b)
+    print(f"visitors:    {old:.3f}s ({len(trees) / old:.0f} files/s)")
+    print(f"single pass: {new:.3f}s ({len(trees) / new:.0f} files/s), speedup x{old / new:.1f}")
+    print(f"mismatch: {mismatch}")
+
+
+def synthetic_package(base_dir, n_packages, n_modules):
+    """pkg/sub{i}/mod{j}.py：每个模块导入同包前一个模块，__init__.py 星号导入全部模块及私有的 _impl"""
+    root = os.path.join(base_dir, 'pkg')
+    os.makedirs(root)
+    with open(os.path.join(root, '__init__.py'), 'w') as f:
+        f.writelines(f"from pkg.sub{i} import *\n" for i in range(n_packages))
+    for i in range(n_packages):
+        sub_dir = os.path.join(root, f'sub{i}')
+        os.makedirs(sub_dir)
+        with open(os.path.join(sub_dir, '__init__.py'), 'w') as f:
+            f.writelines(f"from .mod{j} import *\n" for j in range(n_modules))
+            f.write("from ._impl import *\n")
+        # 私有模块组成的 re-export 链：__init__ <- _impl <- _core
+        with open(os.path.join(sub_dir, '_impl.py'), 'w') as f:
+            f.write(f"from ._core import *\n\ndef impl{i}(a):\n    return a\n")
+        with open(os.path.join(sub_dir, '_core.py'), 'w') as f:
+            f.write(f"def core{i}(a, b):\n    return a\n")
+        for j in range(n_modules):
+            with open(os.path.join(sub_dir, f'mod{j}.py'), 'w') as f:
+                if j:
+                    f.write(f"from .mod{j - 1} import func{j - 1}\n")
+                    f.write(f"from pkg.sub{(i + 1) % n_packages}.mod{j} import Cls{j}\n")
+                f.write(f"def func{j}(a, b=1):\n    return a\n\n")
+                f.write(f"class Cls{j}:\n    def __init__(self, x):\n        pass\n    def run(self):\n        return 1\n")
+    return root
+
+
+def load_package_sources(module_path):
+    """预先解析包内全部 .py 文件：{路径: pickle 后的 (cargo, imports)}，两种实现各自反序列化一份"""
+    parsed = {}
+    for root, dirs, files in os.walk(module_path):
+        for f in files:
+            if f.endswith('.py'):
+                full_path = os.path.join(root, f)
+                with open(full_path, 'rb') as fp:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        parsed[full_path] = pickle.dumps(parse_source_bytes(fp.read()))
+    return parsed
+
+
+def legacy_build_tree(node, base_path, parsed):
+    """原 sniffer_thread.build_dir_tree"""
+    full_path = os.path.join(base_path, node.name)
+    if node.name in SKIP_DIRS:
+        return
+    if os.path.isdir(full_path):
+        for item in os.listdir(full_path):
+            child_node = legacy.Tree(item)
+            child_node.parent = node
+            legacy_build_tree(child_node, full_path, parsed)
+            node.children.append(child_node)
+    elif node.name.endswith('.py'):
+        node.cargo, node.imports = pickle.loads(parsed[full_path])
+
+
+def legacy_infer_levels(root_node):
+    """原 sniffer_thread.tree_infer_levels：list.pop(0) BFS + 逐层线性查找子节点"""
+    leaf_stack = []
+    working_queue = [root_node]
+    while len(working_queue) > 0:
+        tmp_node = working_queue.pop(0)
+        if tmp_node.name.endswith('.py'):
+            leaf_stack.append(tmp_node)
+        working_queue.extend(tmp_node.children)
+
+    for node in leaf_stack[::-1]:
+        if node.name != '__init__.py' and node.name[0] == '_':
+            continue
+        if node.imports is None:
+            continue
+        for k, v in node.imports.items():
+            if k is None or isinstance(k, int):
+                continue
+            dst_node = legacy.go_to_that_node(root_node, node, k)
+            if dst_node is not None:
+                if v[0] == '*':
+                    for k_ch, v_ch in dst_node.cargo.items():
+                        node.cargo[k_ch] = v_ch
+                else:
+                    for api in v:
+                        if api in dst_node.cargo:
+                            node.cargo[api] = dst_node.cargo[api]
+
+    API_name_lst = []
+    for node in leaf_stack:
+        API_name_lst.extend(make_API_signatures(node.cargo, legacy.leaf2root(node)))
+    return API_name_lst
+
+
+def run_modules(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        module_path = synthetic_package(tmp_dir, *args.synthetic) if args.synthetic else os.path.normpath(args.dir)
+        parsed = load_package_sources(module_path)
+        print(f"Package: {module_path}, {len(parsed)} .py files")
+
+        start = time.perf_counter()
+        root_node = legacy.Tree(os.path.basename(module_path))
+        legacy_build_tree(root_node, os.path.dirname(module_path), parsed)
+        old_build = time.perf_counter() - start
+        expected = legacy_infer_levels(root_node)
+        old = time.perf_counter() - start
+        # 释放旧树，避免它拖慢后面的 GC
+        del root_node
+        gc.collect()
+
+        start = time.perf_counter()
+        index = ModuleIndex.build(module_path, lambda full_path, fs: pickle.loads(parsed[full_path]))
+        new_build = time.perf_counter() - start
+        index.propagate_imports()
+        actual = []
+        for node in index.leaves:
+            actual.extend(make_API_signatures(node.cargo, node.module_name))
+        new = time.perf_counter() - start
+
+        # 单趟传播 vs 不动点传播：耗时、re-export 占用的内存与覆盖的 API
+        load = lambda full_path, fs: pickle.loads(parsed[full_path])
+        single_pass, *single_pass_mem = measure_exports(ModuleIndex.build(module_path, load), fixed_point=False)
+        fixed_point, *fixed_point_mem = measure_exports(ModuleIndex.build(module_path, load), fixed_point=True)
+
+    print(f"Tree:        build {old_build:.3f}s, resolve {old - old_build:.3f}s, total {old:.3f}s")
+    print(f"ModuleIndex: build {new_build:.3f}s, resolve {new - new_build:.3f}s, total {new:.3f}s, speedup x{old / new:.1f}")
+    print(f"APIs: {len(actual)}, mismatch: {int(expected != actual)}")
+    print("single pass: {} APIs, retained {:.0f} KiB, peak {:.0f} KiB".format(
+        len(single_pass), *(m / 1024 for m in single_pass_mem)))
+    print("fixed point: {} APIs, retained {:.0f} KiB, peak {:.0f} KiB".format(
+        len(fixed_point), *(m / 1024 for m in fixed_point_mem)))
+    # 覆盖按 API 路径比较：链条解析完整后同名定义的来源可能不同，签名会变
+    single_pass_paths = {api.api_name for api in single_pass}
+    fixed_point_paths = {api.api_name for api in fixed_point}
+    print(f"paths: +{len(fixed_point_paths - single_pass_paths)} covered by fixed point, "
+          f"{len(single_pass_paths - fixed_point_paths)} lost")
+
+
+def measure_exports(index, fixed_point):
+    """返回 (API 集合, re-export 传播后新增占用的内存, 传播过程的内存峰值)"""
+    tracemalloc.start()
+    if fixed_point:
+        index.resolve_exports()
+    else:
+        index.propagate_imports()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    API_names = set()
+    for node in index.leaves:
+        cargo = node.exports if fixed_point and not is_private_module(node.name) else node.cargo
+        API_names.update(make_API_signatures(cargo, node.module_name))
+    return API_names, retained, peak
+
+
+def split_signature_strings(api_strs):
+    """原 extract_version_apis：把 make_API_full_name 的字符串拆回 [api_qualname, params, has_return]"""
+    version_api_list = []
+    for api_full_str in api_strs:
+        parts = api_full_str.split(",")
+        params = parts[1].split(";") if parts[1] else []
+        version_api_list.append([parts[0], params, int(parts[2])])
+    return version_api_list
+
+
+def measure_versions(dataset, convert):
+    """对每个版本调用 convert，返回全部版本的结果占用的内存"""
+    gc.collect()
+    tracemalloc.start()
+    versions = {version: convert(apis) for version, apis in dataset.items()}
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del versions
+    return retained
+
+
+def run_signatures(args):
+    dataset = get_dataset(args)
+    if not dataset:
+        print('[Err] empty dataset')
+        return
+    # 原流水线中每个版本的字符串都是新创建的，先渲染好，不计入对比
+    rendered = {version: ["{},{},{}".format(api, ";".join(params), int(has_return)) for api, params, has_return in apis]
+                for version, apis in dataset.items()}
+    n_rows = sum(len(apis) for apis in rendered.values())
+
+    old_mem = measure_versions(rendered, split_signature_strings)
+    new_mem = measure_versions(
+        rendered, lambda api_strs: [make_signature(name, params, has_return) for name, params, has_return in split_signature_strings(api_strs)])
+
+    print(f"strings -> lists: {old_mem / n_rows:.0f} B/row")
+    print(f"APISignature:     {new_mem / n_rows:.0f} B/row ({old_mem / new_mem:.1f}x less)")
+
+
+def run_snapshot(args):
+    dataset = get_dataset(args)
+    if not dataset:
+        print('[Err] empty dataset')
+        return
+
+    index = APISignatureIndex()
+    writer = SnapshotWriter()
+    for version, apis in dataset.items():
+        for api_name, params, has_return in apis:
+            index.add(BENCH_PACKAGE, version, api_name, params, has_return)
+        writer.add_version_signatures(BENCH_PACKAGE, version, apis)
+
+    rnd = random.Random(1)
+    keys = [(BENCH_PACKAGE, version, rnd.choice(apis)[0]) for version, apis in dataset.items() for _ in range(args.lookups // len(dataset) + 1)]
+    keys += [(p, v, a + '_missing') for p, v, a in keys]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pickle_path, snapshot_path = os.path.join(tmp_dir, 'index.pkl'), os.path.join(tmp_dir, 'kb.snapshot')
+        index.save(pickle_path)
+        writer.write(snapshot_path)
+        del index, writer
+        gc.collect()
+
+        for name, path in [('pickle', pickle_path), ('snapshot', snapshot_path)]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            loaded = APISignatureIndex.load(path)
+            opened = time.perf_counter() - start
+            retained = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            for package, version, api_name in keys:
+                loaded.get(package, version, api_name)
+            lookup = time.perf_counter() - start
+            print(f"{name:8}: {os.path.getsize(path) / 2**20:6.1f} MiB on disk, open {opened * 1000:8.1f}ms, "
+                  f"retained {retained / 2**20:6.1f} MiB, {len(keys) / lookup:9.0f} lookups/s")
+            if isinstance(loaded, KBSnapshot):
+                loaded.close()
+            del loaded
+            gc.collect()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    sub_parsers = arg_parser.add_subparsers(dest='bench', required=True)
+
+    p = sub_parsers.add_parser('backends', help='MySQL vs SQLite ingest / lookup throughput')
+    p.add_argument('-r', '--root', help='unpacked packages dir', type=str, default='../packages')
+    p.add_argument('-p', '--package', help='package used as dataset', type=str, default='requests')
+    p.add_argument('--synthetic', help='use N_VERSIONS x N_APIS synthetic signatures', type=int, nargs=2, default=None)
+    p.add_argument('-b', '--backends', nargs='+', choices=list(db_backend.BACKENDS), default=list(db_backend.BACKENDS))
+    p.add_argument('--sqlite-path', type=str, default=None)
+    p.add_argument('--lookups', help='number of point lookups', type=int, default=20000)
+    p.set_defaults(func=run_backends)
+
+    p = sub_parsers.add_parser('index', help='in-memory API signature index lookup throughput')
+    p.add_argument('-r', '--root', help='unpacked packages dir', type=str, default='../packages')
+    p.add_argument('-p', '--package', help='package used as dataset', type=str, default='requests')
+    p.add_argument('--synthetic', help='use N_VERSIONS x N_APIS synthetic signatures', type=int, nargs=2, default=None)
+    p.add_argument('--lookups', help='number of point lookups', type=int, default=1000000)
+    p.set_defaults(func=run_index)
+
+    p = sub_parsers.add_parser('exports', help='export_map prefix index vs linear fnmatch scan')
+    p.add_argument('-d', '--dir', help='unpacked package version dir', type=str, default=None)
+    p.add_argument('--synthetic', help='use N_EXPORTS x N_NAMES synthetic export map', type=int, nargs=2, default=None)
+    p.set_defaults(func=run_exports)
+
+    p = sub_parsers.add_parser('extract', help='single-pass AST extractor vs per-function ast.walk visitors')
+    p.add_argument('-d', '--dir', help='corpus dir of .py files', type=str, default='../packages')
+    p.set_defaults(func=run_extract)
+
+    p = sub_parsers.add_parser('signatures', help='per-version memory of split string lists vs interned APISignature')
+    p.add_argument('-r', '--root', help='unpacked packages dir', type=str, default='../packages')
+    p.add_argument('-p', '--package', help='package used as dataset', type=str, default='requests')
+    p.add_argument('--synthetic', help='use N_VERSIONS x N_APIS synthetic signatures', type=int, nargs=2, default=None)
+    p.set_defaults(func=run_signatures)
+
+    p = sub_parsers.add_parser('modules', help='ModuleIndex vs Tree import resolution in process_single_module')
+    p.add_argument('-d', '--dir', help='package dir (e.g. .../botocore-1.31.0/botocore)', type=str, default=None)
+    p.add_argument('--synthetic', help='use N_PACKAGES x N_MODULES synthetic package', type=int, nargs=2, default=None)
+    p.set_defaults(func=run_modules)
+
+    p = sub_parsers.add_parser('snapshot', help='columnar mmap snapshot vs pickled index: open time, memory, lookups')
+    p.add_argument('-r', '--root', help='unpacked packages dir', type=str, default='../packages')
+    p.add_argument('-p', '--package', help='package used as dataset', type=str, default='requests')
+    p.add_argument('--synthetic', help='use N_VERSIONS x N_APIS synthetic signatures', type=int, nargs=2, default=None)
+    p.add_argument('--lookups', help='number of point lookups', type=int, default=200000)
+    p.set_defaults(func=run_snapshot)
+
+    args = arg_parser.parse_args()
+    args.func(args)
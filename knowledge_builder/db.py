@@ -1,80 +1,212 @@
-import pymysql
 from typing import List, Tuple
 import json
 import os, sys
+import csv
+import time
+import tempfile
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from global_config import DB_CONFIG_BASE, DB_NAME, DB_CONFIG
+from global_config import DB_CONFIG
+from db_backend import get_backend, IntegrityError
+from api_signature import make_signature
+from api_lifetime import pruned_versions, derive_version_signatures
+
+
+# 建表语句（MySQL）
+MYSQL_TABLES = [
+    # 建 top_level 表（避免 TEXT 参与 UNIQUE）
+    """
+    CREATE TABLE IF NOT EXISTS top_level (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        package_name VARCHAR(255) NOT NULL,
+        package_version VARCHAR(255) NOT NULL,
+        top_level VARCHAR(1024) NOT NULL,
+        version_id INT DEFAULT 0,
+        UNIQUE KEY uniq_top_level (package_name(100), package_version(100), top_level(191))
+    )
+    """,
+    # 建 api_signatures 表
+    """
+    CREATE TABLE IF NOT EXISTS api_signatures (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        package_name VARCHAR(255) NOT NULL,
+        package_version VARCHAR(255) NOT NULL,
+        api_name VARCHAR(1024) NOT NULL,
+        parameters TEXT,
+        has_return TINYINT(1) NOT NULL,
+        UNIQUE KEY uniq_api (package_name(100), package_version(100), api_name(191))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS differences (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        package_version INT NOT NULL,
+        package_name VARCHAR(255) NOT NULL,
+        version_id INT NOT NULL,
+        api_name TEXT NOT NULL,
+        param_list TEXT,
+        has_return BOOLEAN,
+        diff CHAR(1) NOT NULL,
+        FOREIGN KEY (package_version) REFERENCES top_level(id) ON DELETE CASCADE
+    )
+    """,
+    # 记录每个包最后一次完成 diff 的版本，用于增量 diff
+    """
+    CREATE TABLE IF NOT EXISTS diff_state (
+        package_name VARCHAR(255) PRIMARY KEY,
+        last_version VARCHAR(255) NOT NULL,
+        last_version_id INT NOT NULL
+    )
+    """,
+    # API 生命周期：每个不同的 (api_name, parameters, has_return) 一行，记录其存在的 version_id 区间
+    """
+    CREATE TABLE IF NOT EXISTS api_lifetimes (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        package_name VARCHAR(255) NOT NULL,
+        sig_hash CHAR(40) NOT NULL,
+        api_name VARCHAR(1024) NOT NULL,
+        parameters TEXT,
+        has_return TINYINT(1) NOT NULL,
+        intervals TEXT NOT NULL,
+        UNIQUE KEY uniq_lifetime (package_name(100), sig_hash)
+    )
+    """,
+    # 构建任务账本：每个 (package, version) 的进度与耗时，用于断点续跑与吞吐 / 失败统计
+    """
+    CREATE TABLE IF NOT EXISTS build_jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        package_name VARCHAR(255) NOT NULL,
+        package_version VARCHAR(255) NOT NULL,
+        state VARCHAR(16) NOT NULL,
+        n_apis INT DEFAULT NULL,
+        extract_seconds DOUBLE DEFAULT NULL,
+        save_seconds DOUBLE DEFAULT NULL,
+        diff_seconds DOUBLE DEFAULT NULL,
+        error TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uniq_job (package_name(100), package_version(100))
+    )
+    """,
+]
+MYSQL_INDEXES = [
+    ('api_signatures', 'idx_api_signatures_pkg_ver', 'package_name(100), package_version(100)'),
+    ('api_signatures', 'idx_api_signatures_name', 'api_name(191)'),
+    ('api_lifetimes', 'idx_api_lifetimes_name', 'package_name(100), api_name(191)'),
+    ('build_jobs', 'idx_build_jobs_state', 'state'),
+]
+
+# 建表语句（SQLite），索引与 MySQL 对应
+SQLITE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS top_level (
+        id INTEGER PRIMARY KEY,
+        package_name TEXT NOT NULL,
+        package_version TEXT NOT NULL,
+        top_level TEXT NOT NULL,
+        version_id INTEGER DEFAULT 0,
+        UNIQUE (package_name, package_version, top_level)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS api_signatures (
+        id INTEGER PRIMARY KEY,
+        package_name TEXT NOT NULL,
+        package_version TEXT NOT NULL,
+        api_name TEXT NOT NULL,
+        parameters TEXT,
+        has_return INTEGER NOT NULL,
+        UNIQUE (package_name, package_version, api_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS differences (
+        id INTEGER PRIMARY KEY,
+        package_version INTEGER NOT NULL REFERENCES top_level(id) ON DELETE CASCADE,
+        package_name TEXT NOT NULL,
+        version_id INTEGER NOT NULL,
+        api_name TEXT NOT NULL,
+        param_list TEXT,
+        has_return INTEGER,
+        diff TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS diff_state (
+        package_name TEXT PRIMARY KEY,
+        last_version TEXT NOT NULL,
+        last_version_id INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS api_lifetimes (
+        id INTEGER PRIMARY KEY,
+        package_name TEXT NOT NULL,
+        sig_hash TEXT NOT NULL,
+        api_name TEXT NOT NULL,
+        parameters TEXT,
+        has_return INTEGER NOT NULL,
+        intervals TEXT NOT NULL,
+        UNIQUE (package_name, sig_hash)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS build_jobs (
+        id INTEGER PRIMARY KEY,
+        package_name TEXT NOT NULL,
+        package_version TEXT NOT NULL,
+        state TEXT NOT NULL,
+        n_apis INTEGER DEFAULT NULL,
+        extract_seconds REAL DEFAULT NULL,
+        save_seconds REAL DEFAULT NULL,
+        diff_seconds REAL DEFAULT NULL,
+        error TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (package_name, package_version)
+    )
+    """,
+]
+SQLITE_INDEXES = [
+    ('api_signatures', 'idx_api_signatures_pkg_ver', 'package_name, package_version'),
+    ('api_signatures', 'idx_api_signatures_name', 'api_name'),
+    # MySQL 会为外键自动建索引，SQLite 需要手动建
+    ('differences', 'idx_differences_top_level', 'package_version'),
+    ('api_lifetimes', 'idx_api_lifetimes_name', 'package_name, api_name'),
+    ('build_jobs', 'idx_build_jobs_state', 'state'),
+]
 
 
 def create_database_if_not_exists():
-    """连接到MySQL，自动创建数据库（如果不存在）"""
-    with pymysql.connect(**DB_CONFIG_BASE) as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(f"""
-                CREATE DATABASE IF NOT EXISTS {DB_NAME}
-                CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci
-            """)
+    """自动创建数据库（如果不存在）"""
+    get_backend().create_database()
 
 
 def get_connection():
-    """获取连接到目标数据库的连接"""
-    return pymysql.connect(**DB_CONFIG)
+    """获取连接：MySQL 从共享连接池获取（with 块结束时归还），SQLite 直接打开数据库文件"""
+    return get_backend().get_connection()
+
+
+def reserve_connections(n):
+    """保证 n 个线程各持有一个连接时不必等待连接池（同一线程不要嵌套取连接）"""
+    get_backend().reserve_connections(n)
 
 
 def init_db():
     """初始化数据库表结构"""
     try:
-        create_database_if_not_exists()
+        backend = get_backend()
+        backend.create_database()
+
+        if backend.name == 'sqlite':
+            tables, indexes = SQLITE_TABLES, SQLITE_INDEXES
+        else:
+            tables, indexes = MYSQL_TABLES, MYSQL_INDEXES
 
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                # 建 top_level 表（避免 TEXT 参与 UNIQUE）
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS top_level (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        package_name VARCHAR(255) NOT NULL,
-                        package_version VARCHAR(255) NOT NULL,
-                        top_level VARCHAR(1024) NOT NULL,
-                        version_id INT DEFAULT 0,
-                        UNIQUE KEY uniq_top_level (package_name(100), package_version(100), top_level(191))
-                    )
-                """)
-                # 建 api_signatures 表
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS api_signatures (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        package_name VARCHAR(255) NOT NULL,
-                        package_version VARCHAR(255) NOT NULL,
-                        api_name VARCHAR(1024) NOT NULL,
-                        parameters TEXT,
-                        has_return TINYINT(1) NOT NULL,
-                        UNIQUE KEY uniq_api (package_name(100), package_version(100), api_name(191))
-                    )
-                """)
-
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS differences (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        package_version INT NOT NULL,
-                        package_name VARCHAR(255) NOT NULL,
-                        version_id INT NOT NULL,
-                        api_name TEXT NOT NULL,
-                        param_list TEXT,
-                        has_return BOOLEAN,
-                        diff CHAR(1) NOT NULL,
-                        FOREIGN KEY (package_version) REFERENCES top_level(id) ON DELETE CASCADE
-                    )
-                """)
-
-                # 建索引（必须用 SHOW 判断，不支持 IF NOT EXISTS）
-                cursor.execute("SHOW INDEX FROM api_signatures WHERE Key_name = 'idx_api_signatures_pkg_ver'")
-                if cursor.fetchone() is None:
-                    cursor.execute("CREATE INDEX idx_api_signatures_pkg_ver ON api_signatures(package_name(100), package_version(100))")
-
-                cursor.execute("SHOW INDEX FROM api_signatures WHERE Key_name = 'idx_api_signatures_name'")
-                if cursor.fetchone() is None:
-                    cursor.execute("CREATE INDEX idx_api_signatures_name ON api_signatures(api_name(191))")
+                for sql in tables:
+                    cursor.execute(sql)
+                for table, index_name, columns in indexes:
+                    backend.create_index(cursor, table, index_name, columns)
     except Exception as e:
         print(f"数据库初始化失败: {e}")
     
@@ -94,53 +226,294 @@ def insert_many(sql_list):
             for sql in sql_list:
                 try:
                     cursor.execute(sql)
-                except pymysql.IntegrityError:
+                except IntegrityError:
                     pass
 
 
-def save_api_signatures(package_name: str, version: str, signatures: List[Tuple[str, List[str], bool]]):
+def save_api_signatures(package_name: str, version: str, signatures: List[Tuple[str, Tuple[str, ...], int]]):
     """保存API签名到数据库"""
+    bulk_save_api_signatures(package_name, version, signatures)
+
+
+BULK_LOAD_MODES = ('executemany', 'load_data')
+
+def _api_signature_rows(package_name, version, signatures):
+    # APISignature 中相同的参数列表共享同一个元组，JSON 只序列化一次
+    params_json = {}
+    for api_name, params, has_return in signatures:
+        params = tuple(params)
+        encoded = params_json.get(params)
+        if encoded is None:
+            encoded = params_json[params] = json.dumps(list(params))
+        yield (package_name, version, api_name, encoded, 1 if has_return else 0)
+
+
+def _bulk_executemany(cursor, rows, batch_size):
+    inserted = 0
+    for i in range(0, len(rows), batch_size):
+        # pymysql 会把 INSERT ... VALUES 的 executemany 改写成多行 INSERT
+        inserted += cursor.executemany(
+            """INSERT IGNORE INTO api_signatures
+            (package_name, package_version, api_name, parameters, has_return)
+            VALUES (%s, %s, %s, %s, %s)""",
+            rows[i:i + batch_size]
+        ) or 0
+    return inserted
+
+
+def _bulk_load_data(cursor, rows):
+    """写入临时 CSV 后用 LOAD DATA LOCAL INFILE 导入（需服务端开启 local_infile）"""
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', newline='', delete=False) as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        writer.writerows(rows)
+        csv_path = f.name
+    try:
+        return cursor.execute(
+            """LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE api_signatures
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            (package_name, package_version, api_name, parameters, has_return)""",
+            (csv_path,)
+        )
+    finally:
+        os.remove(csv_path)
+
+
+def bulk_save_api_signatures(package_name: str, version: str, signatures, mode: str = 'executemany', batch_size: int = 5000):
+    """
+    批量保存一个版本的 API 签名，整个版本在一个事务中提交；重复记录被忽略
+    mode: executemany (INSERT IGNORE 多行插入) / load_data (LOAD DATA LOCAL INFILE)
+    返回 (写入行数, 每秒行数)
+    """
+    if mode not in BULK_LOAD_MODES:
+        raise ValueError(f"Unknown bulk load mode: {mode}")
+
+    rows = list(_api_signature_rows(package_name, version, signatures))
+    if not rows:
+        return 0, 0.0
+
+    if mode == 'load_data' and get_backend().name != 'mysql':
+        raise ValueError("load_data mode requires the MySQL backend")
+
+    start = time.perf_counter()
+    if mode == 'load_data':
+        import pymysql
+        conn = pymysql.connect(**DB_CONFIG, local_infile=True)
+    else:
+        conn = get_connection()
+    with conn:
+        with conn.cursor() as cursor:
+            conn.begin()
+            try:
+                if mode == 'load_data':
+                    inserted = _bulk_load_data(cursor, rows)
+                else:
+                    inserted = _bulk_executemany(cursor, rows, batch_size)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    elapsed = time.perf_counter() - start
+
+    rows_per_sec = len(rows) / elapsed if elapsed > 0 else float('inf')
+    print(f"[{mode}] {package_name}-{version}: {inserted}/{len(rows)} rows in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+    return inserted, rows_per_sec
+
+
+def get_api_signatures(package_name: str, version: str = None, cursor=None, derive=True):
+    """
+    获取指定包和版本的API签名：[APISignature]；cursor 为已持有连接的游标时直接使用，不再从连接池取第二个连接
+    已删除签名行的版本（PRUNE_API_SIGNATURES）由 api_lifetimes 还原，derive=False 时只读 api_signatures
+    """
+    if cursor is None:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                return get_api_signatures(package_name, version, cursor, derive)
+
+    if version:
+        cursor.execute(
+            """SELECT api_name, parameters, has_return 
+            FROM api_signatures 
+            WHERE package_name=%s AND package_version=%s""",
+            (package_name, version)
+        )
+    else:
+        cursor.execute(
+            """SELECT api_name, parameters, has_return 
+            FROM api_signatures 
+            WHERE package_name=%s""",
+            (package_name,)
+        )
+
+    results = []
+    params_cache = {}
+    for api_name, params_json, has_return in cursor.fetchall():
+        params = params_cache.get(params_json)
+        if params is None:
+            params = params_cache[params_json] = json.loads(params_json) if params_json else []
+        results.append(make_signature(api_name, params, has_return))
+
+    if not derive:
+        versions = []
+    elif version:
+        versions = [] if results else [version]
+    else:
+        versions = pruned_versions(cursor, package_name).get(package_name, [])
+    if versions:
+        for sigs in derive_version_signatures(cursor, package_name, versions).values():
+            results.extend(make_signature(api_name, params, has_return) for api_name, params, has_return in sigs)
+    return results
+
+
+def get_diff_state(package_name: str):
+    """获取包最后一次 diff 的 (last_version, last_version_id)，不存在时返回 None"""
     with get_connection() as conn:
         with conn.cursor() as cursor:
-            for api_name, params, has_return in signatures:
-                try:
-                    cursor.execute(
-                        """INSERT INTO api_signatures 
-                        (package_name, package_version, api_name, parameters, has_return)
-                        VALUES (%s, %s, %s, %s, %s)""",
-                        (package_name, version, api_name, json.dumps(params), 1 if has_return else 0)
-                    )
-                except pymysql.IntegrityError:
-                    continue
-
-
-def get_api_signatures(package_name: str, version: str = None):
-    """获取指定包和版本的API签名"""
+            cursor.execute(
+                "SELECT last_version, last_version_id FROM diff_state WHERE package_name=%s",
+                (package_name,)
+            )
+            return cursor.fetchone()
+
+
+def get_top_level_versions():
+    """一次查询取出 top_level 中已有的版本：{package_name: {version}}"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT package_name, package_version FROM top_level")
+            versions = {}
+            for package_name, version in cursor.fetchall():
+                versions.setdefault(package_name, set()).add(version)
+            return versions
+
+
+def save_top_levels(rows, batch_size: int = 5000):
+    """批量写入 [(package_name, version, top_level)]，已存在的记录被忽略；返回写入行数"""
+    rows = list(rows)
+    inserted = 0
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            for i in range(0, len(rows), batch_size):
+                inserted += cursor.executemany(
+                    "INSERT IGNORE INTO top_level(package_name, package_version, top_level) VALUES (%s, %s, %s)",
+                    rows[i:i + batch_size]
+                ) or 0
+    return inserted
+
+
+def get_version_id(package_name: str, version: str):
+    """获取 top_level 中记录的 version_id（diff 时按版本顺序分配）"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT version_id FROM top_level WHERE package_name=%s AND package_version=%s LIMIT 1",
+                (package_name, version)
+            )
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+
+"""
+构建任务账本 build_jobs：pending -> extracted -> saved -> diffed，出错时为 failed
+saved 之前中断的版本在重启时删除已写入的部分签名后重做；saved 但未 diffed 的版本只重做 diff
+"""
+JOB_STATES = ('pending', 'extracted', 'saved', 'diffed', 'failed')
+JOB_DONE_STATES = ('saved', 'diffed')
+_JOB_SECONDS = {'extracted': 'extract_seconds', 'saved': 'save_seconds', 'diffed': 'diff_seconds'}
+
+
+def get_job_states(package_name: str):
+    """返回 {version: state}"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT package_version, state FROM build_jobs WHERE package_name=%s",
+                (package_name,)
+            )
+            return dict(cursor.fetchall())
+
+
+def mark_jobs(package_name: str, versions, state: str, seconds: float = None, n_apis: int = None, error: str = None,
+              cursor=None):
+    """
+    批量更新版本状态；seconds 记入该状态对应的耗时列（extracted / saved / diffed），
+    seconds / n_apis 为空时保留原值；cursor 为已持有连接的游标时在该连接上执行
+    """
+    if state not in JOB_STATES:
+        raise ValueError(f"Unknown job state: {state}")
+    versions = list(versions)
+    if not versions:
+        return
+
+    column = _JOB_SECONDS.get(state)
+    columns = 'package_name, package_version, state, n_apis, error'
+    updates = 'state=VALUES(state), n_apis=COALESCE(VALUES(n_apis), n_apis), error=VALUES(error)'
+    values = [(package_name, version, state, n_apis, error) for version in versions]
+    if column:
+        columns += f', {column}'
+        updates += f', {column}=COALESCE(VALUES({column}), {column})'
+        values = [row + (seconds,) for row in values]
+    placeholders = ', '.join(['%s'] * len(values[0]))
+    sql = f"""
+        INSERT INTO build_jobs ({columns}, updated_at) VALUES ({placeholders}, CURRENT_TIMESTAMP)
+        ON DUPLICATE KEY UPDATE {updates}, updated_at=CURRENT_TIMESTAMP
+    """
+
+    if cursor is not None:
+        cursor.executemany(sql, values)
+        return
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.executemany(sql, values)
+
+
+def delete_version_signatures(package_name: str, version: str, cursor=None):
+    """删除某个版本已写入的签名（未完成 save 的版本重做前、PRUNE_API_SIGNATURES 时 diff 完成后调用）"""
+    if cursor is None:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                return delete_version_signatures(package_name, version, cursor)
+    return cursor.execute(
+        "DELETE FROM api_signatures WHERE package_name=%s AND package_version=%s",
+        (package_name, version)
+    )
+
+
+def get_job_summary(package_name: str = None):
+    """
+    按状态汇总：[(state, 版本数, API 数, 抽取耗时, 写入耗时, diff 耗时)]
+    package_name 为空时汇总全部包
+    """
+    sql = """
+        SELECT state, COUNT(*), COALESCE(SUM(n_apis), 0),
+               COALESCE(SUM(extract_seconds), 0), COALESCE(SUM(save_seconds), 0), COALESCE(SUM(diff_seconds), 0)
+        FROM build_jobs
+    """
+    params = ()
+    if package_name:
+        sql += " WHERE package_name=%s"
+        params = (package_name,)
+    sql += " GROUP BY state"
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+def get_failed_jobs(limit: int = 100):
+    """最近失败的版本：[(package_name, package_version, error, updated_at)]"""
     with get_connection() as conn:
         with conn.cursor() as cursor:
-            if version:
-                cursor.execute(
-                    """SELECT api_name, parameters, has_return 
-                    FROM api_signatures 
-                    WHERE package_name=%s AND package_version=%s""",
-                    (package_name, version)
-                )
-            else:
-                cursor.execute(
-                    """SELECT api_name, parameters, has_return 
-                    FROM api_signatures 
-                    WHERE package_name=%s""",
-                    (package_name,)
-                )
-
-            results = []
-            for api_name, params_json, has_return in cursor.fetchall():
-                params = json.loads(params_json) if params_json else []
-                results.append((api_name, params, bool(has_return)))
-            return results
+            cursor.execute(
+                """SELECT package_name, package_version, error, updated_at FROM build_jobs
+                WHERE state='failed' ORDER BY updated_at DESC LIMIT %s""",
+                (limit,)
+            )
+            return cursor.fetchall()
 
 
 # 初始化数据库（首次导入时自动创建表）
 if __name__ == "__main__":
     init_db()
-    print("✅ MySQL 数据库和表结构初始化完成")
+    print(f"✅ {get_backend().name} 数据库和表结构初始化完成")
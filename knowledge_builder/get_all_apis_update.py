@@ -5,12 +5,14 @@ import os
 import re
 from packaging.version import parse as parse_version
 from db import *
+from ast_extractor import extract_module
+from api_signature import make_signature, as_signature
+from source_provider import LOCAL_SOURCE, open_source
 
 
-def read_file(path):
+def read_file(path, fs=LOCAL_SOURCE):
     try:
-        file = open(path, "r")
-        data = file.read().splitlines()
+        data = fs.read_text(path).splitlines()
         return data
     except Exception as e:
         print(e)
@@ -65,8 +67,8 @@ def get_packages_version_order_by_name(package_name, packages_dir):
         print(e)
         return []
 
-def search_egg_dir(package_dir):
-    for parent_dir, dir_names, file_names in os.walk(package_dir):
+def search_egg_dir(package_dir, fs=LOCAL_SOURCE):
+    for parent_dir, dir_names, file_names in fs.walk(package_dir):
         for dir_name in dir_names:
             if str(dir_name).endswith('.egg-info'):
                 return os.path.join(parent_dir, dir_name, 'top_level.txt'), os.path.join(parent_dir, dir_name,
@@ -75,14 +77,15 @@ def search_egg_dir(package_dir):
 
 
 # sources = package : file_path
-def get_all_sources_module_from_package_dir(package_dir):
-    top_level_file, sources_file = search_egg_dir(package_dir)
+# fs 为 source_provider.ArchiveSource 时 package_dir 为归档路径，file_path 为归档内的虚拟路径
+def get_all_sources_module_from_package_dir(package_dir, fs=LOCAL_SOURCE):
+    top_level_file, sources_file = search_egg_dir(package_dir, fs)
     sources = dict()
-    if os.path.exists(top_level_file) and os.path.exists(sources_file):
+    if fs.exists(top_level_file) and fs.exists(sources_file):
         # print('SOURCES文件可用')
-        top_levels = read_file(top_level_file)
+        top_levels = read_file(top_level_file, fs)
 
-        for source_file in read_file(sources_file):
+        for source_file in read_file(sources_file, fs):
             if top_levels and len(top_levels[0]) > 0:
                 for top_level in top_levels:
                     if top_level \
@@ -100,7 +103,7 @@ def get_all_sources_module_from_package_dir(package_dir):
                     sources[source_file] = package_dir + '/' + source_file
     else:
         # print('找不到egg文件')
-        for parent_dir, dir_names, file_names in os.walk(package_dir):
+        for parent_dir, dir_names, file_names in fs.walk(package_dir):
             for file_name in file_names:
                 if file_name.endswith('.py') and not file_name.__contains__('test') and not file_name == 'setup.py':
                     # sources.append(parent_dir.replace(package_dir, '') + '/' + file_name)
@@ -140,17 +143,20 @@ def has_return_value(node):
     return False
 
 
-def get_all_apis_from_source(module_py, source_path, export_map=None):
+def get_all_apis_from_source(module_py, source_path, export_map=None, fs=LOCAL_SOURCE):
     all_apis = []
     module_call_path = module_py.replace('.py', '').replace('/', '.').replace('\\', '.')
 
     try:
-        text = open(source_path, 'r').read()
+        text = fs.read_text(source_path)
         module_ast = ast.parse(text)
     except Exception as e:
         print(f"Error parsing {source_path}: {e}")
         return []
 
+    if export_map and not isinstance(export_map, ExportMap):
+        export_map = ExportMap(export_map)
+
     def get_all_exposed_paths(fullname):
         """
         返回原始路径 + 所有可能映射出的暴露路径。
@@ -162,51 +168,15 @@ def get_all_apis_from_source(module_py, source_path, export_map=None):
             - sklearn.linear_model._logistic.LogisticRegression.__init__
             - sklearn.linear_model.LogisticRegression.__init__
         """
-        fullname = fullname.lstrip('.')
-        results = {fullname}
-
         if not export_map:
-            return results
-
-        for k, v in export_map.items():
-            if '*' in k:
-                if fnmatch.fnmatch(fullname, k):
-                    prefix = k.split('*')[0]
-                    suffix = fullname[len(prefix):]
-                    if '*' in v:
-                        mapped = v.replace('*', suffix)
-                        results.add(mapped)
-            else:
-                if fullname == k:
-                    results.add(v)
-                elif fullname.startswith(k + '.'):
-                    suffix = fullname[len(k):]
-                    mapped = v + suffix
-                    results.add(mapped)
+            return {fullname.lstrip('.')}
+        return export_map.exposed_paths(fullname)
 
-        return results
-
-    # 处理模块级函数
-    functions = [n for n in module_ast.body if isinstance(n, ast.FunctionDef)]
-    for func in functions:
-        base_full_name = f"{module_call_path}.{func.name}"
+    # 模块级函数与类的方法，参数与 return 信息在一次遍历中得到
+    for name, info in extract_module(module_ast).defs:
+        base_full_name = f"{module_call_path}.{name}"
         for full_name in get_all_exposed_paths(base_full_name):
-            params = extract_parameters(func)
-            has_return = has_return_value(func)
-            api_signature = (full_name, params, has_return)
-            all_apis.append(api_signature)
-
-    # 处理类及其方法
-    classes = [n for n in module_ast.body if isinstance(n, ast.ClassDef)]
-    for cls in classes:
-        for m in cls.body:
-            if isinstance(m, ast.FunctionDef):
-                base_full_name = f"{module_call_path}.{cls.name}.{m.name}"
-                for full_name in get_all_exposed_paths(base_full_name):
-                    params = extract_parameters(m)
-                    has_return = has_return_value(m)
-                    api_signature = (full_name, params, has_return)
-                    all_apis.append(api_signature)
+            all_apis.append(make_signature(full_name, info.parameters(), info.has_return_value))
 
     return all_apis
 
@@ -264,14 +234,11 @@ def get_diff_from_all_version_apis(all_version_apis):
     version_keys = list(all_version_apis.keys())
     first_version = version_keys[0]
 
-    def to_hashable(api):
-        return (api[0], tuple(api[1]), api[2])  # 限定名, 参数, 返回标志
-
-    base_apis = {to_hashable(api) for api in all_version_apis[first_version]}
+    base_apis = {as_signature(api) for api in all_version_apis[first_version]}
     diff[first_version] = {api: '=' for api in base_apis}
 
     for version in version_keys[1:]:
-        current_apis = {to_hashable(api) for api in all_version_apis[version]}
+        current_apis = {as_signature(api) for api in all_version_apis[version]}
         result = {}
 
         for api in base_apis - current_apis:
@@ -328,19 +295,117 @@ def save_package_version_apis_diff(package_name, all_diff):
 
         version_id += 1
 
-def build_export_map(source_map):
+class ExportMap(dict):
+    """
+    {真实路径 → 暴露路径} 映射，附带按模块前缀建立的索引：
+    查询一个限定名时只需按 '.' 逐级取前缀查 dict，耗时与名字的层数成正比，而不是与映射条目数成正比。
+        _exact:    'a.b.C' -> 'a.C'        （普通条目，匹配 'a.b.C' 本身及 'a.b.C.xxx'）
+        _star:     'a.b'   -> 'a.*'        （'a.b.*' 形式的通配条目，匹配 'a.b.xxx'；'*' 对应前缀 ''）
+        _patterns: 其他通配条目，仍按 fnmatch 逐条匹配
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index = None
+
+    # 所有修改映射的方法都要让前缀索引失效，下次查询时重建
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._index = None
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._index = None
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._index = None
+
+    def setdefault(self, key, default=None):
+        self._index = None
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self._index = None
+        return super().pop(*args)
+
+    def popitem(self):
+        self._index = None
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self._index = None
+
+    def build_index(self):
+        exact, star, patterns = {}, {}, []
+        for k, v in self.items():
+            if '*' not in k:
+                exact[k] = v
+            elif k == '*':
+                star[''] = v
+            elif k.endswith('.*') and not any(c in k[:-2] for c in '*?['):
+                star[k[:-2]] = v
+            else:
+                patterns.append((k, v))
+        self._index = (exact, star, patterns)
+        return self
+
+    def exposed_paths(self, fullname):
+        """返回原始路径 + 所有可能映射出的暴露路径"""
+        if self._index is None:
+            self.build_index()
+        exact, star, patterns = self._index
+
+        fullname = fullname.lstrip('.')
+        results = {fullname}
+
+        v = star.get('')
+        if v is not None and '*' in v:
+            results.add(v.replace('*', fullname))
+
+        # 逐级前缀：'a'、'a.b'、... （不含完整名）
+        pos = fullname.find('.')
+        while pos != -1:
+            prefix = fullname[:pos]
+            v = exact.get(prefix)
+            if v is not None:
+                results.add(v + fullname[pos:])
+            v = star.get(prefix)
+            if v is not None and '*' in v:
+                results.add(v.replace('*', fullname[pos + 1:]))
+            pos = fullname.find('.', pos + 1)
+
+        v = exact.get(fullname)
+        if v is not None:
+            results.add(v)
+
+        for k, v in patterns:
+            if fnmatch.fnmatch(fullname, k):
+                prefix = k.split('*')[0]
+                suffix = fullname[len(prefix):]
+                if '*' in v:
+                    results.add(v.replace('*', suffix))
+
+        return results
+
+
+def build_export_map(source_map, fs=LOCAL_SOURCE):
     """
     构建 {真实路径 → 暴露路径} 映射。例如：
     requests.models.PreparedRequest -> requests.PreparedRequest
     或支持通配符：
     numpy.core.fromnumeric.* -> numpy.core.*
     """
-    export_map = {}
+    export_map = ExportMap()
 
     for module_path, abs_path in source_map.items():
         if os.path.basename(abs_path) == "__init__.py":
             try:
-                text = open(abs_path, 'r', encoding='utf-8').read()
+                text = fs.read_bytes(abs_path).decode('utf-8')
                 module_ast = ast.parse(text)
             except Exception as e:
                 print(f"Error parsing {abs_path}: {e}")
@@ -350,8 +415,8 @@ def build_export_map(source_map):
             parent_module = module_path.replace('.py', '').replace('/', '.').replace('\\', '.')
             parent_module = parent_module.replace('.__init__', '').lstrip('.')
 
-            for node in ast.walk(module_ast):
-                if isinstance(node, ast.ImportFrom) and node.level in (0, 1):
+            for node in extract_module(module_ast).import_froms:
+                if node.level in (0, 1):
                     mod = node.module or ''
                     for alias in node.names:
                         orig = alias.name
@@ -379,11 +444,19 @@ def build_export_map(source_map):
 
                         export_map[real_path] = public_path
 
-    return export_map
+    return export_map.build_index()
+
+
+def find_package_archive(project_dir, folder_name):
+    for suffix in ('.tar.gz', '.zip'):
+        path = os.path.join(project_dir, folder_name + suffix)
+        if os.path.isfile(path):
+            return path
+    return None
 
 
 def main():
-    for package_name in os.listdir(packages_path):
+    for package_name in os.listdir(packages_path if os.path.isdir(packages_path) else projects_path):
         # all_version_list = get_packages_version_order_by_time(package_name, 
                                                         #    os.path.join(projects_path, package_name))
         all_version_list = get_packages_version_order_by_name(package_name, 
@@ -398,14 +471,18 @@ def main():
                 continue
 
             package_dir = os.path.join(packages_path, package_name, f"{package_name}-{version}")
-            if os.path.exists(package_dir):
-                all_sources = get_all_sources_module_from_package_dir(package_dir)
-                export_map = build_export_map(all_sources)
-                print("export_map:", export_map)
-                version_apis = []
-
-                for source in all_sources:
-                    version_apis.extend(get_all_apis_from_source(source, all_sources[source], export_map))
+            if not os.path.exists(package_dir):
+                # 没有解压的目录时直接读取 ../projects 中的归档
+                package_dir = find_package_archive(os.path.join(projects_path, package_name), f"{package_name}-{version}")
+            if package_dir:
+                with open_source(package_dir) as fs:
+                    all_sources = get_all_sources_module_from_package_dir(package_dir, fs)
+                    export_map = build_export_map(all_sources, fs)
+                    print("export_map:", export_map)
+                    version_apis = []
+
+                    for source in all_sources:
+                        version_apis.extend(get_all_apis_from_source(source, all_sources[source], export_map, fs))
                 
                 # 保存API签名到数据库
                 save_api_signatures(package_name, version, version_apis)
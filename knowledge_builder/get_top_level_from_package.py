@@ -1,104 +1,199 @@
+"""
+读取每个包版本的导入名（top_level），写入 top_level 表
+
+    python get_top_level_from_package.py [-r ../packages] [-w 8]
+    python get_top_level_from_package.py -r ../projects        # 直接读取 sdist / wheel 归档
+
+top_level 按以下顺序确定：
+    1. *.egg-info / *.dist-info 中的 top_level.txt（只在版本目录下 MAX_METADATA_DEPTH 层内查找）
+    2. wheel 的 *.dist-info/RECORD 中出现的顶层包 / 模块
+    3. pyproject.toml 中声明的包（setuptools / flit / poetry），或与 [project].name 同名的包目录
+    4. 包名本身
+已存在的 (package, version) 用一次查询取出后跳过；各包在进程池中解析（归档解压是 CPU 密集的），
+主进程按包用 executemany 批量写入。
+"""
 import os
-
-from db import is_exist, insert_many
-from pathlib import Path
-from packaging.version import parse as parse_version
-
-def search_egg_dir(package_dir):
-    for parent_dir, dir_names, file_names in os.walk(package_dir):
+import csv
+import argparse
+import concurrent.futures
+
+from db import get_top_level_versions, save_top_levels
+from source_provider import open_source
+from sniffer_thread import list_package_versions
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+METADATA_SUFFIXES = ('.egg-info', '.dist-info')
+# egg-info 通常在版本目录根部或 src/ 下
+MAX_METADATA_DEPTH = 2
+SKIP_DIRS = {'test', 'tests', 'testing', 'docs', 'doc', 'examples', 'build', '.git', '__pycache__'}
+
+
+def find_metadata_dirs(package_dir, fs, max_depth=MAX_METADATA_DEPTH):
+    """返回 package_dir 下 max_depth 层以内的 *.egg-info / *.dist-info 目录，浅的在前"""
+    found = []
+    base_depth = package_dir.rstrip('/\\').count(os.sep)
+    for parent_dir, dir_names, file_names in fs.walk(package_dir):
+        depth = parent_dir.rstrip('/\\').count(os.sep) - base_depth
         for dir_name in dir_names:
-            if str(dir_name).endswith('.egg-info'):
-                return os.path.join(parent_dir, dir_name, 'top_level.txt')
+            if dir_name.endswith(METADATA_SUFFIXES):
+                found.append((depth, os.path.join(parent_dir, dir_name)))
+        if depth + 1 >= max_depth:
+            dir_names[:] = []
+        else:
+            dir_names[:] = [d for d in dir_names if d not in SKIP_DIRS and not d.endswith(METADATA_SUFFIXES)]
+    found.sort(key=lambda x: x[0])
+    return [path for _, path in found]
+
+
+def search_egg_dir(package_dir, fs=None):
+    """兼容原接口：返回第一个 top_level.txt 的路径，找不到时返回 ''"""
+    fs = fs or open_source(package_dir)
+    for metadata_dir in find_metadata_dirs(package_dir, fs):
+        top_level_file = os.path.join(metadata_dir, 'top_level.txt')
+        if fs.isfile(top_level_file):
+            return top_level_file
     return ''
 
 
-def get_packages_version_order_by_time(package_name, packages_dir):
+def read_lines(path, fs):
     try:
-        packages_list = os.listdir(packages_dir)
-        if packages_list:
-            packages_list = sorted(packages_list, key=lambda x: os.path.getmtime(os.path.join(packages_dir, x)))
-            version_list = []
-            for package in packages_list:
-                if package.endswith('.tar.gz'):
-                    package = package.replace('.tar.gz', '')
-                if package.endswith('.zip'):
-                    package = package.replace('.zip', '')
-
-                version_list.append(package.replace(package_name + '-', ''))
-
-            return version_list
+        return fs.read_text(path).splitlines()
     except Exception as e:
         print(e)
         return []
 
 
-def get_packages_version_order_by_name(package_name, packages_dir):
-    try:
-        packages_list = os.listdir(packages_dir)
-        version_list = []
-
-        for package in packages_list:
-            version = package
-            if version.endswith('.tar.gz'):
-                version = version.replace('.tar.gz', '')
-            elif version.endswith('.zip'):
-                version = version.replace('.zip', '')
-
-            if version.startswith(package_name + '-'):
-                version_str = version.replace(package_name + '-', '')
-                version_list.append(version_str)
+def top_levels_from_record(lines):
+    """wheel RECORD（csv：路径,哈希,大小）-> 顶层包 / 模块名"""
+    names = []
+    for row in csv.reader(lines):
+        if not row:
+            continue
+        first = row[0].replace('\\', '/').split('/')[0]
+        if first.endswith(('.dist-info', '.data')) or first in ('..', '__pycache__'):
+            continue
+        if '/' not in row[0]:
+            if not first.endswith(('.py', '.pyi')):
+                continue
+            first = first.rsplit('.', 1)[0]
+        if first.isidentifier() and first not in names:
+            names.append(first)
+    return names
 
-        version_list.sort(key=lambda v: parse_version(v))
-        return version_list
 
-    except Exception as e:
-        print(e)
+def top_levels_from_pyproject(data, package_dir, fs):
+    """pyproject.toml 中声明的包；都没有声明时，若存在与 [project].name 同名的包目录则使用它"""
+    if tomllib is None:
         return []
-
-def read_file(path):
     try:
-        file = open(path, "r")
-        data = file.read().splitlines()
-        return data
+        config = tomllib.loads(data)
     except Exception as e:
-        print(e)
-
+        print(f"Error parsing pyproject.toml in {package_dir}: {e}")
+        return []
 
-def get_top_level_from_sources(package_dir):
-    top_level = []
-    top_level_file = search_egg_dir(package_dir)
-    if top_level_file:
-        top_level = read_file(top_level_file)
-    return top_level
+    tool = config.get('tool', {})
+    declared = []
+    setuptools = tool.get('setuptools', {})
+    if isinstance(setuptools.get('packages'), list):
+        declared += setuptools['packages']
+    declared += setuptools.get('py-modules', [])
+    flit_module = tool.get('flit', {}).get('module', {}).get('name')
+    if flit_module:
+        declared.append(flit_module)
+    for package in tool.get('poetry', {}).get('packages', []):
+        if isinstance(package, dict) and package.get('include'):
+            declared.append(package['include'])
+
+    names = []
+    for name in declared:
+        if isinstance(name, str):
+            top = name.replace('/', '.').split('.')[0]
+            if top.isidentifier() and top not in names:
+                names.append(top)
+    if names:
+        return names
+
+    project_name = config.get('project', {}).get('name') or tool.get('poetry', {}).get('name')
+    if project_name:
+        module_name = project_name.replace('-', '_').replace('.', '_').lower()
+        for base in (package_dir, os.path.join(package_dir, 'src')):
+            if fs.isdir(os.path.join(base, module_name)) or fs.isfile(os.path.join(base, module_name + '.py')):
+                return [module_name]
+    return []
+
+
+def get_top_level_from_sources(package_dir, fs=None):
+    fs = fs or open_source(package_dir)
+    metadata_dirs = find_metadata_dirs(package_dir, fs)
+    for metadata_dir in metadata_dirs:
+        top_level_file = os.path.join(metadata_dir, 'top_level.txt')
+        if fs.isfile(top_level_file):
+            top_levels = [line.strip() for line in read_lines(top_level_file, fs) if line.strip()]
+            if top_levels:
+                return top_levels
+    for metadata_dir in metadata_dirs:
+        record_file = os.path.join(metadata_dir, 'RECORD')
+        if fs.isfile(record_file):
+            top_levels = top_levels_from_record(read_lines(record_file, fs))
+            if top_levels:
+                return top_levels
+    pyproject_file = os.path.join(package_dir, 'pyproject.toml')
+    if fs.isfile(pyproject_file):
+        try:
+            return top_levels_from_pyproject(fs.read_text(pyproject_file), package_dir, fs)
+        except Exception as e:
+            print(f"Error reading {pyproject_file}: {e}")
+    return []
+
+
+def collect_package_top_levels(package_name, root_dir, existing_versions):
+    """在工作进程中执行：返回 [(package_name, version, top_level)]，跳过已存在的版本"""
+    rows = []
+    for version, v_dir in list_package_versions(package_name, root_dir):
+        if version in existing_versions:
+            continue
+        try:
+            with open_source(v_dir) as fs:
+                top_levels = get_top_level_from_sources(v_dir, fs)
+        except Exception as e:
+            print(f"Error reading {package_name}-{version}: {e}")
+            top_levels = []
+        for top_level in top_levels or [package_name]:
+            rows.append((package_name, version, top_level))
+    return rows
 
 
 def main():
-    for package_name in os.listdir(packages_path):
-        # all_version_list = get_packages_version_order_by_time(package_name, str(projects_path) +'/' + package_name + '/')
-        all_version_list = get_packages_version_order_by_name(package_name, str(projects_path) +'/' + package_name + '/')
-        for version in all_version_list:
-            print("handle version : " + version)
-            if is_exist(
-                    "SELECT 1 FROM top_level WHERE package_name='%s' AND package_version='%s'" % (
-                            package_name, version)) > 0:
-                print("%s - %s exist" % (package_name, version))
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-r', '--root', help='unpacked packages dir, or ../projects to read archives directly', type=str, default='../packages')
+    arg_parser.add_argument('-w', '--workers', help='number of workers', type=int, default=None)
+    args = arg_parser.parse_args()
+
+    existing = get_top_level_versions()
+    all_packages = sorted(os.listdir(args.root))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(collect_package_top_levels, package_name, args.root, existing.get(package_name, set())): package_name
+            for package_name in all_packages
+        }
+        for future in concurrent.futures.as_completed(futures):
+            package_name = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"Error processing {package_name}: {e}")
                 continue
-
-            package_dir = str(projects_path) +'/' + package_name + '/' + package_name + '-' + version + '/'
-            top_levels = get_top_level_from_sources(package_dir)
-            if not top_levels:
-                top_levels.append(package_name)
-
-            sql_list = []
-            for top_level in top_levels:
-                sql_list.append(
-                    "INSERT INTO top_level(package_name,package_version,top_level) VALUES('%s','%s','%s')" % (
-                        package_name, version, top_level))
-            insert_many(sql_list)
+            if rows:
+                inserted = save_top_levels(rows)
+                print(f"{package_name}: {len({row[1] for row in rows})} new versions, {inserted} top_level rows")
+            else:
+                print(f"{package_name}: up to date")
 
 
 if __name__ == '__main__':
-    current_folder = Path(__file__).resolve().parent
-    projects_path = current_folder.parent / 'projects'
-    packages_path = current_folder.parent / 'packages'
     main()
@@ -0,0 +1,433 @@
+"""
+知识库快照：把 api_signatures / top_level / differences 导出为一个可 mmap 的列式文件，
+评测机器（code_completion/eval.py、lightweight_repair/eval.py、task_construction）无需数据库即可查询签名。
+
+    python kb_snapshot.py export -o ../data/kb.snapshot     # 从数据库导出
+    python kb_snapshot.py info ../data/kb.snapshot
+    python kb_snapshot.py query ../data/kb.snapshot requests 2.31.0 [requests.api.get]
+
+    with KBSnapshot('../data/kb.snapshot') as kb:
+        kb.get_api_signatures('requests', '2.31.0')   # 与 db.get_api_signatures 相同：[APISignature]
+        kb.exists('requests', '2.31.0', 'requests.api.get')  # 与 APISignatureIndex 相同的查询接口
+
+文件布局（整数均为小端 / 本机字节序，见头部 byteorder）：
+    MAGIC(8) | 头部长度 uint64 | 头部 JSON | 各列数据（按 8 字节对齐）
+头部 JSON 记录每一列的 [偏移, array 类型码, 元素个数]。所有字符串（包名、版本、API 名、参数名）
+存放在一个字符串池中（strings.data + strings.offsets），各表只保存字符串编号：
+    api.*        每行一个签名，同一 (package, version) 的行连续存放，按 (api.hash, api_name) 排序，
+                 api.hash 为 api_name 的 crc32，点查时在 mmap 上直接二分整数列
+    params.*     不同的参数列表，params.offsets 切分 params.items（参数名编号）
+    versions.*   每个 (package, version) 在 api.* 中的 [start, end)
+    top_level.*  与 top_level 表相同的 (package, version, top_level, version_id)
+    diff.*       differences 表，同一包的行连续存放、按 version_id 排序；diff_packages.* 为每个包的 [start, end)
+打开时只读入头部与 versions / top_level / diff_packages 这几张小表，签名行按需从 mmap 中读取。
+"""
+import os, sys
+import json
+import mmap
+import time
+import zlib
+import bisect
+import argparse
+from array import array
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+try:
+    from api_signature import make_signature, intern_parameters
+    from api_lifetime import iter_derived_signatures
+except ImportError:  # 作为 knowledge_builder.kb_snapshot 导入（eval 脚本不在 knowledge_builder 目录下运行）
+    from knowledge_builder.api_signature import make_signature, intern_parameters
+    from knowledge_builder.api_lifetime import iter_derived_signatures
+
+MAGIC = b'VCFKBS01'
+ALIGN = 8
+NULL_RETURN = -1  # differences.has_return 为 NULL
+
+# 列名 -> array 类型码
+COLUMNS = {
+    'strings.offsets': 'Q', 'strings.data': 'B',
+    'params.offsets': 'I', 'params.items': 'I',
+    'api.name': 'I', 'api.hash': 'I', 'api.params': 'I', 'api.has_return': 'B',
+    'versions.package': 'I', 'versions.version': 'I', 'versions.start': 'Q', 'versions.end': 'Q',
+    'top_level.package': 'I', 'top_level.version': 'I', 'top_level.name': 'I', 'top_level.version_id': 'i',
+    'diff.version': 'I', 'diff.version_id': 'i', 'diff.api_name': 'I', 'diff.param_list': 'I',
+    'diff.has_return': 'b', 'diff.flag': 'B',
+    'diff_packages.package': 'I', 'diff_packages.start': 'Q', 'diff_packages.end': 'Q',
+}
+
+
+class SnapshotWriter:
+    """
+    按 (package, version) 逐段追加签名，最后一次性写出文件：
+        writer.add_version_signatures(package, version, [(api_name, params, has_return)])
+        writer.add_top_level(package, version, top_level, version_id)
+        writer.add_package_differences(package, [(version, version_id, api_name, param_list, has_return, diff)])
+        writer.write(path)
+    """
+    def __init__(self):
+        self.columns = {name: array(code) for name, code in COLUMNS.items()}
+        self._strings = {}
+        self._params = {}
+        self.columns['strings.offsets'].append(0)
+        self.columns['params.offsets'].append(0)
+
+    def string_id(self, s):
+        sid = self._strings.get(s)
+        if sid is None:
+            sid = self._strings[s] = len(self._strings)
+            self.columns['strings.data'].frombytes(s.encode('utf-8', errors='surrogatepass'))
+            self.columns['strings.offsets'].append(len(self.columns['strings.data']))
+        return sid
+
+    def params_id(self, params):
+        params = tuple(params)
+        pid = self._params.get(params)
+        if pid is None:
+            pid = self._params[params] = len(self._params)
+            items = self.columns['params.items']
+            items.extend(self.string_id(p) for p in params)
+            self.columns['params.offsets'].append(len(items))
+        return pid
+
+    def add_version_signatures(self, package, version, signatures):
+        cols = self.columns
+        start = len(cols['api.name'])
+        # 同一 API 名只保留一条（与 api_signatures 的唯一键一致），段内按 (hash, 名字) 排序以便二分查找
+        rows = {}
+        for api_name, params, has_return in signatures:
+            rows.setdefault(api_name, (params, has_return))
+        for name_hash, api_name in sorted((api_hash(api_name), api_name) for api_name in rows):
+            params, has_return = rows[api_name]
+            cols['api.name'].append(self.string_id(api_name))
+            cols['api.hash'].append(name_hash)
+            cols['api.params'].append(self.params_id(params))
+            cols['api.has_return'].append(1 if has_return else 0)
+        cols['versions.package'].append(self.string_id(package))
+        cols['versions.version'].append(self.string_id(version))
+        cols['versions.start'].append(start)
+        cols['versions.end'].append(len(cols['api.name']))
+
+    def add_top_level(self, package, version, top_level, version_id=0):
+        cols = self.columns
+        cols['top_level.package'].append(self.string_id(package))
+        cols['top_level.version'].append(self.string_id(version))
+        cols['top_level.name'].append(self.string_id(top_level))
+        cols['top_level.version_id'].append(version_id or 0)
+
+    def add_package_differences(self, package, rows):
+        """rows: [(version, version_id, api_name, param_list, has_return, diff)]，param_list 为 differences 中的 'a, b' 字符串"""
+        cols = self.columns
+        start = len(cols['diff.version'])
+        for version, version_id, api_name, param_list, has_return, diff in sorted(rows, key=lambda r: r[1]):
+            cols['diff.version'].append(self.string_id(version))
+            cols['diff.version_id'].append(version_id)
+            cols['diff.api_name'].append(self.string_id(api_name))
+            cols['diff.param_list'].append(self.string_id(param_list or ''))
+            cols['diff.has_return'].append(NULL_RETURN if has_return is None else int(bool(has_return)))
+            cols['diff.flag'].append(ord(diff[0]) if diff else ord('='))
+        cols['diff_packages.package'].append(self.string_id(package))
+        cols['diff_packages.start'].append(start)
+        cols['diff_packages.end'].append(len(cols['diff.version']))
+
+    def write(self, path, **meta):
+        """先写临时文件再原子替换，读者不会看到写了一半的快照"""
+        layout, offset = {}, 0
+        for name, col in self.columns.items():
+            nbytes = len(col) * col.itemsize
+            layout[name] = [offset, col.typecode, len(col)]
+            offset += -(-nbytes // ALIGN) * ALIGN
+        header = json.dumps({
+            'byteorder': sys.byteorder,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'columns': layout,
+            **meta,
+        }).encode('utf-8')
+        data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for name, col in self.columns.items():
+                f.seek(data_start + layout[name][0])
+                col.tofile(f)
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+        return path
+
+
+def api_hash(api_name):
+    return zlib.crc32(api_name.encode('utf-8', errors='surrogatepass'))
+
+
+def is_snapshot(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class KBSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a knowledge base snapshot: {path}")
+        header_len = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 8], 'little')
+        header_end = len(MAGIC) + 8 + header_len
+        self.header = json.loads(self._mm[len(MAGIC) + 8:header_end])
+        data_start = -(-header_end // ALIGN) * ALIGN
+        swap = self.header['byteorder'] != sys.byteorder
+
+        self._views = []
+        cols = {}
+        for name, (offset, code, count) in self.header['columns'].items():
+            start = data_start + offset
+            view = memoryview(self._mm)[start:start + count * array(code).itemsize]
+            self._views.append(view)
+            if swap and code not in ('B', 'b'):
+                # 跨字节序的机器上拷贝一份再转换
+                col = array(code, view)
+                col.byteswap()
+            else:
+                col = view.cast(code)
+                self._views.append(col)
+            cols[name] = col
+        self._cols = cols
+        self._strings_base = data_start + self.header['columns']['strings.data'][0]
+        self._params_cache = {}
+
+        # 小表读入内存：(package, version) -> [(start, end)]，(top_level, version) -> package
+        self._ranges = {}
+        self._package_versions = {}
+        for package, version, start, end in zip(cols['versions.package'], cols['versions.version'],
+                                                cols['versions.start'], cols['versions.end']):
+            package, version = self.string(package), self.string(version)
+            self._ranges.setdefault((package, version), []).append((start, end))
+            self._package_versions.setdefault(package, []).append(version)
+        self._top_levels = {}
+        self._aliases = {}
+        for package, version, top_level, version_id in zip(cols['top_level.package'], cols['top_level.version'],
+                                                            cols['top_level.name'], cols['top_level.version_id']):
+            package, version, top_level = self.string(package), self.string(version), self.string(top_level)
+            self._top_levels.setdefault((package, version), []).append((top_level, version_id))
+            if top_level and top_level != package:
+                self._aliases[(top_level, version)] = package
+        self._diff_ranges = {}
+        for package, start, end in zip(cols['diff_packages.package'], cols['diff_packages.start'], cols['diff_packages.end']):
+            self._diff_ranges.setdefault(self.string(package), []).append((start, end))
+
+    def close(self):
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        self._cols = {}
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._cols['api.name'])
+
+    def string(self, sid):
+        offsets = self._cols['strings.offsets']
+        return str(self._cols['strings.data'][offsets[sid]:offsets[sid + 1]], 'utf-8', 'surrogatepass')
+
+    def params(self, pid):
+        params = self._params_cache.get(pid)
+        if params is None:
+            offsets, items = self._cols['params.offsets'], self._cols['params.items']
+            params = self._params_cache[pid] = intern_parameters(self.string(i) for i in items[offsets[pid]:offsets[pid + 1]])
+        return params
+
+    def _signature(self, row):
+        cols = self._cols
+        return make_signature(self.string(cols['api.name'][row]), self.params(cols['api.params'][row]),
+                              cols['api.has_return'][row])
+
+    def _version_ranges(self, package, version):
+        ranges = self._ranges.get((package, version))
+        if ranges is None:
+            real_package = self._aliases.get((package, version))
+            if real_package is not None:
+                ranges = self._ranges.get((real_package, version))
+        return ranges
+
+    def _find(self, start, end, api_name):
+        """在 [start, end) 中按 crc32 二分，再比较哈希相同的几行的名字字节"""
+        key = api_name.encode('utf-8', errors='surrogatepass')
+        key_hash = zlib.crc32(key)
+        hashes, names, offsets = self._cols['api.hash'], self._cols['api.name'], self._cols['strings.offsets']
+        mm, base = self._mm, self._strings_base
+        row = bisect.bisect_left(hashes, key_hash, start, end)
+        while row < end and hashes[row] == key_hash:
+            sid = names[row]
+            if mm[base + offsets[sid]:base + offsets[sid + 1]] == key:
+                return row
+            row += 1
+        return -1
+
+    # 与 db.get_api_signatures 相同
+    def get_api_signatures(self, package_name, version=None):
+        """获取指定包和版本的API签名：[APISignature]，version 为空时返回该包所有版本的签名"""
+        versions = [version] if version else self._package_versions.get(package_name, [])
+        results = []
+        for v in dict.fromkeys(versions):
+            for start, end in self._ranges.get((package_name, v), ()):
+                results.extend(self._signature(row) for row in range(start, end))
+        return results
+
+    def get_version_id(self, package_name, version):
+        top_levels = self._top_levels.get((package_name, version))
+        return top_levels[0][1] if top_levels else None
+
+    def get_top_levels(self, package_name, version):
+        return [top_level for top_level, _ in self._top_levels.get((package_name, version), ())]
+
+    def get_differences(self, package_name):
+        """[(version, version_id, api_name, param_list, has_return, diff)]，按 version_id 排序"""
+        cols = self._cols
+        rows = []
+        for start, end in self._diff_ranges.get(package_name, ()):
+            for i in range(start, end):
+                has_return = cols['diff.has_return'][i]
+                rows.append((self.string(cols['diff.version'][i]), cols['diff.version_id'][i],
+                             self.string(cols['diff.api_name'][i]), self.string(cols['diff.param_list'][i]),
+                             None if has_return == NULL_RETURN else bool(has_return), chr(cols['diff.flag'][i])))
+        rows.sort(key=lambda r: r[1])
+        return rows
+
+    # 与 api_index.APISignatureIndex 相同的查询接口
+    def get(self, package, version, api_name):
+        """返回 (params, has_return)，不存在时返回 None"""
+        for start, end in self._version_ranges(package, version) or ():
+            row = self._find(start, end, api_name)
+            if row >= 0:
+                return self.params(self._cols['api.params'][row]), bool(self._cols['api.has_return'][row])
+        return None
+
+    def exists(self, package, version, api_name):
+        return self.get(package, version, api_name) is not None
+
+    def signature(self, package, version, api_name):
+        """返回与 api_gt_info 相同格式的 (api_name, [params], has_return)，不存在时返回 None"""
+        entry = self.get(package, version, api_name)
+        if entry is None:
+            return None
+        return (api_name, list(entry[0]), entry[1])
+
+    def has_version(self, package, version):
+        return self._version_ranges(package, version) is not None
+
+    def versions(self, package):
+        versions = set(self._package_versions.get(package, ()))
+        versions |= {v for (t, v), p in self._aliases.items() if t == package}
+        return versions
+
+
+def _iter_signature_rows(cursor, batch_size):
+    """api_signatures 的全部行，之后是签名行已删除（PRUNE_API_SIGNATURES）、由 api_lifetimes 还原的版本"""
+    cursor.execute("""SELECT package_name, package_version, api_name, parameters, has_return
+        FROM api_signatures ORDER BY package_name, package_version""")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+    yield from iter_derived_signatures(cursor)
+
+
+def export_snapshot(path, conn=None, batch_size=100000):
+    """从数据库导出快照；conn 为空时使用 global_config 中配置的后端。返回写入的签名行数"""
+    if conn is None:
+        from db_backend import get_backend
+        with get_backend().get_connection() as conn:
+            return export_snapshot(path, conn, batch_size)
+
+    writer = SnapshotWriter()
+    params_cache = {}
+    n_rows = 0
+    with conn.cursor() as cursor:
+        # 按 (package, version) 分段；MySQL 的排序规则不区分大小写，同一键可能被分成几段，读取时合并
+        key, segment = None, []
+        for package, version, api_name, params_json, has_return in _iter_signature_rows(cursor, batch_size):
+            if (package, version) != key:
+                if segment:
+                    writer.add_version_signatures(*key, segment)
+                key, segment = (package, version), []
+            params = params_cache.get(params_json)
+            if params is None:
+                params = params_cache[params_json] = tuple(json.loads(params_json)) if params_json else ()
+            segment.append((api_name, params, has_return))
+            n_rows += 1
+        if segment:
+            writer.add_version_signatures(*key, segment)
+
+        cursor.execute("SELECT package_name, package_version, top_level, version_id FROM top_level")
+        for package, version, top_level, version_id in cursor.fetchall():
+            writer.add_top_level(package, version, top_level, version_id)
+
+        cursor.execute("""SELECT d.package_name, t.package_version, d.version_id, d.api_name, d.param_list, d.has_return, d.diff
+            FROM differences d JOIN top_level t ON d.package_version = t.id
+            ORDER BY d.package_name, d.version_id, d.id""")
+        package, segment = None, []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            for row in rows:
+                if row[0] != package:
+                    if segment:
+                        writer.add_package_differences(package, segment)
+                    package, segment = row[0], []
+                segment.append(row[1:])
+            if not rows:
+                break
+        if segment:
+            writer.add_package_differences(package, segment)
+
+    writer.write(path)
+    return n_rows
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    sub_parsers = arg_parser.add_subparsers(dest='command', required=True)
+    p = sub_parsers.add_parser('export', help='dump the knowledge base into a snapshot file')
+    p.add_argument('-o', '--output', help='snapshot path', type=str, default='../data/kb.snapshot')
+    p = sub_parsers.add_parser('info', help='print snapshot table sizes')
+    p.add_argument('path', type=str)
+    p = sub_parsers.add_parser('query', help='look up signatures of a package version')
+    p.add_argument('path', type=str)
+    p.add_argument('package', type=str)
+    p.add_argument('version', type=str)
+    p.add_argument('api_name', type=str, nargs='?')
+    args = arg_parser.parse_args()
+
+    if args.command == 'export':
+        start = time.perf_counter()
+        n_rows = export_snapshot(args.output)
+        print(f"Exported {n_rows} API signatures to {args.output} in {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(args.output) / 2**20:.1f} MiB)")
+    else:
+        start = time.perf_counter()
+        with KBSnapshot(args.path) as kb:
+            opened = time.perf_counter() - start
+            if args.command == 'info':
+                print(f"{args.path}: created {kb.header['created']}, opened in {opened * 1000:.1f}ms")
+                print(f"  {len(kb)} signatures, {len(kb._ranges)} versions, {len(kb._top_levels)} top_level entries, "
+                      f"{len(kb._cols['diff.version'])} differences, {len(kb._cols['strings.offsets']) - 1} strings")
+            elif args.api_name:
+                print(kb.signature(args.package, args.version, args.api_name))
+            else:
+                for sig in kb.get_api_signatures(args.package, args.version):
+                    print(sig)
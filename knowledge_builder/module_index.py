@@ -0,0 +1,354 @@
+"""
+包目录的模块索引，替代 sniffer_thread 中原来的 Tree + go_to_that_node / tree_infer_levels。
+
+原实现每解析一条 `from x.y import z` 都要在兄弟节点列表中线性查找（find_node_by_name），
+收集叶子节点的 BFS 又用 list.pop(0)，包越宽越慢（botocore / sympy 这类有上千个模块的包尤为明显）。
+ModuleIndex 在建树时为每个目录建立 {名字: 子节点} 字典，并按 BFS 顺序记录所有 .py 叶子及其点分模块名：
+    - 每条 import 边的解析是按路径分段的字典查找，不再扫描兄弟列表
+    - modules: 点分模块名 -> 叶子节点（同名时取 BFS 中第一个），供按模块名直接取 cargo
+    - 叶子的模块名（原 leaf2root）在 BFS 建树时顺带算好
+    - 同一目录下同名的 .py / .pyi / .pyx 合并为一个模块：以 .py 为主，存根与 Cython 源码补充其中没有的定义；
+      只有 .pyi / .pyx 的模块（编译模块）单独作为叶子，可以被 import 解析到
+
+名字匹配规则与原 find_node_by_name 完全一致：子节点名相同，或 name.rstrip('.py') 相同，
+同一目录中先出现（listdir 顺序）的节点优先。
+
+re-export 的传播有两种：
+    - propagate_imports：原 tree_infer_levels 的单趟逆 BFS 传播，保留用于对比
+      （a/__init__ <- a/b/__init__ <- a/b/_impl 这类链只能传播一部分，星号导入整份复制 cargo）
+    - resolve_exports：按 import 依赖图的强连通分量拓扑序传播，环内用工作表迭代到不动点；
+      无环部分的 exports 是对被导入模块 exports 的 ChainMap 引用，不复制字典
+"""
+import os
+from collections import deque, ChainMap
+
+from source_provider import LOCAL_SOURCE
+
+SKIP_DIRS = ('test', 'tests', 'testing')
+MODULE_SUFFIXES = ('.py', '.pyi', '.pyx')   # 同名模块文件的优先级
+INIT_FILES = tuple('__init__' + suffix for suffix in MODULE_SUFFIXES)
+
+# 目录 / 非 .py 文件没有 cargo，共用一个只读的空字典
+_NO_CARGO = {}
+
+
+def is_private_module(name):
+    """私有模块（_xxx.py，__init__.py 除外）自身的 API 照常输出，但不接收 re-export"""
+    return name not in INIT_FILES and name[0] == '_'
+
+
+def merge_parsed(parsed, extra):
+    """把同一模块的 .pyi / .pyx 解析结果并入 (cargo, imports)，已有的定义优先"""
+    cargo, imports = parsed
+    extra_cargo, extra_imports = extra
+    for name, value in extra_cargo.items():
+        if name not in cargo:
+            cargo[name] = value
+        elif isinstance(cargo[name], dict) and isinstance(value, dict):
+            for method, args in value.items():
+                cargo[name].setdefault(method, args)
+    if extra_imports:
+        if imports is None:
+            imports = {}
+        for key, names in extra_imports.items():
+            imports.setdefault(key, names)
+    return cargo, imports
+
+
+class ModuleNode:
+    __slots__ = ('name', 'parent', 'children', 'lookup', 'cargo', 'imports', 'module_name', 'exports',
+                 'is_module', 'extra_sources')
+
+    def __init__(self, name, parent=None, is_module=None):
+        self.name = name
+        self.parent = parent
+        self.is_module = name.endswith('.py') if is_module is None else is_module
+        self.extra_sources = None   # 并入本模块的同名 .pyi / .pyx 路径
+        self.children = None    # 目录：子节点列表（listdir 顺序）
+        self.lookup = None      # 目录：{名字 或 name.rstrip('.py'): 子节点}，先出现者优先
+        self.cargo = {} if self.is_module else _NO_CARGO
+        self.imports = None     # parse_import 的结果
+        self.module_name = None # .py 叶子的点分模块名（__init__.py 为所在包名）
+        self.exports = None     # resolve_exports 的结果：cargo + re-export（只读）
+
+    def child(self, name):
+        if self.lookup is None:
+            return None
+        return self.lookup.get(name)
+
+    def __str__(self):
+        return str(self.name)
+
+
+class ModuleIndex:
+    def __init__(self, root_name):
+        self.root = ModuleNode(root_name)
+        self.leaves = []    # 所有 .py 叶子，BFS 顺序
+        self.modules = {}
+
+    @classmethod
+    def build(cls, module_path, parse_file, fs=LOCAL_SOURCE):
+        """
+        module_path: 包目录（或 fs 为 ArchiveSource 时归档内的包路径）
+        parse_file(full_path, fs) -> (cargo, imports)
+        """
+        index = cls(os.path.basename(module_path))
+        # (节点, 路径, 祖先节点名的点分串)；模块名与原 leaf2root 相同
+        queue = deque([(index.root, module_path, '')])
+        while queue:
+            node, full_path, package = queue.popleft()
+            name = node.name
+            if node.is_module:
+                node.module_name = package if name in INIT_FILES else f"{package}.{name.split('.')[0]}"
+                index.leaves.append(node)
+                index.modules.setdefault(node.module_name, node)
+            if name in SKIP_DIRS:
+                continue
+            if fs.isdir(full_path):
+                child_package = f"{package}.{name}" if package else name
+                items = fs.listdir(full_path)
+                owners = _module_owners(items)
+                children, lookup = node.children, node.lookup = [], {}
+                for item in items:
+                    owner = owners.get(item)
+                    child_node = ModuleNode(item, node, None if owner is None else owner == item)
+                    children.append(child_node)
+                    if item not in lookup:
+                        lookup[item] = child_node
+                    stripped = item.rstrip('.py')
+                    if stripped not in lookup:
+                        lookup[stripped] = child_node
+                    if owner == item and not item.endswith('.py'):
+                        # 编译模块：按模块名解析（__init__.pyi 同时作为包的 __init__.py）
+                        stem = item.rsplit('.', 1)[0]
+                        lookup.setdefault(stem, child_node)
+                        if item in INIT_FILES:
+                            lookup.setdefault('__init__.py', child_node)
+                    queue.append((child_node, os.path.join(full_path, item), child_package))
+                for item, owner in owners.items():
+                    if owner != item:
+                        owner_node = lookup[owner]
+                        if owner_node.extra_sources is None:
+                            owner_node.extra_sources = []
+                        owner_node.extra_sources.append(os.path.join(full_path, item))
+            elif node.is_module:
+                parsed = parse_file(full_path, fs)
+                for extra_path in node.extra_sources or ():
+                    parsed = merge_parsed(parsed, parse_file(extra_path, fs))
+                node.cargo, node.imports = parsed
+        return index
+
+    @staticmethod
+    def _walk(node, route_node_names):
+        for name in route_node_names:
+            node = node.child(name)
+            if node is None:
+                break
+        return node
+
+    def resolve(self, cur_node, visit_path):
+        """import 路径 -> 目标节点，与原 go_to_that_node 相同"""
+        route_node_names = visit_path.split('.')
+        parent = cur_node.parent
+        tmp_node = parent.child(route_node_names[0])
+        # go to the siblings of the current node
+        if tmp_node is not None:
+            tmp_node = self._walk(tmp_node, route_node_names[1:])
+        # from the topmost
+        elif route_node_names[0] == self.root.name:
+            return self._walk(self.root, route_node_names[1:])
+        # from its parent
+        elif route_node_names[0] == parent.name:
+            tmp_node = self._walk(parent, route_node_names[1:])
+
+        # we are still in the directory
+        if tmp_node is not None and tmp_node.is_module is not True:
+            tmp_node = tmp_node.child('__init__.py')
+        return tmp_node
+
+    def propagate_imports(self):
+        """把被导入模块中的定义合并到导入方的 cargo（由深到浅，私有模块除外）"""
+        for node in reversed(self.leaves):
+            if is_private_module(node.name):
+                continue
+            module_item_dict = node.imports
+            if module_item_dict is None:
+                continue
+            for k, v in module_item_dict.items():
+                if k is None or isinstance(k, int):
+                    continue
+                dst_node = self.resolve(node, k)
+                if dst_node is None:
+                    continue
+                if v[0] == '*':
+                    node.cargo.update(dst_node.cargo)
+                else:
+                    for api in v:
+                        if api in dst_node.cargo:
+                            node.cargo[api] = dst_node.cargo[api]
+
+    def import_edges(self):
+        """
+        {叶子: [(被导入的叶子, names)]}，names 为 None 表示星号导入，按 import 出现顺序
+        import 路径指向子包目录时取其 __init__.py；自身导入自身的边忽略
+        """
+        edges = {}
+        for node in self.leaves:
+            deps = edges[node] = []
+            if node.imports is None:
+                continue
+            for k, v in node.imports.items():
+                if k is None or isinstance(k, int):
+                    continue
+                dst_node = self.resolve(node, k)
+                if dst_node is not None and dst_node.lookup is not None:
+                    dst_node = dst_node.child('__init__.py')
+                if dst_node is None or dst_node is node or dst_node.module_name is None:
+                    continue
+                deps.append((dst_node, None if v[0] == '*' else v))
+        return edges
+
+    def resolve_exports(self):
+        """
+        为每个 .py 叶子计算 exports = cargo + re-export，语义与 propagate_imports 相同
+        （后出现的 import 覆盖先出现的同名定义），但对任意深度的 re-export 链与循环导入都传播完整。
+        私有模块同样计算 exports，以便经由它们的链条（a/__init__ <- a/_impl <- a/_core）能传播到底。
+        """
+        edges = self.import_edges()
+        for component in _strongly_connected_components(edges):
+            if len(component) == 1:
+                node = component[0]
+                node.exports = _layered_exports(node, edges[node])
+                continue
+
+            # 循环导入：工作表迭代到不动点，exports 原地合并（键只增不减）
+            # 同名定义在环内互相覆盖时可能来回振荡，处理次数设上限
+            importers = {node: [] for node in component}
+            for node in component:
+                node.exports = dict(node.cargo) if is_private_module(node.name) else node.cargo
+                for dst_node, _ in edges[node]:
+                    if dst_node in importers:
+                        importers[dst_node].append(node)
+            work = deque(component)
+            queued = set(component)
+            budget = len(component) * len(component)
+            while work and budget > 0:
+                budget -= 1
+                node = work.popleft()
+                queued.discard(node)
+                if _merge_exports(node.exports, edges[node]):
+                    for importer in importers[node]:
+                        if importer not in queued:
+                            queued.add(importer)
+                            work.append(importer)
+
+    def __len__(self):
+        return len(self.leaves)
+
+
+def _module_owners(items):
+    """
+    目录中的 .pyi / .pyx 文件 -> 所属模块的文件名：有同名 .py 时并入 .py，否则按 .pyi、.pyx 的顺序取第一个作为模块
+    返回 {文件名: 所属模块文件名}，只包含 .pyi / .pyx
+    """
+    names = set(items)
+    owners = {}
+    for item in items:
+        if not item.endswith(('.pyi', '.pyx')):
+            continue
+        stem = item.rsplit('.', 1)[0]
+        owners[item] = next(stem + suffix for suffix in MODULE_SUFFIXES if stem + suffix in names)
+    return owners
+
+
+def _layered_exports(node, deps):
+    """
+    无环的情况：被导入模块的 exports 已经确定，星号导入按引用叠加成 ChainMap（后出现的在上层），不复制字典。
+    具名导入写入最上层的字典：第一个星号导入之前的直接写入模块自身的 cargo（同原实现），私有模块除外；
+    只有一个星号导入、自身没有定义的模块（常见的 __init__.py）直接共享被导入模块的 exports。
+    """
+    layers = [node.cargo]
+    named = None if is_private_module(node.name) else node.cargo
+    for dst_node, names in deps:
+        exports = dst_node.exports
+        if names is None:
+            if exports:
+                layers.append(exports)
+                named = None
+            continue
+        for api in names:
+            if api in exports:
+                if named is None:
+                    named = {}
+                    layers.append(named)
+                named[api] = exports[api]
+    if len(layers) == 1:
+        return node.cargo
+    if len(layers) == 2 and not node.cargo and layers[1] is not named:
+        return layers[1]
+    return ChainMap(*reversed(layers))
+
+
+_MISSING = object()
+
+def _merge_exports(merged, deps):
+    """
+    把被导入模块的 exports 合并进 merged，返回是否有变化
+    逆序处理 import，每个名字只取优先级最高（最后出现）的来源，避免同一趟内先写后覆盖被当作变化
+    """
+    changed = False
+    seen = set()
+    for dst_node, names in reversed(deps):
+        exports = dst_node.exports
+        items = exports.items() if names is None else ((api, exports[api]) for api in names if api in exports)
+        for api, value in items:
+            if api in seen:
+                continue
+            seen.add(api)
+            if merged.get(api, _MISSING) is not value:
+                merged[api] = value
+                changed = True
+    return changed
+
+
+def _strongly_connected_components(edges):
+    """Tarjan（迭代实现）：按依赖在前的拓扑序返回强连通分量"""
+    index_of, lowlink = {}, {}
+    stack, on_stack = [], set()
+    components = []
+    counter = 0
+    for root in edges:
+        if root in index_of:
+            continue
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(edges[root]))]
+        while work:
+            node, it = work[-1]
+            for dst_node, _ in it:
+                if dst_node not in index_of:
+                    index_of[dst_node] = lowlink[dst_node] = counter
+                    counter += 1
+                    stack.append(dst_node)
+                    on_stack.add(dst_node)
+                    work.append((dst_node, iter(edges[dst_node])))
+                    break
+                if dst_node in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[dst_node])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member is node:
+                            break
+                    components.append(component)
+    return components
@@ -0,0 +1,86 @@
+"""
+按文件内容哈希缓存单个源码文件的解析结果，供 sniffer_thread 跨版本复用。
+
+同一个库相邻版本的大部分 .py 文件逐字节相同，缓存以 sha1(文件内容) 为键，
+保存 SourceVisitor 的结果 (函数/类 -> (args, has_return)) 与 parse_import 的结果，
+命中时无需再 decode / ast.parse。
+"""
+import os, sys
+import pickle
+import hashlib
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from global_config import PARSE_CACHE_DIR
+
+# 解析逻辑或 Python 版本变化时缓存自动失效
+CACHE_FORMAT = 1
+_SALT = f"{CACHE_FORMAT}:{sys.version_info.major}.{sys.version_info.minor}:".encode()
+
+
+class ParseCache:
+    """磁盘缓存：<cache_dir>/<2 位前缀>/<sha1>.pkl，写入用 os.replace 保证多进程安全"""
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(data: bytes, kind: str = '') -> str:
+        return hashlib.sha1(_SALT + kind.encode() + data).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.pkl')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                value = pickle.load(f)
+            self.hits += 1
+            return value
+        except Exception:
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Fail to write parse cache {path}: {e}")
+
+
+_cache = None
+_cache_dir = PARSE_CACHE_DIR
+
+def set_cache_dir(cache_dir):
+    """cache_dir 为空时关闭缓存"""
+    global _cache, _cache_dir
+    _cache, _cache_dir = None, cache_dir
+
+def get_cache():
+    global _cache
+    if _cache is None and _cache_dir:
+        _cache = ParseCache(_cache_dir)
+    return _cache
+
+def cached_parse(data: bytes, parse_func, kind: str = ''):
+    """
+    data: 文件原始字节
+    parse_func: bytes -> (cargo, imports)，未命中时调用并写回缓存
+    kind: 解析方式（如 '.pyi' / '.pyx'），同样的字节按不同方式解析时结果分开缓存
+    """
+    cache = get_cache()
+    if cache is None:
+        return parse_func(data)
+
+    key = cache.key(data, kind)
+    value = cache.get(key)
+    if value is None:
+        value = parse_func(data)
+        cache.put(key, value)
+    return value
@@ -1,296 +1,122 @@
 import ast
 import os
-import re
-import sys
-import json
+import time
+import argparse
 from packaging.version import parse as parse_version
 from db import *
+from global_config import PRUNE_API_SIGNATURES  # db 已把仓库根目录加入 sys.path
+from parse_cache import cached_parse, set_cache_dir
+from ast_extractor import extract_module
+from source_provider import LOCAL_SOURCE, open_source, is_archive, strip_archive_suffix
+from module_index import ModuleIndex, is_private_module, merge_parsed, MODULE_SUFFIXES
+from stub_extractor import extract_stub, extract_pyx, expand_includes
+from api_signature import make_signature, as_signature
+from api_lifetime import load_package_lifetimes, save_package_lifetimes, pruned_versions, version_ids
 import concurrent.futures
 
-def get_keywords(node):
-    args = node.args
-    arg_names = []
-    defaults = args.defaults
-    for arg in args.args:
-        arg_names += [arg.arg]
-    has_return = any(isinstance(n, ast.Return) for n in ast.walk(node))
-    # return (arg_names, len(defaults))
-    return (arg_names, int(has_return))
-
-class ClassVisitor(ast.NodeVisitor):
-    def __init__(self):
-        self.result = {} 
-    def visit_FunctionDef(self, node): 
-        kw_names = get_keywords(node)
-        self.result[node.name] = kw_names
-        return node
-    
-class SourceVisitor(ast.NodeVisitor):
-    def __init__(self):
-        self.result = {}
-    def visit_FunctionDef(self, node):
-        kw_names = get_keywords(node)
-        self.result[node.name] = kw_names
-        return node
-    def visit_ClassDef(self, node):
-        visitor = ClassVisitor()
-        visitor.visit(node)
-        self.result[node.name] = visitor.result
-        return node
-
-
-class Tree:
-    def __init__(self, name):
-        self.name = name
-        self.children = []
-        self.parent = None
-        self.cargo = {}
-        self.source = ''
-        self.ast = None
-    def __str__(self):
-        return str(self.name)
-
-def parse_import(tree):
-    module_item_dict = {}
-    try:
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ImportFrom):
-                if node.module is None and node.level not in module_item_dict:
-                    module_item_dict[node.level] = []
-                elif node.module not in module_item_dict:
-                   module_item_dict[node.module] = []
-                items = [nn.__dict__ for nn in node.names]
-                for d in items:
-                    if node.module is None:
-                        module_item_dict[node.level].append(d['name'])
-                    else:
-                        module_item_dict[node.module].append(d['name'])
-
-        return module_item_dict
-    except(AttributeError):
-        return None
- 
-def gen_AST(filename):
-    try:
-        source = open(filename).read()
-        tree = ast.parse(source, mode='exec')
-        return tree
-    except (SyntaxError,UnicodeDecodeError,):  # to avoid non-python code
-        pass
-        return None
-def parse_pyx(filename):
-    lines = open(filename).readlines()
-    all_func_names = []
-    for line in lines:
-        names = re.findall('def ([\s\S]*?)\(', str(line))
-        if len(names)>0:
-            all_func_names.append(names[0])
-
-def extract_class(filename):
-    try:
-        print(filename)
-        source = open(filename).read()
-        tree = ast.parse(source, mode='exec')
-        visitor = SourceVisitor()
-        visitor.visit(tree)
-        print('testing')
-        return visitor.result, tree
-    except Exception as e:  # to avoid non-python code
-        # fail passing python3 
-        if filename[-3:] == 'pyx':
-            parse_pyx(filename)
-        return {}, None  # return empty 
+# api_signatures 的批量写入方式，见 db.bulk_save_api_signatures
+LOAD_MODE = 'executemany'
+
+def extract_class(filename, fs=LOCAL_SOURCE):
+    print(filename)
+    return parse_module_file(filename, fs)
 
-def extract_class_from_source(source):
+def parse_source_bytes(data):
+    """
+    源码字节 -> (SourceVisitor 结果, parse_import 结果)，结果可被 parse_cache 按内容缓存
+    两者由 ast_extractor 在一次遍历中得到
+    """
+    source = data.decode("utf-8", errors="ignore")
     try:
-        tree = ast.parse(source, mode='exec')
-        visitor = SourceVisitor()
-        visitor.visit(tree)
-        return visitor.result, tree
+        info = extract_module(ast.parse(source, mode='exec'))
     except Exception as e:  # to avoid non-python code
-        #if filename[-3:] == 'pyx':
-        #    #print(filename)
-        #    parse_pyx(filename)
         print(e)
-        return {}, None# return empty 
+        return {}, None
+    return info.cargo, info.imports
 
-def build_dir_tree(node, base_path):
-    full_path = os.path.join(base_path, node.name)
-    if node.name in ['test', 'tests', 'testing']:
-        return
-    if os.path.isdir(full_path):
-        for item in os.listdir(full_path):
-            child_node = Tree(item)
-            child_node.parent = node
-            build_dir_tree(child_node, full_path)
-            node.children.append(child_node)
-    else:
-        if node.name.endswith('.py'):
-            try:
-                with open(full_path, 'rb') as f:
-                    source = f.read().decode("utf-8", errors="ignore")
-                node.source = source
-                res, tree = extract_class_from_source(source)
-                node.cargo = res
-                node.ast = tree
-            except Exception as e:
-                print(f"Error reading {full_path}: {e}")
-
-def leaf2root(node):
-    tmp_node = node
-    path_to_root = []
-    # not init.py
-    while tmp_node is not None:
-        path_to_root.append(tmp_node.name)
-        tmp_node = tmp_node.parent
-    if node.name == '__init__.py':
-        path_to_root = path_to_root[1:]
-        path_name = ".".join(reversed(path_to_root))
-        return path_name
-    else:
-        path_name = ".".join(reversed(path_to_root[1:]))
-        path_name = "{}.{}".format(path_name, node.name.split('.')[0])
-        return path_name
-
-def find_child_by_name(node, name):
-    for ch in node.children:
-        if ch.name == name:
-            return ch
-    return None
-def find_node_by_name(nodes, name):
-    for node in nodes:
-        if node.name == name or node.name.rstrip('.py')== name:
-            return node
-    return None
-def go_to_that_node(root, cur_node, visit_path):
-    route_node_names = visit_path.split('.')
-    route_length = len(route_node_names)
-    tmp_node = None
-    # go to the siblings of the current node
-    tmp_node =  find_node_by_name(cur_node.parent.children, route_node_names[0])
-    if tmp_node is not None:
-        for i in range(1,route_length):
-            tmp_node =  find_node_by_name(tmp_node.children, route_node_names[i])
-            if tmp_node is None:
-                break
-    # from the topmost 
-    elif route_node_names[0] == root.name:
-        tmp_node = root
-        for i in range(1,route_length):
-            tmp_node =  find_node_by_name(tmp_node.children, route_node_names[i])
-            if tmp_node is None:
-                break
-        return tmp_node
-    # from its parent 
-    elif route_node_names[0] == cur_node.parent.name:
-        tmp_node = cur_node.parent
-        for i in range(1,route_length):
-            tmp_node =  find_node_by_name(tmp_node.children, route_node_names[i])
-            if tmp_node is None:
-                break
+def parse_stub_bytes(data):
+    """.pyi 存根 -> (cargo, imports)"""
+    try:
+        return extract_stub(data.decode("utf-8", errors="ignore"))
+    except Exception as e:
+        print(e)
+        return {}, None
 
-    # we are still in the directory
-    if tmp_node is not None and tmp_node.name.endswith('.py') is not True:
-       tmp_node =  find_node_by_name(tmp_node.children, '__init__.py')
+def parse_pyx_bytes(data):
+    """Cython .pyx -> (cargo, imports)，只识别 def / cpdef 与类"""
+    return extract_pyx(data.decode("utf-8", errors="ignore"))
 
-    return tmp_node
+# 按后缀选择解析方式，缓存按后缀区分
+PARSERS = {'.py': parse_source_bytes, '.pyi': parse_stub_bytes, '.pyx': parse_pyx_bytes}
 
-def tree_infer_levels(root_node):
+def parse_module_file(full_path, fs=LOCAL_SOURCE):
+    """模块文件（.py / .pyi / .pyx）的解析函数：(cargo, imports)，按内容缓存"""
+    suffix = os.path.splitext(full_path)[1]
+    try:
+        data = fs.read_bytes(full_path)
+        if suffix == '.pyx':
+            # 按展开 include 之后的内容缓存，.pxi 变化时缓存随之失效
+            data = expand_includes(data, full_path, fs)
+        return cached_parse(data, PARSERS.get(suffix, parse_source_bytes), '' if suffix == '.py' else suffix)
+    except Exception as e:
+        print(f"Error reading {full_path}: {e}")
+        return {}, None
+
+def tree_infer_levels(index):
+    index.resolve_exports()
     API_name_lst = []
-    leaf_stack = []
-    working_queue = []
-    working_queue.append(root_node)
-
-    # bfs to search all I leafs
-    while len(working_queue)>0:
-        tmp_node = working_queue.pop(0)
-        if tmp_node.name.endswith('.py') == True:
-            leaf_stack.append(tmp_node)
-        working_queue.extend(tmp_node.children)
-
-    # visit all elements from the stack
-    for node in leaf_stack[::-1]:
-        # private modules
-        if node.name!='__init__.py' and node.name[0]=='_':
-            continue
-        module_item_dict = parse_import(node.ast)
-        if module_item_dict is None:
-            continue
-        for k, v in module_item_dict.items():
-            if k is None or isinstance(k, int):
-                continue
-            dst_node = go_to_that_node(root_node, node, k)
-            if dst_node is not None:
-                if v[0] =='*':
-                  for k_ch, v_ch in dst_node.cargo.items():
-                      node.cargo[k_ch] = v_ch
-                  k_ch_all = list(dst_node.cargo.keys())
-                else:
-                    for api in v:
-                        if api in dst_node.cargo:
-                            node.cargo[api]= dst_node.cargo[api]
-            else:
-                pass
-
-    for node in leaf_stack:
-        # get visit path 
-        API_prefix = leaf2root(node) 
-        node_API_lst = make_API_full_name(node.cargo, API_prefix)
-        API_name_lst.extend(node_API_lst)
-
+    for node in index.leaves:
+        cargo = node.cargo if is_private_module(node.name) else node.exports
+        API_name_lst.extend(make_API_signatures(cargo, node.module_name))
     return API_name_lst
 
-def make_API_full_name(meta_data, API_prefix):
+def make_API_signatures(meta_data, API_prefix):
+    """SourceVisitor 的结果 -> [APISignature]，限定名为 API_prefix.名字"""
     API_lst = []
     for k, v in meta_data.items():
         if k[0] == '_':
             continue  # 忽略私有函数或类
         if isinstance(v, tuple):
             # v = (参数列表, 是否有返回值)
-            API_name = "{}.{},{},{}".format(API_prefix, k, ";".join(v[0]), v[1])
-            API_lst.append(API_name)
+            API_lst.append(make_signature(f"{API_prefix}.{k}", v[0], v[1]))
         elif isinstance(v, dict):
-            # 类的 __init__
-            if '__init__' in v:
-                args = v['__init__']
-                API_name = "{}.{},{},{}".format(API_prefix, k, ";".join(args[0]), args[1])
-                API_lst.append(API_name)
-            else:
-                args = ([], 0)  # 默认无参数无返回值
-                API_name = "{}.{},{},{}".format(API_prefix, k, ";".join(args[0]), args[1])
-                API_lst.append(API_name)
+            # 类的 __init__，没有时默认无参数无返回值
+            args = v.get('__init__', ((), 0))
+            API_lst.append(make_signature(f"{API_prefix}.{k}", args[0], args[1]))
 
             # 类中其他方法
             for f_name, args in v.items():
                 if f_name[0] != '_':
-                    API_name = "{}.{}.{},{},{}".format(API_prefix, k, f_name, ";".join(args[0]), args[1])
-                    API_lst.append(API_name)
+                    API_lst.append(make_signature(f"{API_prefix}.{k}.{f_name}", args[0], args[1]))
 
     return API_lst
 
-def search_targets(root_dir, targets):
+def search_targets(root_dir, targets, fs=LOCAL_SOURCE):
      entry_points = []
-     for root, dirs, files in os.walk(root_dir):
+     for root, dirs, files in fs.walk(root_dir):
          n_found = 0
          for t in targets:
              if t in dirs :
                 entry_points.append(os.path.join(root, t))
                 n_found += 1
-             elif t+'.py' in files:
-                 entry_points.append(os.path.join(root, t+'.py'))
-                 n_found += 1
+             else:
+                 # 单文件模块；只有存根或 Cython 源码的编译模块同样作为入口
+                 module_file = next((t + suffix for suffix in MODULE_SUFFIXES if t + suffix in files), None)
+                 if module_file:
+                     entry_points.append(os.path.join(root, module_file))
+                     n_found += 1
          if n_found == len(targets):
              return entry_points
      return None
 
 
-def process_source_package(path, l_name):
+def process_source_package(path, l_name, fs=LOCAL_SOURCE):
     """
-    path: 解压后的源码目录
+    path: 解压后的源码目录（或 fs 为 ArchiveSource 时的归档路径）
     l_name: 库的顶层目录名，例如 numpy、torch
     返回 entry_points：可能的入口模块路径
     """
-    all_items = os.listdir(path)
+    all_items = fs.listdir(path)
     top_levels = []
 
     # 尝试根据 l_name 或 setup.py 中的提示找到顶层目录
@@ -302,34 +128,32 @@ def process_source_package(path, l_name):
 
     if not top_levels:
         # fallback：使用所有目录
-        top_levels = [item for item in all_items if os.path.isdir(os.path.join(path, item))]
+        top_levels = [item for item in all_items if fs.isdir(os.path.join(path, item))]
 
-    entry_points = search_targets(path, top_levels)
+    entry_points = search_targets(path, top_levels, fs)
     return entry_points
 
-def process_single_module(module_path):
+def process_single_module(module_path, fs=LOCAL_SOURCE):
     API_name_lst = []
     # process other modules !!!
-    if os.path.isfile(module_path):
-        name_segments =  os.path.basename(module_path).rstrip('.py*') # .py and .pyx
+    if fs.isfile(module_path):
+        if module_path.endswith('.py'):
+            name_segments =  os.path.basename(module_path).rstrip('.py*')
+        else:
+            name_segments = os.path.basename(module_path).rsplit('.', 1)[0]  # .pyi and .pyx
         # process a single file module
-        res, tree = extract_class(module_path)
-        node_API_lst = make_API_full_name(res, name_segments)
+        res, tree = extract_class(module_path, fs)
+        # 同名的 .pyi / .pyx 补充 .py 中没有的定义
+        stem, suffix = os.path.splitext(module_path)
+        if suffix in MODULE_SUFFIXES:
+            for extra_suffix in MODULE_SUFFIXES[MODULE_SUFFIXES.index(suffix) + 1:]:
+                if fs.isfile(stem + extra_suffix):
+                    res, tree = merge_parsed((res, tree), parse_module_file(stem + extra_suffix, fs))
+        node_API_lst = make_API_signatures(res, name_segments)
         API_name_lst.extend(node_API_lst)
     else:
-        # first_name = os.path.basename(module_path)
-        # working_dir = os.path.dirname(module_path)
-        # path = []
-        # cwd = os.getcwd() # save current working dir
-        # os.chdir(working_dir)
-        # root_node = Tree(first_name)
-        # build_dir_tree(root_node, working_dir)
-        # API_name_lst = tree_infer_levels(root_node)
-        # os.chdir(cwd) # go back cwd
-        first_name = os.path.basename(module_path)
-        root_node = Tree(first_name)
-        build_dir_tree(root_node, os.path.dirname(module_path))
-        API_name_lst = tree_infer_levels(root_node)
+        index = ModuleIndex.build(module_path, parse_module_file, fs)
+        API_name_lst = tree_infer_levels(index)
     return API_name_lst
 
 def normalize_name(name):
@@ -345,142 +169,432 @@ def extract_version(folder_name, lib_name):
         return folder_name[len(lib_name)+1:]  # +1 去除连字符
     return None
 
+def diff_version_apis(base_apis, current_apis):
+    """base_apis / current_apis 为 APISignature 的集合；base_apis 为 None 表示首个版本"""
+    if base_apis is None:
+        return {api: '=' for api in current_apis}
+
+    result = {}
+    for api in base_apis - current_apis:
+        result[api] = '-'  # 被删除
+    for api in current_apis - base_apis:
+        result[api] = '+'  # 新增
+    return result
+
 def get_diff_from_all_version_apis(all_version_apis):
     if not all_version_apis:
         return {}
 
     diff = {}
-    version_keys = list(all_version_apis.keys())
-    first_version = version_keys[0]
-
-    def to_hashable(api):
-        return (api[0], tuple(api[1]), api[2])  # 限定名, 参数, 返回标志
-
-    base_apis = {to_hashable(api) for api in all_version_apis[first_version]}
-    diff[first_version] = {api: '=' for api in base_apis}
-
-    for version in version_keys[1:]:
-        current_apis = {to_hashable(api) for api in all_version_apis[version]}
-        result = {}
-
-        for api in base_apis - current_apis:
-            result[api] = '-'  # 被删除
-        for api in current_apis - base_apis:
-            result[api] = '+'  # 新增
-
-        diff[version] = result
+    base_apis = None
+    for version, apis in all_version_apis.items():
+        current_apis = {as_signature(api) for api in apis}
+        diff[version] = diff_version_apis(base_apis, current_apis)
         base_apis = current_apis
 
     return diff
 
-def save_package_version_apis_diff(package_name, all_diff):
+def save_version_apis_diff(cursor, package_name, version, version_id, apis):
+    """
+    写入单个版本的 differences 记录，先删除该版本已有记录，重复执行不会产生重复行；
+    同时推进 diff_state，调用方应把两者放在同一事务中
+    返回是否写入成功（缺少 top_level 记录时返回 False）
+    """
+    # 获取 top_level 记录
+    cursor.execute("""
+        SELECT id FROM top_level
+        WHERE package_name=%s AND package_version=%s
+        LIMIT 1
+    """, (package_name, version))
+    result = cursor.fetchone()
+    if not result:
+        print(f"Warning: No top_level entry found for {package_name} {version}")
+        return False
+    top_level_id = result[0]
+
+    cursor.execute("""
+        UPDATE top_level SET version_id=%s WHERE id=%s
+    """, (version_id, top_level_id))
+
+    sql_list = []
+    for api_signature, diff_flag in apis.items():
+        api_name, params, has_return = api_signature
+        param_str = ', '.join(params)
+        sql_list.append((
+            top_level_id,
+            package_name,
+            version_id,
+            api_name,
+            param_str,
+            has_return,
+            diff_flag
+        ))
+
+    if not sql_list:
+        sql_list.append((top_level_id, package_name, version_id, '', '', False, '='))
+
+    cursor.execute("DELETE FROM differences WHERE package_version=%s", (top_level_id,))
+    cursor.executemany("""
+        INSERT INTO differences(
+            package_version, package_name, version_id,
+            api_name, param_list, has_return, diff
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, sql_list)
+
+    cursor.execute("""
+        INSERT INTO diff_state (package_name, last_version, last_version_id)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE last_version=VALUES(last_version), last_version_id=VALUES(last_version_id)
+    """, (package_name, version, version_id))
+    return True
+
+def save_package_version_apis_diff(package_name, all_diff, version_id_start=0):
+    """返回最后一个写入的 (version, version_id)，没有写入时返回 None"""
+    last_saved = None
     with get_connection() as conn:
         with conn.cursor() as cursor:
-            version_id_counter = 0
+            version_id_counter = version_id_start
             for version, apis in all_diff.items():
-                # 获取 top_level 记录
-                cursor.execute("""
-                    SELECT id, version_id FROM top_level
-                    WHERE package_name=%s AND package_version=%s
-                    LIMIT 1
-                """, (package_name, version))
-                result = cursor.fetchone()
-                if not result:
-                    print(f"Warning: No top_level entry found for {package_name} {version}")
-                    continue
-                top_level_id, version_id = result
-
-                # 这里可选择是否更新 version_id（如果你想同步 version_id）
-                cursor.execute("""
-                    UPDATE top_level SET version_id=%s WHERE id=%s
-                """, (version_id_counter, top_level_id))
-
-                sql_list = []
-                for api_signature, diff_flag in apis.items():
-                    api_name, params, has_return = api_signature
-                    param_str = ', '.join(params)
-                    sql_list.append((
-                        top_level_id,
-                        package_name,
-                        version_id_counter,
-                        api_name,
-                        param_str,
-                        has_return,
-                        diff_flag
-                    ))
-
-                if not sql_list:
-                    sql_list.append((top_level_id, package_name, version_id_counter, '', '', False, '='))
-
-                cursor.executemany("""
-                    INSERT INTO differences(
-                        package_version, package_name, version_id,
-                        api_name, param_list, has_return, diff
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, sql_list)
-
+                conn.begin()
+                if save_version_apis_diff(cursor, package_name, version, version_id_counter, apis):
+                    last_saved = (version, version_id_counter)
+                    version_id_counter += 1
                 conn.commit()
-                version_id_counter += 1
+    return last_saved
 
-def process_package(lib_name, root_dir="../packages"):
+def archive_folder_name(fname):
+    """归档文件名 -> 解压后的目录名；wheel 为 name-version-pyver-abi-plat.whl，只保留前两段"""
+    stem = strip_archive_suffix(fname)
+    if fname.endswith('.whl'):
+        stem = '-'.join(stem.split('-')[:2])
+    return stem
+
+def list_package_versions(lib_name, root_dir="../packages"):
+    """
+    返回 [(version, version_dir)]，按语义版本排序
+    root_dir 下既可以是解压后的目录（../packages），也可以是未解压的归档（../projects），
+    同一版本同时存在时优先使用目录
+    """
     lib_path = os.path.join(root_dir, lib_name)
     if not os.path.isdir(lib_path):
-        return
-
-    version_dirs = []
-    for fname in os.listdir(lib_path):
-        version = extract_version(fname, lib_name)
-        if version:
-            version_dirs.append((version, os.path.join(lib_path, fname)))
+        return []
+
+    found = {}
+    for fname in sorted(os.listdir(lib_path)):
+        path = os.path.join(lib_path, fname)
+        archive = is_archive(path)
+        version = extract_version(archive_folder_name(fname) if archive else fname, lib_name)
+        if not version:
+            continue
+        if version not in found or (found[version][1] and not archive):
+            found[version] = (path, archive)
+    version_dirs = [(version, path) for version, (path, _) in found.items()]
 
     # 按语义版本排序
     version_dirs.sort(key=lambda x: parse_version(x[0]))
+    return version_dirs
 
-    for version, v_dir in version_dirs:
-        print(f"Processing {v_dir}")
+def extract_version_apis(lib_name, version, v_dir):
+    """
+    解析单个版本的源码目录，不访问数据库（可在子进程中执行）
+    返回 [APISignature]，找不到入口时返回 None
+    """
+    with open_source(v_dir) as fs:
+        entry_points = process_source_package(v_dir, lib_name, fs)
+        if entry_points is None:
+            return None
+        version_api_list = []
+        for ep in entry_points:
+            version_api_list.extend(process_single_module(ep, fs))
+
+    return version_api_list
+
+def is_version_saved(lib_name, version):
+    return is_exist("SELECT 1 FROM api_signatures WHERE package_name=%s AND package_version=%s",
+                    (lib_name, version))
+
+def save_package_diff(lib_name, version_dirs, new_versions=()):
+    """
+    增量版本差异对比与存储：只 diff 上次 diff 之后的版本（各自与前一版本比较）。
+    若本次新入库的版本排在已 diff 的版本之前或就是其本身（补录旧版本 / 重做未完成的版本），则从该版本开始重新 diff。
+    """
+    if not version_dirs:
+        return
+    versions = [version for version, _ in version_dirs]
+
+    start = 0
+    state = get_diff_state(lib_name)
+    if state is not None and state[0] in versions:
+        last_idx = versions.index(state[0])
+        start = last_idx + 1
+        for idx, version in enumerate(versions[:start]):
+            if version in new_versions:
+                start = idx
+                break
+
+    # 账本：上次 diff 已覆盖、但仍记为 saved 的版本（如账本建立之前入库的版本）
+    job_states = get_job_states(lib_name)
+    mark_jobs(lib_name, [v for v in versions[:start] if job_states.get(v) == 'saved'], 'diffed')
 
-        if is_exist("SELECT 1 FROM api_signatures WHERE package_name=%s AND package_version=%s",
-                    (lib_name, version)):
+    if start >= len(versions):
+        print(f"API diff for {lib_name} is up to date")
+        return
+
+    base_apis, version_id = None, 0
+    if start > 0:
+        prev_version = versions[start - 1]
+        base_apis = set(get_api_signatures(lib_name, prev_version))
+        prev_version_id = state[1] if prev_version == state[0] else get_version_id(lib_name, prev_version)
+        version_id = (prev_version_id or 0) + 1
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            # API 生命周期与 differences 由同一批 diff 维护，先回退到本次起始版本
+            lifetimes = load_package_lifetimes(cursor, lib_name)
+            # 签名行已删除的版本（PRUNE_API_SIGNATURES）重放时按回退前的生命周期与原 version_id 还原
+            pruned = set(pruned_versions(cursor, lib_name).get(lib_name, ())) & set(versions[start:])
+            if pruned:
+                old_lifetimes, old_ids = lifetimes.copy(), {v: vid for vid, v in version_ids(cursor, lib_name)}
+                pruned &= set(old_ids)
+            lifetimes.truncate(version_id)
+
+            for version in versions[start:]:
+                t_start = time.perf_counter()
+                # 同一连接上读取签名、更新账本：持有连接时不能再从连接池取第二个（线程数多于连接数时会互相等待）
+                if version in pruned:
+                    current_apis = {make_signature(*sig) for sig in old_lifetimes.signatures_at(old_ids[version])}
+                else:
+                    current_apis = set(get_api_signatures(lib_name, version, cursor, derive=False))
+                apis = diff_version_apis(base_apis, current_apis)
+                base_apis = current_apis
+
+                conn.begin()
+                saved = save_version_apis_diff(cursor, lib_name, version, version_id, apis)
+                if saved:
+                    lifetimes.apply(version_id, apis)
+                    save_package_lifetimes(cursor, lib_name, lifetimes.pop_dirty())
+                    if PRUNE_API_SIGNATURES:
+                        delete_version_signatures(lib_name, version, cursor)
+                    version_id += 1
+                if job_states.get(version) in JOB_DONE_STATES:
+                    mark_jobs(lib_name, [version], 'diffed', seconds=time.perf_counter() - t_start,
+                              error=None if saved else 'no top_level entry', cursor=cursor)
+                conn.commit()
+
+    print(f"Saved API diff for {lib_name} ({len(versions) - start} versions)")
+
+def plan_package_versions(lib_name, version_dirs):
+    """
+    根据任务账本（build_jobs）决定需要抽取的版本，返回 (todo, 已 saved 但未 diffed 的版本)
+    - saved / diffed：跳过
+    - pending / extracted / failed：上次未完成，删除可能已写入的部分签名后重做
+    - 没有账本记录但已有签名（账本建立之前入库）：按 saved 记录
+    """
+    job_states = get_job_states(lib_name)
+    todo, undiffed, legacy = [], set(), []
+    for version, v_dir in version_dirs:
+        state = job_states.get(version)
+        if state in JOB_DONE_STATES or (state is None and is_version_saved(lib_name, version)):
             print(f"{lib_name} - {version} already exists in database")
+            if state is None:
+                legacy.append(version)
+            if state != 'diffed':
+                undiffed.add(version)
             continue
+        if state is not None:
+            delete_version_signatures(lib_name, version)
+        todo.append((version, v_dir))
+
+    mark_jobs(lib_name, legacy, 'saved')
+    mark_jobs(lib_name, [version for version, _ in todo], 'pending')
+    return todo, undiffed
+
+def save_extracted_version(lib_name, version, version_api_list, error=None, seconds=None):
+    """记录抽取结果并写入签名，返回是否写入成功"""
+    if error is not None:
+        print(f"Error processing {lib_name}-{version}: {error}")
+        mark_jobs(lib_name, [version], 'failed', error=error)
+        return False
+    if version_api_list is None:
+        mark_jobs(lib_name, [version], 'failed', error='no entry points')
+        return False
+
+    mark_jobs(lib_name, [version], 'extracted', seconds=seconds, n_apis=len(version_api_list))
+    t_start = time.perf_counter()
+    try:
+        bulk_save_api_signatures(lib_name, version, version_api_list, mode=LOAD_MODE)
+    except Exception as e:
+        print(f"Error saving {lib_name}-{version}: {e}")
+        mark_jobs(lib_name, [version], 'failed', error=repr(e))
+        return False
+    mark_jobs(lib_name, [version], 'saved', seconds=time.perf_counter() - t_start)
+    print(f"Saved {len(version_api_list)} APIs for {lib_name}-{version} to database")
+    return True
 
-        entry_points = process_source_package(v_dir, lib_name)
-        if entry_points is None:
+def process_package(lib_name, root_dir="../packages"):
+    version_dirs = list_package_versions(lib_name, root_dir)
+    todo, new_versions = plan_package_versions(lib_name, version_dirs)
+
+    for version, v_dir in todo:
+        print(f"Processing {v_dir}")
+
+        t_start = time.perf_counter()
+        try:
+            version_api_list, error = extract_version_apis(lib_name, version, v_dir), None
+        except Exception as e:
+            version_api_list, error = None, repr(e)
+        if save_extracted_version(lib_name, version, version_api_list, error, time.perf_counter() - t_start):
+            new_versions.add(version)
+
+    save_package_diff(lib_name, version_dirs, new_versions)
+
+"""
+进程池模式：以 (package, version) 为粒度分发解析任务，子进程只做 AST 解析并返回签名列表，
+数据库写入与版本 diff 均在父进程中完成。
+"""
+def estimate_version_cost(v_dir):
+    """以源码文件总字节数估计一个版本的解析开销（归档取文件大小）"""
+    if is_archive(v_dir):
+        return os.path.getsize(v_dir)
+    total = 0
+    for root, dirs, files in os.walk(v_dir):
+        dirs[:] = [d for d in dirs if d not in ['test', 'tests', 'testing']]
+        for f in files:
+            if f.endswith(MODULE_SUFFIXES):
+                try:
+                    total += os.path.getsize(os.path.join(root, f))
+                except OSError:
+                    pass
+    return total
+
+def make_chunks(jobs, n_workers, chunks_per_worker=8):
+    """
+    jobs: [(cost, lib_name, version, v_dir)]
+    大版本（如 numpy、torch）单独成块并最先提交，小版本合并成块以减少进程间通信，
+    避免大包排在队尾拖慢整体进度
+    """
+    jobs = sorted(jobs, key=lambda x: x[0], reverse=True)
+    total_cost = sum(job[0] for job in jobs)
+    target_cost = max(1, total_cost // max(1, n_workers * chunks_per_worker))
+
+    chunks, cur, cur_cost = [], [], 0
+    for cost, lib_name, version, v_dir in jobs:
+        if cost >= target_cost:
+            chunks.append([(lib_name, version, v_dir)])
+            continue
+        cur.append((lib_name, version, v_dir))
+        cur_cost += cost
+        if cur_cost >= target_cost:
+            chunks.append(cur)
+            cur, cur_cost = [], 0
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+def extract_chunk(chunk):
+    """子进程入口：返回 [(lib_name, version, version_api_list, error, 抽取耗时)]"""
+    results = []
+    for lib_name, version, v_dir in chunk:
+        t_start = time.perf_counter()
+        try:
+            version_api_list = extract_version_apis(lib_name, version, v_dir)
+            results.append((lib_name, version, version_api_list, None, time.perf_counter() - t_start))
+        except Exception as e:
+            results.append((lib_name, version, None, repr(e), time.perf_counter() - t_start))
+    return results
+
+def process_packages_in_pool(all_packages, root_dir="../packages", n_workers=None):
+    n_workers = n_workers or os.cpu_count()
+
+    package_versions, pending, new_versions, jobs = {}, {}, {}, []
+    for lib_name in all_packages:
+        version_dirs = list_package_versions(lib_name, root_dir)
+        if not version_dirs:
             continue
+        package_versions[lib_name] = version_dirs
 
-        version_api_list = []
+        todo, new_versions[lib_name] = plan_package_versions(lib_name, version_dirs)
 
-        for ep in entry_points:
-            API_name_lst = process_single_module(ep)
-            if API_name_lst is None:
-                continue
-
-            for api_full_str in API_name_lst:
-                parts = api_full_str.split(",")
-                api_qualname = parts[0]
-                params = parts[1].split(";") if parts[1] else []
-                has_return = int(parts[2])
-                version_api_list.append([api_qualname, params, has_return])
-
-        save_api_signatures(lib_name, version, version_api_list)
-        print(f"Saved {len(version_api_list)} APIs for {lib_name}-{version} to database")
-
-    # 版本差异对比与存储
-    if version_dirs:
-        all_version_apis = {}
-        for version, _ in version_dirs:
-            version_apis = get_api_signatures(lib_name, version)
-            all_version_apis[version] = version_apis
-
-        api_diff = get_diff_from_all_version_apis(all_version_apis)
-        save_package_version_apis_diff(lib_name, api_diff)
-        print(f"Saved API diff for {lib_name}")
+        # 同一个包的各版本规模相近，只对最新版本做一次估计
+        cost = estimate_version_cost(todo[-1][1]) if todo else 0
+        for version, v_dir in todo:
+            jobs.append((cost, lib_name, version, v_dir))
+        pending[lib_name] = len(todo)
+
+    # 已全部入库的包直接做 diff（包括上次中断在 diff 阶段的包）
+    for lib_name in [name for name, n in pending.items() if n == 0]:
+        save_package_diff(lib_name, package_versions[lib_name], new_versions[lib_name])
+
+    chunks = make_chunks(jobs, n_workers)
+    print(f"Dispatching {len(jobs)} versions in {len(chunks)} chunks to {n_workers} workers")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(extract_chunk, chunk): chunk for chunk in chunks}
+
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                # 工作进程崩溃（如内存耗尽）时其余未完成的块也会以 BrokenProcessPool 失败：块内版本记为 failed，
+                # 各包的其它版本照常 diff
+                print(f"Error processing chunk: {e}")
+                results = [(lib_name, version, None, f"chunk failed: {e!r}", None) for lib_name, version, _ in futures[future]]
+
+            for lib_name, version, version_api_list, error, seconds in results:
+                try:
+                    if save_extracted_version(lib_name, version, version_api_list, error, seconds):
+                        new_versions[lib_name].add(version)
+                except Exception as e:
+                    print(f"Error saving {lib_name}-{version}: {e}")
+
+                pending[lib_name] -= 1
+                if pending[lib_name] == 0:
+                    try:
+                        save_package_diff(lib_name, package_versions[lib_name], new_versions[lib_name])
+                    except Exception as e:
+                        print(f"Error saving diff for {lib_name}: {e}")
+
+def print_job_status():
+    print(f"{'state':10}{'versions':>10}{'apis':>12}{'extract s':>12}{'save s':>12}{'diff s':>12}{'apis/s':>12}")
+    for state, n_versions, n_apis, extract_s, save_s, diff_s in get_job_summary():
+        busy = extract_s + save_s
+        rate = n_apis / busy if busy else 0
+        print(f"{state:10}{n_versions:>10}{n_apis:>12}{extract_s:>12.1f}{save_s:>12.1f}{diff_s:>12.1f}{rate:>12.0f}")
+    failed = get_failed_jobs(20)
+    if failed:
+        print("\nRecent failures:")
+        for lib_name, version, error, updated_at in failed:
+            print(f"  {updated_at} {lib_name}-{version}: {error}")
 
 def main():
-    root_dir = "../packages"
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-r', '--root', help='unpacked packages dir, or ../projects to read archives directly', type=str, default='../packages')
+    arg_parser.add_argument('-w', '--workers', help='number of workers', type=int, default=None)
+    arg_parser.add_argument('--thread', help='use the legacy thread pool (one task per package)', action='store_true')
+    arg_parser.add_argument('--cache-dir', help='parse cache dir, empty string to disable', type=str, default=None)
+    arg_parser.add_argument('--load-mode', help='api_signatures bulk load mode', choices=BULK_LOAD_MODES, default='executemany')
+    arg_parser.add_argument('--status', help='print the build_jobs ledger summary and exit', action='store_true')
+    args = arg_parser.parse_args()
+
+    if args.status:
+        print_job_status()
+        return
+
+    global LOAD_MODE
+    LOAD_MODE = args.load_mode
+    if args.cache_dir is not None:
+        set_cache_dir(args.cache_dir)
+
+    root_dir = args.root
     all_packages = os.listdir(root_dir)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=32) as executor:
+    if not args.thread:
+        process_packages_in_pool(all_packages, root_dir, args.workers)
+        return
+
+    workers = args.workers or 32
+    reserve_connections(workers)  # 每个线程同时最多持有一个连接，池不小于线程数就不会互相等待
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
         futures = [executor.submit(process_package, lib_name, root_dir) for lib_name in all_packages]
 
         for future in concurrent.futures.as_completed(futures):
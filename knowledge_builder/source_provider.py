@@ -0,0 +1,206 @@
+"""
+源码读取抽象：sniffer_thread / get_all_apis_update 既可以读取解压后的目录（../packages），
+也可以直接读取 ../projects 下的 .tar.gz / .zip / .whl 归档，无需先运行 uncompress_package.py。
+
+    archive = '../projects/requests/requests-2.31.0.tar.gz'
+    with open_source(archive) as fs:
+        fs.listdir(os.path.join(archive, 'requests'))
+
+归档中的路径以归档文件路径为根（<archive>/<member>），与解压后目录的布局一致
+（归档内只有一个顶层目录时去掉这一层，同 uncompress_package.py）。
+tar 只能顺序读取，打开时流式读一遍，只把源码与 egg-info 元数据留在内存中；zip / whl 按需读取成员。
+"""
+import os
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+
+ARCHIVE_SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.tar', '.zip', '.whl')
+KEEP_SUFFIXES = ('.py', '.pyi', '.pyx', '.pxi')   # .pxi 由 .pyx 通过 include 引入
+KEEP_EGG_INFO = ('top_level.txt', 'SOURCES.txt', 'RECORD')
+KEEP_ROOT_FILES = ('pyproject.toml',)   # get_top_level_from_package 在缺少 top_level.txt 时读取
+
+
+def is_archive(path):
+    return path.endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def strip_archive_suffix(name):
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def is_wanted_member(parts):
+    """parts: 归档内路径的各级名字；data_collection/uncompress_package.py 的 stream 模式也使用这一规则"""
+    name = parts[-1]
+    if name.endswith(KEEP_SUFFIXES):
+        return True
+    if name in KEEP_ROOT_FILES and len(parts) <= 2:  # 去掉顶层目录之前 / 之后
+        return True
+    return name in KEEP_EGG_INFO and len(parts) > 1 and parts[-2].endswith(('.egg-info', '.dist-info'))
+
+
+def safe_member_parts(name):
+    """拒绝绝对路径与 '..'，防止写到目标目录之外"""
+    parts = [p for p in PurePosixPath(name.replace('\\', '/')).parts if p not in ('', '.')]
+    if not parts or parts[0] == '/' or '..' in parts:
+        return None
+    return parts
+
+
+class LocalSource:
+    """解压后的目录，直接使用 os"""
+    def __init__(self, root):
+        self.root = root
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def isfile(self, path):
+        return os.path.isfile(path)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def read_bytes(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def read_text(self, path):
+        with open(path, 'r') as f:
+            return f.read()
+
+    def walk(self, path):
+        return os.walk(path)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveSource(LocalSource):
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self._files = {}        # 相对路径 -> bytes（tar）或 ZipInfo（zip）
+        self._children = {'': []}
+        self._zip = None
+
+        members = []
+        if zipfile.is_zipfile(archive_path):
+            self._zip = zipfile.ZipFile(archive_path)
+            for info in self._zip.infolist():
+                if not info.is_dir():
+                    members.append((info.filename, info))
+        else:
+            with tarfile.open(archive_path, mode='r|*') as tf:
+                for member in tf:
+                    if member.isfile():
+                        parts = safe_member_parts(member.name)
+                        data = tf.extractfile(member).read() if parts and is_wanted_member(parts) else None
+                        members.append((member.name, data))
+
+        entries = [(parts, value) for parts, value in ((safe_member_parts(n), v) for n, v in members) if parts]
+        # 归档内只有一个顶层目录时去掉这一层
+        tops = {parts[0] for parts, _ in entries}
+        strip = len(tops) == 1 and all(len(parts) > 1 for parts, _ in entries)
+        for parts, value in entries:
+            if strip:
+                parts = parts[1:]
+            if value is None or not is_wanted_member(parts):
+                continue
+            self._add(parts, value)
+
+    def _add(self, parts, value):
+        for i in range(len(parts)):
+            parent = '/'.join(parts[:i])
+            name = parts[i]
+            rel = '/'.join(parts[:i + 1])
+            if rel in self._children or rel in self._files:
+                continue
+            self._children[parent].append(name)
+            if i < len(parts) - 1:
+                self._children[rel] = []
+        self._files['/'.join(parts)] = value
+
+    def _rel(self, path):
+        path = os.path.normpath(path)
+        if path == self.root:
+            return ''
+        if not path.startswith(self.root + os.sep):
+            raise FileNotFoundError(path)
+        return path[len(self.root) + 1:].replace(os.sep, '/')
+
+    def listdir(self, path):
+        rel = self._rel(path)
+        if rel not in self._children:
+            raise NotADirectoryError(path)
+        return list(self._children[rel])
+
+    def isdir(self, path):
+        try:
+            return self._rel(path) in self._children
+        except FileNotFoundError:
+            return False
+
+    def isfile(self, path):
+        try:
+            return self._rel(path) in self._files
+        except FileNotFoundError:
+            return False
+
+    def exists(self, path):
+        return self.isdir(path) or self.isfile(path)
+
+    def read_bytes(self, path):
+        value = self._files.get(self._rel(path))
+        if value is None:
+            raise FileNotFoundError(path)
+        if isinstance(value, zipfile.ZipInfo):
+            return self._zip.read(value)
+        return value
+
+    def read_text(self, path):
+        return self.read_bytes(path).decode('utf-8')
+
+    def walk(self, path):
+        """与 os.walk(topdown=True) 相同，调用方可以修改 dirs 剪枝"""
+        rel = self._rel(path)
+        if rel not in self._children:
+            return
+        stack = [(path, rel)]
+        while stack:
+            top, rel = stack.pop()
+            dirs, files = [], []
+            for name in self._children[rel]:
+                child = f"{rel}/{name}" if rel else name
+                (dirs if child in self._children else files).append(name)
+            yield top, dirs, files
+            for name in reversed(dirs):
+                child = f"{rel}/{name}" if rel else name
+                if child in self._children:
+                    stack.append((os.path.join(top, name), child))
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+
+LOCAL_SOURCE = LocalSource('.')
+
+
+def open_source(path):
+    """归档文件返回 ArchiveSource，否则按目录处理（LOCAL_SOURCE）"""
+    if is_archive(path):
+        return ArchiveSource(os.path.normpath(path))
+    return LOCAL_SOURCE
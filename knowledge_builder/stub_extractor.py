@@ -0,0 +1,261 @@
+"""
+.pyi 存根与 Cython .pyx 源码的签名抽取，结果格式与 SourceVisitor / parse_import 相同：
+    cargo:   {函数名: (args, has_return)} / {类名: {方法名: (args, has_return)}}
+    imports: {module 或 level: [names]}
+
+numpy / pandas / lxml 这类库的大量公开 API 只存在于编译模块中，源码里只有 .pyx 或 .pyi：
+    - .pyi 用 ast 解析；存根没有函数体，has_return 由返回注解决定（-> None 为 0）；
+      没有返回注解时与 .py 一样看函数体中是否有 return 语句
+    - .pyx 不是合法的 Python，用 tokenize 逐个逻辑行识别 def / cpdef 函数、class / cdef class 及其方法，
+      cdef 函数只能在 C 层调用，不记录；解析出错时返回已识别的部分。
+      lxml 等库把大部分代码放在 `include "xxx.pxi"` 引入的文件中，解析前先用 expand_includes 展开
+作用域规则与 SourceVisitor 一致：记录模块级函数与类中的方法（嵌套类的方法平铺到外层类），
+函数内部的定义不记录，args 只包含普通位置参数（args.args）。
+"""
+import io
+import os
+import re
+import ast
+import tokenize
+
+from ast_extractor import extract_module
+
+STUB_SUFFIXES = ('.pyi', '.pyx')
+
+_STMT_BLOCK_FIELDS = ('body', 'handlers', 'orelse', 'finalbody', 'cases')
+_INCLUDE_RE = re.compile(rb'^([ \t]*)include[ \t]+[\'"]([^\'"]+)[\'"][ \t]*(?:#.*)?$', re.M)
+MAX_INCLUDE_DEPTH = 8
+
+
+def _stub_has_return(node):
+    returns = node.returns
+    if returns is None:
+        # 没有返回注解时（如带函数体的存根）与 .py 相同：有任意 return（包括裸 return）即为 1
+        return int(any(isinstance(n, ast.Return) for n in ast.walk(node)))
+    return int(not (isinstance(returns, ast.Constant) and returns.value is None))
+
+
+def _stub_scope(stmts, scope, in_class):
+    for node in stmts:
+        if isinstance(node, ast.FunctionDef):
+            scope[node.name] = ([a.arg for a in node.args.args], _stub_has_return(node))
+        elif isinstance(node, ast.ClassDef) and not in_class:
+            scope[node.name] = members = {}
+            _stub_scope(node.body, members, True)
+        else:
+            # if / try 等语句块；类中的嵌套类平铺到外层类（同 ClassVisitor）
+            for field in _STMT_BLOCK_FIELDS:
+                _stub_scope(getattr(node, field, None) or [], scope, in_class)
+
+
+def extract_stub(source):
+    """.pyi 源码 -> (cargo, imports)"""
+    tree = ast.parse(source, mode='exec')
+    cargo = {}
+    _stub_scope(tree.body, cargo, False)
+    return cargo, extract_module(tree).imports
+
+
+class _Block:
+    __slots__ = ('depth', 'kind', 'name', 'params', 'scope', 'has_return')
+
+    def __init__(self, depth, kind, name=None, params=None, scope=None):
+        self.depth = depth      # 块头所在的缩进层级
+        self.kind = kind        # 'def'（Python 可见的函数）/ 'cdef'（C 函数）/ 'class'
+        self.name = name
+        self.params = params
+        self.scope = scope      # def：记录到的字典（None 表示不记录）；class：方法记录到的字典
+        self.has_return = False
+
+
+def _split_top_level(tokens, sep):
+    """按最外层的 sep 切分 token 字符串列表"""
+    parts, current, level = [], [], 0
+    for tok in tokens:
+        if tok in ('(', '[', '{'):
+            level += 1
+        elif tok in (')', ']', '}'):
+            level -= 1
+        if tok == sep and level == 0:
+            parts.append(current)
+            current = []
+        else:
+            current.append(tok)
+    parts.append(current)
+    return parts
+
+
+def _find_top_level(tokens, target, start=0):
+    level = 0
+    for i in range(start, len(tokens)):
+        tok = tokens[i]
+        if tok == target and level == 0:
+            return i
+        if tok in ('(', '[', '{'):
+            level += 1
+        elif tok in (')', ']', '}'):
+            level -= 1
+    return -1
+
+
+def _param_name(tokens):
+    """'int x=1' / 'double[:, ::1] arr' / 'object o not None' / 'x: int' -> 参数名"""
+    for sep in ('=', ':'):
+        i = _find_top_level(tokens, sep)
+        if i >= 0:
+            tokens = tokens[:i]
+    while len(tokens) >= 2 and tokens[-1] == 'None' and tokens[-2] in ('not', 'or'):
+        tokens = tokens[:-2]
+    level = 0
+    name = None
+    for tok in tokens:
+        if tok in ('(', '[', '{'):
+            level += 1
+        elif tok in (')', ']', '}'):
+            level -= 1
+        elif level == 0 and tok.isidentifier():
+            name = tok
+    return name
+
+
+def _parse_params(tokens):
+    """括号内的 token -> 普通位置参数名（同 get_keywords：不含仅位置参数、*args 及其后的参数）"""
+    params = []
+    for part in _split_top_level(tokens, ','):
+        if not part:
+            continue
+        if part[0] in ('*', '**'):
+            break
+        if part == ['/']:
+            params = []
+            continue
+        name = _param_name(part)
+        if name:
+            params.append(name)
+    return params
+
+
+def _parse_pyx_import(tokens, imports):
+    """from X import a, b（cimport 是 C 层导入，不处理）"""
+    i, level = 1, 0
+    while i < len(tokens) and tokens[i] in ('.', '...'):
+        level += len(tokens[i])
+        i += 1
+    module = []
+    while i < len(tokens) and tokens[i] != 'import':
+        if tokens[i] == 'cimport':
+            return
+        module.append(tokens[i])
+        i += 1
+    if i >= len(tokens):
+        return
+    key = ''.join(module) or level
+    names = imports.setdefault(key, [])
+    expect_name = True
+    for tok in tokens[i + 1:]:
+        if tok in ('(', ')'):
+            continue
+        if tok == ',':
+            expect_name = True
+        elif expect_name:
+            names.append(tok)
+            expect_name = False
+
+
+def expand_includes(data, path, fs, depth=0):
+    """
+    把 .pyx 中的 `include "xxx.pxi"` 替换为被引入文件的内容（按 include 行的缩进），相对 path 所在目录查找；
+    找不到的文件保持原样。fs 为 source_provider 中的 LocalSource / ArchiveSource
+    """
+    if depth >= MAX_INCLUDE_DEPTH or b'include' not in data:
+        return data
+    base_dir = os.path.dirname(path)
+
+    def replace(match):
+        indent, name = match.group(1), match.group(2).decode('utf-8', errors='ignore')
+        include_path = os.path.join(base_dir, name)
+        try:
+            included = fs.read_bytes(include_path)
+        except Exception:
+            return match.group(0)
+        included = expand_includes(included, include_path, fs, depth + 1)
+        if indent:
+            included = b'\n'.join(indent + line if line.strip() else line for line in included.split(b'\n'))
+        return included
+
+    return _INCLUDE_RE.sub(replace, data)
+
+
+def extract_pyx(source):
+    """.pyx 源码 -> (cargo, imports)"""
+    cargo, imports = {}, {}
+    blocks = []
+
+    def close(block):
+        if block.kind == 'def' and block.scope is not None:
+            block.scope[block.name] = (block.params, int(block.has_return))
+
+    def handle_line(tokens, depth):
+        while blocks and blocks[-1].depth >= depth:
+            close(blocks.pop())
+        if not tokens or tokens[0] == '@':
+            return
+
+        in_function = any(b.kind != 'class' for b in blocks)
+        outer_class = next((b for b in blocks if b.kind == 'class'), None)
+        scope = None if in_function else (outer_class.scope if outer_class else cargo)
+
+        head = tokens[0]
+        colon = _find_top_level(tokens, ':')
+        paren = _find_top_level(tokens, '(')
+        block = None
+        if head in ('def', 'cpdef') and 0 < paren < len(tokens) and colon > paren:
+            name = tokens[paren - 1]
+            close_paren = _find_top_level(tokens, ')', paren + 1)
+            if name.isidentifier() and close_paren > paren:
+                block = _Block(depth, 'def', name, _parse_params(tokens[paren + 1:close_paren]), scope)
+                if scope is not None:
+                    scope[name] = None  # 先占位，保持与 SourceVisitor 相同的顺序
+        elif head in ('class', 'cdef', 'ctypedef') and 'class' in tokens[:colon if colon > 0 else len(tokens)]:
+            i = tokens.index('class')
+            if i + 1 < len(tokens) and tokens[i + 1].isidentifier():
+                name = tokens[i + 1]
+                if scope is None:
+                    members = None
+                elif outer_class is not None:
+                    members = outer_class.scope
+                else:
+                    members = cargo[name] = {}
+                block = _Block(depth, 'class', name, scope=members)
+        elif head == 'cdef' and 0 < paren < colon:
+            block = _Block(depth, 'cdef')
+        elif head == 'from':
+            _parse_pyx_import(tokens, imports)
+
+        if block is not None:
+            if block.kind == 'class' and block.scope is None:
+                block.kind = 'cdef'  # 函数内定义的类：其中的方法不记录
+            blocks.append(block)
+        if 'return' in tokens:
+            for b in blocks:
+                b.has_return = True
+
+    depth = 0
+    line = []
+    readline = io.StringIO(source).readline
+    try:
+        for tok in tokenize.generate_tokens(readline):
+            if tok.type == tokenize.INDENT:
+                depth += 1
+            elif tok.type == tokenize.DEDENT:
+                depth -= 1
+            elif tok.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                handle_line(line, depth)
+                line = []
+            elif tok.type not in (tokenize.NL, tokenize.COMMENT, tokenize.STRING):
+                line.append(tok.string)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    while blocks:
+        close(blocks.pop())
+    return cargo, imports
@@ -9,11 +9,13 @@ from code_completion.eval     import get_normed_fqn, REPAIR_TASK_DIR
 from code_completion.myTypes  import CompletionType
 from code_completion.utils    import get_completion_type
 from task_construction.arg_validity_checker import ArgumentsAnalyser
+from knowledge_builder.api_index            import APISignatureIndex, pinned_version
 
 REPAIR_RES_DIR = os.path.join(RESULT_BASE_DIR, 'repaired')
 
 arg_parser = argparse.ArgumentParser()
 arg_parser.add_argument('-m', '--model', help='model name', type=str, required=True)
+arg_parser.add_argument('-i', '--index', help='API signature index snapshot (knowledge_builder/api_index.py or kb_snapshot.py)', type=str, default=None)
 
 conn = pymysql.connect(**DB_CONFIG)
 cursor = conn.cursor()
@@ -22,6 +24,7 @@ if __name__ == '__main__':
     args  = arg_parser.parse_args()
     MODEL = args.model
     print(f'[LOG] Evaluating Repairment of {MODEL}')
+    api_index = APISignatureIndex.load(args.index) if args.index else None
 
     try:
         with open(f'{REPAIR_RES_DIR}/{MODEL}.pkl','rb') as f:
@@ -32,7 +35,12 @@ if __name__ == '__main__':
         print('[WARN] Please run eval.py first.')
         exit(0)
 
-    sig_match, cr = 0, 0
+    def in_kb_version(fqn, constrain_str):
+        """修复后的 API 是否存在于 lib==V 中；没有 --index 或约束不是固定版本时不计"""
+        version = pinned_version(constrain_str)
+        return bool(api_index is not None and version and fqn and api_index.exists(fqn.split('.')[0], version, fqn))
+
+    sig_match, cr, in_kb = 0, 0, 0
     for todo, repair in tqdm(zip(todos, repaired)):
         tid, stmt, pred_fqn, desc, api_sig = todo
         _, repair_stmt = repair
@@ -55,11 +63,16 @@ if __name__ == '__main__':
 
             if(repair_stmt==gt_stmt):
                 cr += 1
+                if api_index is not None and in_kb_version(get_normed_fqn(task, gt_stmt, True)[0], constrain_str):
+                    in_kb += 1
                 continue
     
             repair_fqn, repair_call_str, repair_call_node = get_normed_fqn(task, repair_stmt, True)
             gt_fqn,     gt_call_str,     gt_call_node     = get_normed_fqn(task, gt_stmt,     True)
 
+            if in_kb_version(repair_fqn, constrain_str):
+                in_kb += 1
+
             # API Name Match
             if gt_fqn in [repair_fqn, task.orig_pred_api_name]:
                 sig_match += 1
@@ -89,3 +102,5 @@ if __name__ == '__main__':
 
     print(f'RIGHT FQN: {sig_match} ({sig_match*100.0/len(todos)})')
     print(f'RSR:  {cr} ({cr*100.0/len(todos)})')
+    if api_index is not None:
+        print(f'IN KB: {in_kb} ({in_kb*100.0/len(todos)})')
@@ -1,7 +1,7 @@
 import os, re
-from get_api_signatures import get_all_call_apis_from_sources
+from get_api_signatures import get_all_call_apis_from_sources, iter_file_analyses, get_API_calls
 from version_resolver import get_all_dependencies
-from func_extractor import get_all_funcnode_from_sources
+from func_extractor import get_all_funcnode_from_sources, get_strict_top_level_functions
 from db import save_api_calls, save_func_info
 
 # Target TPLs (lib names)
@@ -68,17 +68,23 @@ def print_results(results):
     for item in results:
         print(f"{item['api']:<40} {item['file']:<40} {item['lineno']:<8} {item['end_lineno']:<8} {item['version'] or 'N/A'}")
 
-def extract_repo_api(project_dir):
+def prepare_repo(project_dir):
+    """解析依赖并列出源码文件：(dep_dict, py_files)；没有依赖或目标 TPL 不超过 5 个时返回 None"""
     print(f"[INFO] 提取依赖版本信息...")
     deps = get_all_dependencies(project_dir)
-    if len(deps) == 0: return
+    if len(deps) == 0: return None
     dep_dict = build_package_version_dict(deps)
     
     cnt_lib = len(set(dep_dict.keys()) & TPLs)
-    if cnt_lib <= 5: return
+    if cnt_lib <= 5: return None
 
     print(f"[INFO] 提取源代码文件...")
-    py_files = get_py_files(project_dir)
+    return dep_dict, get_py_files(project_dir)
+
+def extract_repo_api(project_dir, repo=None):
+    repo = repo or prepare_repo(project_dir)
+    if repo is None: return
+    dep_dict, py_files = repo
 
     print(f"[INFO] 提取 API 调用...")
     apis = get_all_call_apis_from_sources(py_files, dep_dict)
@@ -87,20 +93,35 @@ def extract_repo_api(project_dir):
     save_api_calls(apis)
 
 """处理 Function-Level Task"""
-def extract_repo_func(project_dir):
-    print(f"[INFO] 提取依赖版本信息...")
-    deps = get_all_dependencies(project_dir)
-    if len(deps) == 0: return
-    dep_dict = build_package_version_dict(deps)
-    
-    cnt_lib = len(set(dep_dict.keys()) & TPLs)
-    if cnt_lib <= 5: return
-
-    print(f"[INFO] 提取源代码文件...")
-    py_files = get_py_files(project_dir)
+def extract_repo_func(project_dir, repo=None):
+    repo = repo or prepare_repo(project_dir)
+    if repo is None: return
+    dep_dict, py_files = repo
 
     print(f"[INFO] 提取包含 TPL 调用 的 Function 定义 ...")
     funcs = get_all_funcnode_from_sources(py_files, dep_dict)
 
     print(f"[INFO] 保存到数据库...")
     save_func_info(funcs)
+
+def collect_repo_tasks(project_dir):
+    """
+    extract_all 的工作进程调用：依赖与文件列表只解析一次，每个文件只解析一次（FileAnalysis），
+    API-Level 与 Function-Level 共用；返回 (apis, funcs)，由主进程统一写库
+    """
+    repo = prepare_repo(project_dir)
+    if repo is None: return [], []
+    dep_dict, py_files = repo
+
+    print(f"[INFO] 提取 API 调用与包含 TPL 调用的 Function 定义...")
+    apis, funcs = [], []
+    for analysis in iter_file_analyses(py_files):
+        try:
+            apis.extend(get_API_calls(analysis.code, analysis.file_path, dep_dict, analysis))
+        except Exception as e:
+            print(f"[ERROR] {analysis.file_path}: {e}")
+        try:
+            funcs.extend(get_strict_top_level_functions(analysis.file_path, dep_dict, analysis=analysis))
+        except Exception as e:
+            print(f"[ERROR] {analysis.file_path}: {e}")
+    return apis, funcs
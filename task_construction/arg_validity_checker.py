@@ -1,14 +1,51 @@
 """
 ArgumentsAnalyser: 用于分析 Function Call 中的实参、提取实参中涉及的 variable name
 GlobalVariableDefFinder: 获取所有的 intra-file dependency 变量名
+defined_names / get_varnames_in_call: 上面两者的单节点版本，供 func_calls_visitor.FileCallVisitor 在一次遍历中使用
 """
 
+import io
 import ast
 from typing import Dict, List, Any, Set
 
+def split_source_lines(source: str) -> List[str]:
+    """同 ast 内部的 _splitlines_no_ff：只按 \\r\\n、\\r、\\n 分行并保留换行符"""
+    return io.StringIO(source, newline='').readlines()
+
+def source_segment(lines: List[str], node: ast.AST, padded: bool = False):
+    """
+    同 ast.get_source_segment，但使用预先切分好的行：
+    ast.get_source_segment 每次调用都会重新切分整个文件，对同一文件多次调用时代价与文件大小成正比
+    """
+    try:
+        if node.end_lineno is None or node.end_col_offset is None:
+            return None
+        lineno = node.lineno - 1
+        end_lineno = node.end_lineno - 1
+        col_offset = node.col_offset
+        end_col_offset = node.end_col_offset
+    except AttributeError:
+        return None
+
+    if end_lineno == lineno:
+        return lines[lineno].encode()[col_offset:end_col_offset].decode()
+
+    first_line = lines[lineno].encode()
+    padding = ''.join(c if c in '\f\t' else ' ' for c in first_line[:col_offset].decode()) if padded else ''
+    first = padding + first_line[col_offset:].decode()
+    last = lines[end_lineno].encode()[:end_col_offset].decode()
+    return ''.join([first] + lines[lineno + 1:end_lineno] + [last])
+
 class ArgumentsAnalyser():
     def __init__(self, source_code: str):
         self.source_code = source_code
+        self._lines = None
+
+    def get_source_segment(self, node: ast.AST):
+        """同 ast.get_source_segment(self.source_code, node)，源码只切分一次"""
+        if self._lines is None:
+            self._lines = split_source_lines(self.source_code)
+        return source_segment(self._lines, node)
 
     def extract_arguments_info(self, call_node: ast.Call) -> Dict[str, List[Dict]]:
         """
@@ -39,7 +76,7 @@ class ArgumentsAnalyser():
         分析单个参数节点，区分字符串、变量名等类型
         """    
         try:
-            src = ast.get_source_segment(self.source_code, arg_node)
+            src = self.get_source_segment(arg_node)
         except UnicodeDecodeError as e:
             src = ''
     
@@ -84,7 +121,7 @@ class ArgumentsAnalyser():
         
         # 处理属性访问
         elif isinstance(arg_node, ast.Attribute):
-            arg_info['value'] = ast.get_source_segment(self.source_code, arg_node)
+            arg_info['value'] = self.get_source_segment(arg_node)
             arg_info['value_type'] = 'attribute'
             arg_info['is_expression'] = True
         
@@ -108,7 +145,7 @@ class ArgumentsAnalyser():
         
         # 处理其他表达式
         else:
-            arg_info['value'] = ast.get_source_segment(self.source_code, arg_node)
+            arg_info['value'] = self.get_source_segment(arg_node)
             arg_info['value_type'] = 'expression'
             arg_info['is_expression'] = True
         
@@ -125,6 +162,39 @@ class ArgumentsAnalyser():
                 var_names.add(item['value'])
         return var_names
 
+def defined_names(node: ast.AST) -> List[str]:
+    """
+    node 本身在所在作用域中定义的变量名（不递归子节点）：
+    赋值 / 注解赋值 / for / with / := 的 Name（及 Tuple 中的 Name）目标，函数名与类名
+    """
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(node, (ast.AnnAssign, ast.For, ast.NamedExpr)):
+        targets = [node.target]
+    elif isinstance(node, ast.With):
+        targets = [item.optional_vars for item in node.items if item.optional_vars]
+    else:
+        return []
+
+    names = []
+    for target in targets:
+        if isinstance(target, ast.Name):
+            names.append(target.id)
+        elif isinstance(target, ast.Tuple):
+            names.extend(elt.id for elt in target.elts if isinstance(elt, ast.Name))
+    return names
+
+def get_varnames_in_call(call_node: ast.Call) -> Set[str]:
+    """
+    同 ArgumentsAnalyser(...).get_varnames_in_args(call_node)：只有直接为 Name 的实参（位置参数与关键字参数的值）是 variable，
+    不需要为每个实参截取源码
+    """
+    var_names = {arg.id for arg in call_node.args if isinstance(arg, ast.Name)}
+    var_names.update(kw.value.id for kw in call_node.keywords if isinstance(kw.value, ast.Name))
+    return var_names
+
 class GlobalVariableDefFinder(ast.NodeVisitor):
     """
     一个访问者，用于查找在模块全局作用域中定义的所有变量名。
@@ -134,57 +204,18 @@ class GlobalVariableDefFinder(ast.NodeVisitor):
         super().__init__()
         self.defined_vars = set()
 
-    def visit_Assign(self, node):
-
-        for target in node.targets:
-            if isinstance(target, ast.Name):
-                self.defined_vars.add(target.id)
-            elif isinstance(target, ast.Tuple):
-                for elt in target.elts:
-                    if isinstance(elt, ast.Name):
-                        self.defined_vars.add(elt.id)
+    def _visit_def_node(self, node):
+        self.defined_vars.update(defined_names(node))
         self.generic_visit(node)
 
-    def visit_AnnAssign(self, node):
-        if isinstance(node.target, ast.Name):
-            self.defined_vars.add(node.target.id)
-        self.generic_visit(node)
+    visit_Assign = visit_AnnAssign = visit_For = visit_With = visit_NamedExpr = _visit_def_node
 
+    """不进入函数与类内部"""
     def visit_FunctionDef(self, node):
         self.defined_vars.add(node.name)
 
-    def visit_AsyncFunctionDef(self, node):
-        self.defined_vars.add(node.name)
-
-    def visit_ClassDef(self, node):
-        self.defined_vars.add(node.name)
-
-    def visit_For(self, node):
-        if isinstance(node.target, ast.Name):
-            self.defined_vars.add(node.target.id)
-        elif isinstance(node.target, ast.Tuple):
-            for elt in node.target.elts:
-                if isinstance(elt, ast.Name):
-                    self.defined_vars.add(elt.id)
-        self.generic_visit(node)
-
-    def visit_With(self, node):
-        for item in node.items:
-            if item.optional_vars:
-                if isinstance(item.optional_vars, ast.Name):
-                    self.defined_vars.add(item.optional_vars.id)
-                elif isinstance(item.optional_vars, ast.Tuple):
-                    for elt in item.optional_vars.elts:
-                        if isinstance(elt, ast.Name):
-                            self.defined_vars.add(elt.id)
-        self.generic_visit(node)
-
-    def visit_NamedExpr(self, node):
-        if isinstance(node.target, ast.Name):
-            self.defined_vars.add(node.target.id)
-        self.generic_visit(node)
+    visit_AsyncFunctionDef = visit_ClassDef = visit_FunctionDef
 
     """忽略 inter file dependencies"""
     def visit_Import(self, node): return
     def visit_ImportFrom(self, node): return
-
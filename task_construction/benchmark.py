@@ -0,0 +1,120 @@
+"""
+task_construction 性能基准
+
+    # 单次遍历的 FileCallVisitor vs 原来的 parent 标注 + AssignVisitor + get_api_ref_id
+    # + GlobalVariableDefFinder + 逐调用 KWVisitor / ArgumentsAnalyser（get_API_calls 的调用抽取）
+    python benchmark.py calls                      # 默认使用下载的仓库（GITHUB_CODE_DOWNLOAD_BASE_DIR）
+    python benchmark.py calls -d ../code_completion -n 3
+"""
+import os, sys, ast, time, argparse
+
+from func_calls_visitor import FileCallVisitor, FuncCallVisitor, KWVisitor
+from arg_validity_checker import ArgumentsAnalyser, GlobalVariableDefFinder
+from get_api_signatures import AssignVisitor, get_api_ref_id
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from global_config import GITHUB_CODE_DOWNLOAD_BASE_DIR
+
+
+def load_corpus(corpus_dir, max_files=None):
+    """解析目录下所有 .py 文件，读取与解析耗时不计入对比"""
+    corpus = []
+    for root, dirs, files in os.walk(corpus_dir):
+        for f in files:
+            if not f.endswith('.py'):
+                continue
+            try:
+                with open(os.path.join(root, f), 'r', encoding='utf-8') as fp:
+                    code = fp.read()
+                corpus.append((code, ast.parse(code)))
+            except Exception:
+                continue
+            if max_files and len(corpus) >= max_files:
+                return corpus
+    return corpus
+
+
+def legacy_analyse(code, tree):
+    """原实现：四次整树遍历，每个调用再单独遍历一次子树、为每个实参截取源码"""
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            child.parent = node
+    visitor = AssignVisitor()
+    visitor.visit(tree)
+    id2fullname = get_api_ref_id(tree)
+
+    arg_analyser = ArgumentsAnalyser(code)
+    finder = GlobalVariableDefFinder()
+    finder.visit(tree)
+    intra_file_deps = finder.defined_vars
+
+    func_calls = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            call_visitor = FuncCallVisitor()
+            call_visitor.visit(node.func)
+            kw_visitor = KWVisitor()
+            try:
+                kw_visitor.visit(node)
+                lineno = getattr(node, "lineno", -1)
+                end_lineno = getattr(node, "end_lineno", lineno)
+                if arg_analyser.get_varnames_in_args(node).issubset(intra_file_deps):
+                    func_calls.append((call_visitor.name, kw_visitor.name, lineno, end_lineno))
+            except Exception:
+                func_calls.append((call_visitor.name, "", getattr(node, "lineno", -1), getattr(node, "end_lineno", -1)))
+    return func_calls, visitor.class_obj, visitor.instance_to_class, id2fullname
+
+
+def single_pass_analyse(code, tree):
+    visitor = FileCallVisitor().visit(tree)
+    return visitor.func_calls(), visitor.class_obj, visitor.instance_to_class, visitor.id2fullname
+
+
+def measure(analyse, corpus, repeat):
+    """每轮都重新解析，避免上一轮留下的 parent 属性影响下一轮"""
+    best, results = None, None
+    for _ in range(repeat):
+        trees = [ast.parse(code) for code, _ in corpus]
+        results = []
+        start = time.perf_counter()
+        for (code, _), tree in zip(corpus, trees):
+            try:
+                results.append(analyse(code, tree))
+            except Exception as e:
+                results.append(type(e).__name__)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def run_calls(args):
+    corpus = load_corpus(args.dir, args.max_files)
+    n_nodes = sum(1 for _, tree in corpus for _ in ast.walk(tree))
+    print(f"Corpus: {len(corpus)} files, {n_nodes} AST nodes")
+    if not corpus:
+        print('[Err] empty corpus')
+        return
+
+    old, expected = measure(legacy_analyse, corpus, args.repeat)
+    new, actual = measure(single_pass_analyse, corpus, args.repeat)
+
+    mismatch = sum(1 for a, b in zip(expected, actual) if a != b)
+    n_calls = sum(len(r[0]) for r in actual if not isinstance(r, str))
+    print(f"calls kept: {n_calls}")
+    print(f"multi-pass:  {old:.3f}s ({len(corpus) / old:.0f} files/s, {n_nodes / old / 1e6:.2f}M nodes/s)")
+    print(f"single pass: {new:.3f}s ({len(corpus) / new:.0f} files/s, {n_nodes / new / 1e6:.2f}M nodes/s), speedup x{old / new:.1f}")
+    print(f"mismatch: {mismatch}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    sub_parsers = arg_parser.add_subparsers(dest='bench', required=True)
+
+    p = sub_parsers.add_parser('calls', help='single-pass FileCallVisitor vs per-file multi-pass call extraction')
+    p.add_argument('-d', '--dir', help='corpus dir of .py files', type=str, default=GITHUB_CODE_DOWNLOAD_BASE_DIR)
+    p.add_argument('-m', '--max-files', help='stop after this many files', type=int, default=None)
+    p.add_argument('-n', '--repeat', help='repeat and keep the best time', type=int, default=1)
+    p.set_defaults(func=run_calls)
+
+    args = arg_parser.parse_args()
+    args.func(args)
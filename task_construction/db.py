@@ -1,54 +1,85 @@
-import pymysql, os, sys
+import os, sys
 from typing import List, Dict
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from global_config import DB_CONFIG_BASE, DB_NAME, DB_CONFIG
+from db_backend import get_backend
 
+MYSQL_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS api_calls (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        api_name VARCHAR(1024) NOT NULL,
+        file_path TEXT NOT NULL,
+        lineno INT NOT NULL,
+        end_lineno INT NOT NULL,
+        version_type VARCHAR(32) DEFAULT NULL,
+        version VARCHAR(128) DEFAULT NULL,
+        UNIQUE KEY uniq_api_call (api_name(191), file_path(300), lineno)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS func_task (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        api_name VARCHAR(1024) NOT NULL,
+        file_path TEXT NOT NULL,
+        lineno INT NOT NULL,
+        end_lineno INT NOT NULL,
+        version_type VARCHAR(32) DEFAULT NULL,
+        version VARCHAR(128) DEFAULT NULL,
+        bg_off INT NOT NULL,
+        ed_off INT NOT NULL,
+        UNIQUE KEY uniq_api_call (api_name(191), file_path(300), lineno)
+    )
+    """,
+]
+
+SQLITE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS api_calls (
+        id INTEGER PRIMARY KEY,
+        api_name TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        lineno INTEGER NOT NULL,
+        end_lineno INTEGER NOT NULL,
+        version_type TEXT DEFAULT NULL,
+        version TEXT DEFAULT NULL,
+        UNIQUE (api_name, file_path, lineno)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS func_task (
+        id INTEGER PRIMARY KEY,
+        api_name TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        lineno INTEGER NOT NULL,
+        end_lineno INTEGER NOT NULL,
+        version_type TEXT DEFAULT NULL,
+        version TEXT DEFAULT NULL,
+        bg_off INTEGER NOT NULL,
+        ed_off INTEGER NOT NULL,
+        UNIQUE (api_name, file_path, lineno)
+    )
+    """,
+]
 def create_database_if_not_exists():
-    with pymysql.connect(**DB_CONFIG_BASE) as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(f"""
-                CREATE DATABASE IF NOT EXISTS {DB_NAME}
-                CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci
-            """)
+    get_backend().create_database()
 
 
 def get_connection():
-    return pymysql.connect(**DB_CONFIG)
+    """获取连接：MySQL 从共享连接池获取（with 块结束时归还），SQLite 直接打开数据库文件"""
+    return get_backend().get_connection()
 
 
 def init_db():
     """初始化数据库表结构"""
     try:
-        create_database_if_not_exists()
+        backend = get_backend()
+        backend.create_database()
+        tables = SQLITE_TABLES if backend.name == 'sqlite' else MYSQL_TABLES
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS api_calls (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        api_name VARCHAR(1024) NOT NULL,
-                        file_path TEXT NOT NULL,
-                        lineno INT NOT NULL,
-                        end_lineno INT NOT NULL,
-                        version_type VARCHAR(32) DEFAULT NULL,
-                        version VARCHAR(128) DEFAULT NULL,
-                        UNIQUE KEY uniq_api_call (api_name(191), file_path(300), lineno)
-                    )
-                """)
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS func_task (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        api_name VARCHAR(1024) NOT NULL,
-                        file_path TEXT NOT NULL,
-                        lineno INT NOT NULL,
-                        end_lineno INT NOT NULL,
-                        version_type VARCHAR(32) DEFAULT NULL,
-                        version VARCHAR(128) DEFAULT NULL,
-                        bg_off INT NOT NULL,
-                        ed_off INT NOT NULL,
-                        UNIQUE KEY uniq_api_call (api_name(191), file_path(300), lineno)
-                    )
-                """)
+                for sql in tables:
+                    cursor.execute(sql)
     except Exception as e:
         print(f"数据库初始化失败: {e}")
         exit(0)
@@ -66,60 +97,51 @@ def classify_version_type(version_str: str) -> str:
     # 其他情况归类为范围（保守处理）
     return "范围"
 
-def save_api_calls(call_data: List[Dict]):
-    """保存 API 调用记录到数据库，新增版本类型和版本字段"""
-    with get_connection() as conn:
-        with conn.cursor() as cursor:
-            for item in call_data:
-                version_str = item.get("version", "") or ""
-                version_type = classify_version_type(version_str)
-                if version_type == '不明确': continue
-                try:
-                    cursor.execute(
-                        """INSERT INTO api_calls 
-                        (api_name, file_path, lineno, end_lineno, version_type, version)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        """,
-                        (
-                            item["api"],
-                            item["file"],
-                            item["lineno"],
-                            item["end_lineno"],
-                            version_type,
-                            version_str
-                        )
-                    )
-                except pymysql.IntegrityError:
-                    # 唯一约束冲突时忽略
-                    continue
-
-def save_func_info(func_info: List[Dict]):
+def _api_call_rows(call_data: List[Dict]):
+    for item in call_data:
+        version_str = item.get("version", "") or ""
+        version_type = classify_version_type(version_str)
+        if version_type == '不明确': continue
+        yield (item["api"], item["file"], item["lineno"], item["end_lineno"], version_type, version_str)
+
+def _func_task_rows(func_info: List[Dict]):
+    for item in func_info:
+        version_str = item.get("version", "") or ""
+        version_type = classify_version_type(version_str)
+        if version_type == '不明确': continue
+        yield (item["api"], item["file"], item["lineno"], item["end_lineno"], version_type, version_str,
+               item['bg_off'], item['ed_off'])
+
+def _insert_ignore_many(table, columns, rows, batch_size):
+    """
+    按批 executemany，只忽略唯一键冲突的行；返回写入行数
+    MySQL 不用 INSERT IGNORE：它还会把超长、类型不符等数据错误降级为警告，这些行会被截断后写入而不是报错
+    """
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    if get_backend().name == 'sqlite':
+        sql = sql.replace('INSERT INTO', 'INSERT OR IGNORE INTO', 1)
+    else:
+        sql += " ON DUPLICATE KEY UPDATE id=id"  # 冲突行不变，affected rows 为 0
+    rows = list(rows)
+    inserted = 0
     with get_connection() as conn:
         with conn.cursor() as cursor:
-            for item in func_info:
-                version_str = item.get("version", "") or ""
-                version_type = classify_version_type(version_str)
-                if version_type == '不明确': continue
-                try:
-                    cursor.execute(
-                        """INSERT INTO func_task
-                        (api_name, file_path, lineno, end_lineno, version_type, version, bg_off, ed_off)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        (
-                            item["api"],
-                            item["file"],
-                            item["lineno"],
-                            item["end_lineno"],
-                            version_type,
-                            version_str,
-                            item['bg_off'],
-                            item['ed_off'],
-                        )
-                    )
-                except pymysql.IntegrityError:
-                    # 唯一约束冲突时忽略
-                    continue
+            for i in range(0, len(rows), batch_size):
+                inserted += cursor.executemany(sql, rows[i:i + batch_size]) or 0
+    return inserted
+
+def save_api_calls(call_data: List[Dict], batch_size: int = 5000):
+    """保存 API 调用记录到数据库，新增版本类型和版本字段；版本不明确的记录不保存"""
+    return _insert_ignore_many(
+        'api_calls', ('api_name', 'file_path', 'lineno', 'end_lineno', 'version_type', 'version'),
+        _api_call_rows(call_data), batch_size
+    )
+
+def save_func_info(func_info: List[Dict], batch_size: int = 5000):
+    return _insert_ignore_many(
+        'func_task', ('api_name', 'file_path', 'lineno', 'end_lineno', 'version_type', 'version', 'bg_off', 'ed_off'),
+        _func_task_rows(func_info), batch_size
+    )
 
 
 def get_api_calls_by_file(file_path: str) -> List[Dict]:
@@ -146,4 +168,4 @@ def get_api_calls_by_file(file_path: str) -> List[Dict]:
 # 初始化测试
 if __name__ == "__main__":
     init_db()
-    print("✅ MySQL 数据库和表结构初始化完成")
+    print(f"✅ {get_backend().name} 数据库和表结构初始化完成")
@@ -1,6 +1,23 @@
-import os, sys, pickle
+"""
+扫描下载的仓库，提取 API-Level（api_calls）与 Function-Level（func_task）任务
+
+    python extract_all.py [-w 16] [-t 600] [-g 30] [-b 5000] [-c 32]
+
+开始扫描前先批量解析所有仓库的依赖（version_resolver.resolve_dependencies）：汇总全部无版本说明的包，
+并发请求发布时间索引中还没有的包，结果写入各仓库的 dep_version.pkl，工作进程直接读取。
+每个仓库在单独的子进程中处理，只解析一次依赖、遍历一次文件；单个仓库超过 timeout 秒时放弃（SIGALRM），
+卡在 C 调用里收不到信号的仓库由主进程在 timeout + grace 秒后杀掉其进程，不会拖住整个运行；
+子进程崩溃时只记该仓库失败（见 run_repos）。子进程只返回结果，由主进程中唯一的写库者攒批写入。
+"""
+import os, sys, time, signal, pickle, asyncio, argparse
+import multiprocessing
+import multiprocessing.connection
+from collections import deque
 from tqdm import tqdm
-from api_extractor import extract_repo_api, extract_repo_func
+from api_extractor import collect_repo_tasks
+from db import save_api_calls, save_func_info
+from version_resolver import resolve_dependencies
+from release_index import get_release_index
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from global_config import GITHUB_CODE_DOWNLOAD_BASE_DIR
@@ -28,21 +45,143 @@ def get_target_repo_names():
         print(f"[Err] {e}")
     return set(info[1] for info in repo_infos)
     
-if __name__ == '__main__':
-    folder_names = get_folders_in_directory(REPO_DATA_DIR)
-    target_names = get_target_repo_names()
-
-    for folder_name in tqdm(folder_names):
+def select_repo_folders(folder_names, target_names):
+    """只保留 <repo>-<commit_sha> 形式、且有 commit date 信息的仓库目录"""
+    selected = []
+    for folder_name in folder_names:
         try:
             repo_name, commit_sha = folder_name.rsplit("-", 1)
-            if not repo_name in target_names: continue
         except ValueError:
             continue
-        
-        try:
-            repo_base_dir = os.path.join(REPO_DATA_DIR, folder_name)
-            extract_repo_api(repo_base_dir) # api
-            extract_repo_func(repo_base_dir) # func
-        except Exception as e:
+        if repo_name in target_names:
+            selected.append(folder_name)
+    return selected
+
+class RepoTimeout(BaseException):
+    """继承 BaseException：提取过程中按文件 except Exception 的地方不会吞掉超时"""
+
+def _raise_timeout(signum, frame):
+    raise RepoTimeout()
+
+def scan_repo(folder_name, timeout=None):
+    """在工作进程中执行：返回 (folder_name, apis, funcs, error, seconds)"""
+    start = time.perf_counter()
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')  # Windows 上没有 SIGALRM，不限时
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        apis, funcs = collect_repo_tasks(os.path.join(REPO_DATA_DIR, folder_name))
+        return folder_name, apis, funcs, None, time.perf_counter() - start
+    except RepoTimeout:
+        return folder_name, [], [], f"timeout after {timeout}s", time.perf_counter() - start
+    except Exception as e:
+        return folder_name, [], [], str(e), time.perf_counter() - start
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+def _scan_worker(conn, folder_name, timeout):
+    """子进程入口：结果经管道发回主进程"""
+    conn.send(scan_repo(folder_name, timeout))
+    conn.close()
+
+def _kill(process):
+    process.kill()
+    process.join()
+
+def run_repos(folder_names, workers=None, timeout=None, grace=30):
+    """每个仓库在主进程自己启动的子进程中扫描，最多 workers 个同时运行，每个仓库产出一次 (folder_name, apis, funcs, error)
+
+    SIGALRM 打断不了卡在 C 扩展里的调用，主进程另外给每个仓库 timeout + grace 秒的期限，超期时只杀掉该仓库的进程；
+    子进程崩溃（如内存耗尽）时管道读到 EOF，也只记该仓库失败，其它仓库不受影响。
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = deque(folder_names)
+    running = {}  # 管道读端 -> (process, folder_name, 截止时间)
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                folder_name = pending.popleft()
+                reader, writer = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=_scan_worker, args=(writer, folder_name, timeout), daemon=True)
+                process.start()
+                writer.close()  # 只留子进程持有写端，子进程退出后读端才能读到 EOF
+                deadline = time.monotonic() + timeout + grace if timeout else None
+                running[reader] = (process, folder_name, deadline)
+
+            deadlines = [deadline for _, _, deadline in running.values() if deadline is not None]
+            wait_for = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            for reader in multiprocessing.connection.wait(list(running), timeout=wait_for):
+                process, folder_name, _ = running.pop(reader)
+                try:
+                    _, apis, funcs, error, _ = reader.recv()
+                except EOFError:
+                    process.join()
+                    apis, funcs, error = [], [], f"worker died (exit code {process.exitcode})"
+                else:
+                    process.join()
+                reader.close()
+                yield folder_name, apis, funcs, error
+
+            now = time.monotonic()
+            for reader in [r for r, (_, _, deadline) in running.items() if deadline is not None and deadline <= now]:
+                process, folder_name, _ = running.pop(reader)
+                _kill(process)
+                reader.close()
+                yield folder_name, [], [], f"killed after {timeout + grace}s"
+    finally:
+        for process, _, _ in running.values():
+            _kill(process)
+
+class TaskWriter:
+    """主进程中唯一的写库者：缓存各仓库的结果，攒够 batch_size 条后批量写入"""
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.apis, self.funcs = [], []
+        self.n_apis = self.n_funcs = 0
+
+    def add(self, apis, funcs):
+        self.apis.extend(apis)
+        self.funcs.extend(funcs)
+        if len(self.apis) >= self.batch_size or len(self.funcs) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.apis:
+            self.n_apis += save_api_calls(self.apis, self.batch_size)
+            self.apis = []
+        if self.funcs:
+            self.n_funcs += save_func_info(self.funcs, self.batch_size)
+            self.funcs = []
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-w', '--workers', help='number of worker processes', type=int, default=None)
+    arg_parser.add_argument('-t', '--timeout', help='per-repo timeout in seconds, 0 to disable', type=int, default=600)
+    arg_parser.add_argument('-g', '--grace', help='seconds past the timeout before a stuck worker is killed', type=int, default=30)
+    arg_parser.add_argument('-b', '--batch-size', help='rows per batched insert', type=int, default=5000)
+    arg_parser.add_argument('-c', '--concurrency', help='concurrent PyPI requests when resolving dependencies up front, 0 to resolve per repo in the workers', type=int, default=32)
+    args = arg_parser.parse_args()
+
+    folder_names = select_repo_folders(get_folders_in_directory(REPO_DATA_DIR), get_target_repo_names())
+    if args.concurrency > 0:
+        asyncio.run(resolve_dependencies([os.path.join(REPO_DATA_DIR, f) for f in folder_names], args.concurrency))
+        get_release_index().close()  # 不把打开的 SQLite 连接带进 fork 出的工作进程
+    writer = TaskWriter(args.batch_size)
+    failed = []
+
+    for folder_name, apis, funcs, error in tqdm(run_repos(folder_names, args.workers, args.timeout, args.grace), total=len(folder_names)):
+        if error:
             print(f'[Err] fail to handle {folder_name}')
-            print(f'\t{e}')
\ No newline at end of file
+            print(f'\t{error}')
+            failed.append(folder_name)
+            continue
+        writer.add(apis, funcs)
+    writer.flush()
+
+    print(f"{len(folder_names) - len(failed)}/{len(folder_names)} repos, "
+          f"{writer.n_apis} api_calls and {writer.n_funcs} func_task rows inserted")
+
+if __name__ == '__main__':
+    main()
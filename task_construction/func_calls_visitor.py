@@ -1,6 +1,6 @@
 import ast
 from collections import deque
-from arg_validity_checker import ArgumentsAnalyser, GlobalVariableDefFinder
+from arg_validity_checker import defined_names, get_varnames_in_call
 
 '''
 visit keyword arguments
@@ -92,37 +92,132 @@ class ReWriteRefNode(ast.NodeTransformer):
         self.generic_visit(node)
         return node
 
-def get_func_calls(code, tree):
-    # get intra file dependencies
-    arg_analyser, intra_file_deps = None, set()
-    if code:
-        arg_analyser = ArgumentsAnalyser(code)
-        finder = GlobalVariableDefFinder()
-        finder.visit(tree)
-        intra_file_deps = finder.defined_vars
-
-    func_calls = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Call):
-            call_visitor = FuncCallVisitor()
-            call_visitor.visit(node.func)
-
-            kw_visitor = KWVisitor()
-            try:
-                kw_visitor.visit(node)
+def full_attr_name(node):
+    """Name / Attribute 链 -> 完整的点分名称，其他节点返回 None"""
+    if isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Attribute):
+        return f"{full_attr_name(node.value)}.{node.attr}"
+    return None
+
+def call_name(call_node):
+    call_visitor = FuncCallVisitor()
+    call_visitor.visit(call_node.func)
+    return call_visitor.name
+
+def first_call_name(node):
+    """node 中（ast.walk 顺序）第一个调用的函数名，没有调用时返回 None"""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            return call_name(child)
+    return None
+
+def record_assign(node, class_obj, instance_to_class):
+    """单个 ast.Assign：记录 变量 -> 调用名（class_obj）与 实例 -> 类（instance_to_class）"""
+    name = first_call_name(node.value)
+    if name is not None and isinstance(node.targets[0], ast.Name):
+        class_obj[node.targets[0].id] = name
+
+    if isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Attribute):
+        # Case: x = some.module.ClassName()
+        full_name = full_attr_name(node.value.func)
+        if full_name and isinstance(node.targets[0], ast.Name):
+            instance_to_class[node.targets[0].id] = full_name
+    elif isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name):
+        # Case: x = ClassName() (when class was imported directly)
+        if node.value.func.id in class_obj:
+            instance_to_class[node.targets[0].id] = class_obj[node.value.func.id]
+
+def record_import(node, id2fullname):
+    """单个 import / from ... import：记录 别名 -> 完整名称"""
+    if isinstance(node, ast.Import):
+        for alias in node.names:
+            id2fullname[alias.asname or alias.name] = alias.name
+    elif isinstance(node, ast.ImportFrom) and node.module is not None:
+        for alias in node.names:
+            id2fullname[alias.asname or alias.name] = node.module + '.' + alias.name
+
+_DEF_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+class FileCallVisitor:
+    """
+    一次遍历同时得到原先需要分别遍历整棵树的结果：
+        calls                          所有 ast.Call：(名称, keyword, lineno, end_lineno, 实参中的变量名)
+        class_obj / instance_to_class  同 get_api_signatures.AssignVisitor
+        id2fullname                    同 get_api_signatures.get_api_ref_id（导入别名）
+        global_defs                    同 GlobalVariableDefFinder（函数与类之外定义的变量名）
+    用显式栈做前序遍历（深层嵌套的表达式不会触发 RecursionError），所在作用域与外层的调用随节点一起入栈：
+    keyword 直接记到所有外层调用上（同 KWVisitor，不进入 keyword 的值），不再为每个调用单独遍历子树。
+    calls 与导入按深度分桶，输出 / 覆盖顺序与 ast.walk 的广度优先顺序一致
+    """
+    def __init__(self, check_args=True):
+        self.check_args = check_args
+        self.class_obj = {}
+        self.instance_to_class = {}
+        self.global_defs = set()
+        self._calls = []    # 按深度分桶
+        self._imports = []
+
+    def visit(self, tree):
+        calls, imports = self._calls, self._imports
+        stack = [(tree, 0, False, ())]
+        while stack:
+            node, depth, in_def, outer_calls = stack.pop()
+            if not in_def:
+                self.global_defs.update(defined_names(node))
+
+            if isinstance(node, ast.Call):
                 lineno = getattr(node, "lineno", -1)
-                end_lineno = getattr(node, "end_lineno", lineno)
-                if code:
-                    # 找到 positional & keyword 中内容为 variable 的内容
-                    var_names = arg_analyser.get_varnames_in_args(node)
-        
-                    # 检查 variable 是否为 intra-File dependency
-                    if var_names.issubset(intra_file_deps):
-                        func_calls.append((call_visitor.name, kw_visitor.name, lineno, end_lineno))
-                    else:
-                        continue
-                else:
-                    func_calls.append((call_visitor.name, kw_visitor.name, lineno, end_lineno))
-            except:
-                func_calls.append((call_visitor.name, "", getattr(node, "lineno", -1), getattr(node, "end_lineno", -1)))
-    return func_calls
+                record = (call_name(node), [], lineno, getattr(node, "end_lineno", lineno),
+                          get_varnames_in_call(node) if self.check_args else None)
+                while len(calls) <= depth:
+                    calls.append([])
+                calls[depth].append(record)
+                outer_calls = outer_calls + (record,)
+            elif isinstance(node, ast.keyword):
+                if node.arg is not None:
+                    for record in outer_calls:
+                        record[1].append(node.arg)
+                outer_calls = ()
+            elif isinstance(node, ast.Assign):
+                record_assign(node, self.class_obj, self.instance_to_class)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                while len(imports) <= depth:
+                    imports.append([])
+                imports[depth].append(node)
+
+            if isinstance(node, _DEF_NODES):
+                in_def = True
+            children = list(ast.iter_child_nodes(node))
+            for child in reversed(children):
+                stack.append((child, depth + 1, in_def, outer_calls))
+        return self
+
+    @property
+    def id2fullname(self):
+        id2fullname = {}
+        for nodes in self._imports:
+            for node in nodes:
+                record_import(node, id2fullname)
+        return id2fullname
+
+    def func_calls(self, intra_file_deps=None):
+        """
+        get_func_calls 的返回格式 [(名称, keyword, lineno, end_lineno)]；check_args 时只保留实参变量
+        都是 intra-file dependency 的调用，intra_file_deps 为空时使用 global_defs
+        """
+        if intra_file_deps is None:
+            intra_file_deps = self.global_defs
+        func_calls = []
+        for records in self._calls:
+            for name, keywords, lineno, end_lineno, var_names in records:
+                if var_names is None or var_names.issubset(intra_file_deps):
+                    func_calls.append((name, ",".join(keywords), lineno, end_lineno))
+        return func_calls
+
+def get_func_calls(code, tree, intra_file_deps=None):
+    """
+    code 非空时检查实参中的变量是否都是 intra-file dependency（intra_file_deps 为空时取 tree 中的全局定义）
+    """
+    visitor = FileCallVisitor(check_args=bool(code)).visit(tree)
+    return visitor.func_calls(intra_file_deps)
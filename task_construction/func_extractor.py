@@ -1,24 +1,29 @@
 import ast
-from get_api_signatures import get_API_calls_from_funcnode
+from get_api_signatures import FileAnalysis, iter_file_analyses, get_API_calls_in_function
 
 class StrictTopLevelFunctionExtractor:
     def __init__(self):
         self.top_level_functions = []
     
-    def extract(self, file_path, package_version_dict, source_code=''):
-        """提取不包含嵌套函数的顶级函数"""
+    def extract(self, file_path, package_version_dict, source_code='', analysis=None):
+        """
+        提取不包含嵌套函数的顶级函数
+        analysis: 同一文件的 FileAnalysis（与 API-Level 提取共用），为空时按 source_code 或文件内容构建
+        """
         try:
-            self.is_eval = True
-            if not source_code:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    source_code = f.read()
-                self.is_eval = False
+            self.is_eval = bool(source_code)
+            if analysis is None:
+                analysis = FileAnalysis(file_path, source_code) if source_code else FileAnalysis.from_file(file_path)
+            if not analysis.strict_utf8:
+                raise UnicodeError(f"{file_path} is not valid utf-8")
+            if analysis.error is not None:
+                raise analysis.error
+            self.analysis = analysis
             self.file_path = file_path
-            self.code = source_code
+            self.code = analysis.code
             self.deps = package_version_dict
 
-            tree = ast.parse(source_code, filename=file_path)
-            self._analyze_module(tree)
+            self._analyze_module(analysis.tree)
             return self.top_level_functions
             
         except Exception as e:
@@ -61,9 +66,8 @@ class StrictTopLevelFunctionExtractor:
             or (body_lines<5 or body_lines>20):
             return None
 
-        # 提取所有 func Call
-        func_src   = ast.get_source_segment(self.code, node)
-        tpl_calls = get_API_calls_from_funcnode(func_src, self.code, self.file_path, self.deps)
+        # 提取所有 func Call（复用整个文件的语法树与 AssignVisitor / 导入别名，不再重新解析）
+        tpl_calls = get_API_calls_in_function(self.analysis, node, self.deps)
 
         if not tpl_calls: return None
         return {
@@ -74,30 +78,30 @@ class StrictTopLevelFunctionExtractor:
             'version': tpl_calls[0]['version'],
             'bg_off':  tpl_calls[0]['lineno'],
             'ed_off':  tpl_calls[0]['end_lineno'],
-            'src':     ast.get_source_segment(self.code, node) if self.is_eval else ''
+            'src':     self.analysis.segment(node) if self.is_eval else ''
         }
     
     def _get_func_header_linenum(self, node):
-        lines = ast.get_source_segment(self.code, node).split('\n')
+        lines = self.analysis.segment(node).split('\n')
         # 找到函数头的结束（通常是冒号所在行）
         for i, line in enumerate(lines):
             if line.strip().endswith(':'):
                 return i + 1
 
-def get_strict_top_level_functions(file_path, package_version_dict, source_code=''):
+def get_strict_top_level_functions(file_path, package_version_dict, source_code='', analysis=None):
     """
     获取所有不包含嵌套函数的顶级函数
     """
     extractor = StrictTopLevelFunctionExtractor()
-    return extractor.extract(file_path, package_version_dict, source_code)
+    return extractor.extract(file_path, package_version_dict, source_code, analysis)
 
 def get_all_funcnode_from_sources(sources, package_version_dict):
     all_funcnodes = []
-    for source in sources:
+    for analysis in iter_file_analyses(sources):
         try:
-            func_calls = get_strict_top_level_functions(source, package_version_dict)
+            func_calls = get_strict_top_level_functions(analysis.file_path, package_version_dict, analysis=analysis)
             all_funcnodes.extend(func_calls)
         except Exception as e:
-            print(f"[ERROR] {source}: {e}")
+            print(f"[ERROR] {analysis.file_path}: {e}")
             continue
     return all_funcnodes
\ No newline at end of file
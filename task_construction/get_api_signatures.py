@@ -1,6 +1,6 @@
-import os, ast
-from func_calls_visitor import get_func_calls
-from db import save_api_calls
+import os, ast, copy
+from func_calls_visitor import FileCallVisitor, get_func_calls, full_attr_name, record_assign, record_import
+from arg_validity_checker import ArgumentsAnalyser
 
 # 加载筛选目标
 target_tpl_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data_collection', 'rank.txt')
@@ -16,169 +16,163 @@ class AssignVisitor(ast.NodeVisitor):
         self.instance_to_class = {}
     
     def visit_Assign(self, node):
-        call_name = get_func_calls('', node.value)
-        if len(call_name) > 0 and isinstance(node.targets[0], ast.Name):
-            self.class_obj[node.targets[0].id] = call_name[0][0]
-        
-        if isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Attribute):
-            # Case: x = some.module.ClassName()
-            full_name = self.get_full_attr_name(node.value.func)
-            if full_name and isinstance(node.targets[0], ast.Name):
-                self.instance_to_class[node.targets[0].id] = full_name
-        elif isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name):
-            # Case: x = ClassName() (when class was imported directly)
-            if node.value.func.id in self.class_obj:
-                self.instance_to_class[node.targets[0].id] = self.class_obj[node.value.func.id]
-        
+        record_assign(node, self.class_obj, self.instance_to_class)
         return node
     
     def get_full_attr_name(self, node):
         """Helper to get full dotted name from an Attribute node"""
-        if isinstance(node, ast.Name):
-            return node.id
-        elif isinstance(node, ast.Attribute):
-            return f"{self.get_full_attr_name(node.value)}.{node.attr}"
-        return None
+        return full_attr_name(node)
 
 def get_api_ref_id(tree):
     id2fullname = {}
     for node in ast.walk(tree):
-        if isinstance(node, ast.Import):
-            items = [nn.__dict__ for nn in node.names]
-            for d in items:
-                if d['asname'] is None:
-                    id2fullname[d['name']] = d['name']
-                else:
-                    id2fullname[d['asname']] = d['name']
-        if isinstance(node, ast.ImportFrom) and node.module is not None:
-            items = [nn.__dict__ for nn in node.names]
-            for d in items:
-                if d['asname'] is None:
-                    id2fullname[d['name']] = node.module + '.' + d['name']
-                else:
-                    id2fullname[d['asname']] = node.module + '.' + d['name']
+        record_import(node, id2fullname)
     return id2fullname
 
-def get_API_calls(code, file_path, package_version_dict):
-    try:
-        tree = ast.parse(code, mode='exec')
-        for node in ast.walk(tree):
-            for child in ast.iter_child_nodes(node):
-                child.parent = node
-
-        visitor = AssignVisitor()
-        visitor.visit(tree)
-        class2obj = visitor.class_obj
-        instance2class = visitor.instance_to_class
-
-        func_calls_raw = get_func_calls(code, tree)
-        new_func_calls = []  
-        for name, param, lineno, end_lineno in func_calls_raw:
-            name_parts = name.split('.')
-            
-            # Case 1: Method call on known instance (e.g., y = linear(x))
-            if len(name_parts) == 1 and name in instance2class:
-                resolved_name = instance2class[name] + '.' + name
-                new_func_calls.append((resolved_name, param, lineno, end_lineno))
-            # Case 2: Direct API call through variable (original functionality)
-            elif name_parts[0] in class2obj and len(name_parts) == 2:
-                resolved_name = class2obj[name_parts[0]] + '.' + name_parts[1]
-                new_func_calls.append((resolved_name, param, lineno, end_lineno))
-            else:
-                new_func_calls.append((name, param, lineno, end_lineno))
-
-        id2fullname = get_api_ref_id(tree)
-        result = []
-        for name, kw, lineno, end_lineno in new_func_calls:
-            name_parts = name.split('.')
-            
-            if name_parts[0] in id2fullname:
-                full_name = id2fullname[name_parts[0]] + '.' + '.'.join(name_parts[1:])
-                prefix = id2fullname[name_parts[0]].split('.')[0].lower()
-            else:
-                full_name = name
-                prefix = name_parts[0].lower()
-
-            # 判断是否是指定 TPL 的方法
+class FileAnalysis:
+    """
+    单个源文件的共享分析结果，API-Level（get_API_calls）与 Function-Level（func_extractor）共用，
+    每个文件只读取、解析一次，并只用 FileCallVisitor 遍历一次语法树：
+        tree、func_calls（get_func_calls 的结果）、class2obj / instance2class（同 AssignVisitor）、
+        id2fullname（导入别名）、arg_analyser（源码只切分一次的 ArgumentsAnalyser，用于截取源码）
+    解析或分析出错时 tree 为 None，error 为对应的异常
+    """
+    def __init__(self, file_path, code, strict_utf8=True):
+        self.file_path = file_path
+        self.code = code
+        self.strict_utf8 = strict_utf8  # 文件能否按 utf-8 严格解码，Function-Level 只处理这类文件
+        self.tree = None
+        self.error = None
+        try:
+            tree = ast.parse(code, mode='exec')
+            visitor = FileCallVisitor(check_args=bool(code)).visit(tree)
+            self.func_calls = visitor.func_calls()
+            self.class2obj = visitor.class_obj
+            self.instance2class = visitor.instance_to_class
+            self.id2fullname = visitor.id2fullname
+            self.arg_analyser = ArgumentsAnalyser(code)
+            self.tree = tree
+        except Exception as e:
+            self.error = e
+
+    @classmethod
+    def from_file(cls, file_path):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        try:
+            code, strict_utf8 = data.decode('utf-8'), True
+        except UnicodeDecodeError:
+            code, strict_utf8 = data.decode('utf-8', errors='ignore'), False
+        # 与文本模式 open 相同的换行转换
+        return cls(file_path, code.replace('\r\n', '\n').replace('\r', '\n'), strict_utf8)
+
+    def segment(self, node):
+        """同 ast.get_source_segment(self.code, node)"""
+        return self.arg_analyser.get_source_segment(node)
+
+def iter_file_analyses(sources):
+    for source in sources:
+        try:
+            yield FileAnalysis.from_file(source)
+        except Exception as e:
+            print(f"[ERROR] {source}: {e}")
+
+def resolve_API_calls(func_calls_raw, class2obj, instance2class, id2fullname, file_path, package_version_dict, tpl_only=True):
+    """get_func_calls 的结果 -> 限定名与版本；tpl_only 时只保留目标 TPL 的调用"""
+    new_func_calls = []  
+    for name, param, lineno, end_lineno in func_calls_raw:
+        name_parts = name.split('.')
+        
+        # Case 1: Method call on known instance (e.g., y = linear(x))
+        if len(name_parts) == 1 and name in instance2class:
+            resolved_name = instance2class[name] + '.' + name
+            new_func_calls.append((resolved_name, param, lineno, end_lineno))
+        # Case 2: Direct API call through variable (original functionality)
+        elif name_parts[0] in class2obj and len(name_parts) == 2:
+            resolved_name = class2obj[name_parts[0]] + '.' + name_parts[1]
+            new_func_calls.append((resolved_name, param, lineno, end_lineno))
+        else:
+            new_func_calls.append((name, param, lineno, end_lineno))
+
+    result = []
+    for name, kw, lineno, end_lineno in new_func_calls:
+        name_parts = name.split('.')
+        
+        if name_parts[0] in id2fullname:
+            full_name = id2fullname[name_parts[0]] + '.' + '.'.join(name_parts[1:])
+            prefix = id2fullname[name_parts[0]].split('.')[0].lower()
+        else:
+            full_name = name
+            prefix = name_parts[0].lower()
+
+        # 判断是否是指定 TPL 的方法
+        if tpl_only:
             lib_name = full_name.split('.')[0]
             if not lib_name in target_tpls: continue
 
-            if len(name_parts) > 1 and name_parts[0] in instance2class:
-                class_parts = instance2class[name_parts[0]].split('.')
-                prefix = class_parts[0].lower()
-
-            version = package_version_dict.get(prefix, None)
-            result.append({
-                "api": full_name.rstrip('.'),
-                "file": file_path,
-                "lineno": lineno,
-                "end_lineno": end_lineno,
-                "version": version
-            })
-        return result
+        if len(name_parts) > 1 and name_parts[0] in instance2class:
+            class_parts = instance2class[name_parts[0]].split('.')
+            prefix = class_parts[0].lower()
+
+        version = package_version_dict.get(prefix, None)
+        result.append({
+            "api": full_name.rstrip('.'),
+            "file": file_path,
+            "lineno": lineno,
+            "end_lineno": end_lineno,
+            "version": version
+        })
+    return result
+
+def get_API_calls(code, file_path, package_version_dict, analysis=None):
+    """analysis 为同一文件的 FileAnalysis 时直接复用，不再重新解析"""
+    if analysis is None:
+        analysis = FileAnalysis(file_path, code)
+    if analysis.error is not None:
+        if isinstance(analysis.error, (SyntaxError, ValueError)):
+            return []
+        raise analysis.error
+
+    try:
+        return resolve_API_calls(analysis.func_calls, analysis.class2obj, analysis.instance2class, analysis.id2fullname,
+                                 file_path, package_version_dict)
     except (SyntaxError, ValueError):
         return []
 
+def get_API_calls_in_function(analysis, func_node, package_version_dict):
+    """
+    与 get_API_calls_from_funcnode(函数源码, 文件源码, ...) 结果相同（行号相对函数头，def 所在行为 1），
+    但直接使用 FileAnalysis 语法树中的模块级函数节点：不再为每个候选函数重新解析整个文件和函数源码
+    """
+    # 函数源码片段不含装饰器；单独解析函数源码时全局定义只有函数名本身
+    func_root = copy.copy(func_node)
+    func_root.decorator_list = []
+    func_calls_raw = get_func_calls(analysis.code, func_root, {func_node.name})
+
+    offset = func_node.lineno - 1
+    func_calls_raw = [(name, param, lineno - offset, end_lineno - offset) for name, param, lineno, end_lineno in func_calls_raw]
+    return resolve_API_calls(func_calls_raw, analysis.class2obj, analysis.instance2class, analysis.id2fullname,
+                             analysis.file_path, package_version_dict, tpl_only=False)
+
 """用于构建 function-level task: 从特定 function node 中提取 api"""
 def get_API_calls_from_funcnode(func_code, full_code, file_path, package_version_dict, class2obj=[], instance2class=[], id2fullname=[]):
     try:
         if full_code:
             tree = ast.parse(full_code, mode='exec')
-            for node in ast.walk(tree):
-                for child in ast.iter_child_nodes(node):
-                    child.parent = node
 
             # 根据整个文件
-            visitor = AssignVisitor()
-            visitor.visit(tree)
+            visitor = FileCallVisitor(check_args=False).visit(tree)
             class2obj = visitor.class_obj
             instance2class = visitor.instance_to_class
-            id2fullname = get_api_ref_id(tree)
+            id2fullname = visitor.id2fullname
         else: # eval func-level
             pass
 
         # 根据单个函数
         func_tree = tree = ast.parse(func_code, mode='exec')
         func_calls_raw = get_func_calls(func_code, func_tree)
-        new_func_calls = []  
-        for name, param, lineno, end_lineno in func_calls_raw:
-            name_parts = name.split('.')
-            
-            # Case 1: Method call on known instance (e.g., y = linear(x))
-            if len(name_parts) == 1 and name in instance2class:
-                resolved_name = instance2class[name] + '.' + name
-                new_func_calls.append((resolved_name, param, lineno, end_lineno))
-            # Case 2: Direct API call through variable (original functionality)
-            elif name_parts[0] in class2obj and len(name_parts) == 2:
-                resolved_name = class2obj[name_parts[0]] + '.' + name_parts[1]
-                new_func_calls.append((resolved_name, param, lineno, end_lineno))
-            else:
-                new_func_calls.append((name, param, lineno, end_lineno))
-
-        result = []
-        for name, kw, lineno, end_lineno in new_func_calls:
-            name_parts = name.split('.')
-            
-            if name_parts[0] in id2fullname:
-                full_name = id2fullname[name_parts[0]] + '.' + '.'.join(name_parts[1:])
-                prefix = id2fullname[name_parts[0]].split('.')[0].lower()
-            else:
-                full_name = name
-                prefix = name_parts[0].lower()
-
-            if len(name_parts) > 1 and name_parts[0] in instance2class:
-                class_parts = instance2class[name_parts[0]].split('.')
-                prefix = class_parts[0].lower()
-
-            version = package_version_dict.get(prefix, None)
-            result.append({
-                "api": full_name.rstrip('.'),
-                "file": file_path,
-                "lineno": lineno,
-                "end_lineno": end_lineno,
-                "version": version
-            })
-        return result
+        return resolve_API_calls(func_calls_raw, class2obj, instance2class, id2fullname,
+                                 file_path, package_version_dict, tpl_only=False)
     except (SyntaxError, ValueError):
         lines = func_code.splitlines()
 
@@ -203,13 +197,11 @@ Returns:
 """
 def get_all_call_apis_from_sources(sources, package_version_dict):
     all_call_apis = []
-    for source in sources:
+    for analysis in iter_file_analyses(sources):
         try:
-            with open(source, errors='ignore') as f:
-                code_text = f.read()
-            func_calls = get_API_calls(code_text, source, package_version_dict)
+            func_calls = get_API_calls(analysis.code, analysis.file_path, package_version_dict, analysis)
             all_call_apis.extend(func_calls)
         except Exception as e:
-            print(f"[ERROR] {source}: {e}")
+            print(f"[ERROR] {analysis.file_path}: {e}")
             continue
-    return all_call_apis
\ No newline at end of file
+    return all_call_apis
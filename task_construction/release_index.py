@@ -0,0 +1,310 @@
+"""
+本地 PyPI 发布时间索引：package -> [(upload_time, version)]，供 version_resolver.get_newest_tpl_version_before_date 使用
+
+原实现对每个仓库中每条未锁定版本的依赖都请求一次 PyPI JSON API，numpy 这类包会被请求上千次。
+现在每个包只请求一次，结果（包括找不到的包）写入 SQLite 文件 PYPI_RELEASE_INDEX，
+之后按 commit 日期在排好序的上传时间上二分查找；PYPI_OFFLINE=1 时只查本地索引，不访问网络。
+
+    python release_index.py prefetch [-c 32] [--refresh]          # 并发预取 rank.txt 中的所有包
+    python release_index.py export -o ../data/pypi_releases.jsonl # 导出快照
+    python release_index.py load -i ../data/pypi_releases.jsonl   # 从快照预置索引（之后可离线运行）
+    python release_index.py query numpy 2021-06-01
+"""
+import os, sys, re, json, time, random, sqlite3, asyncio, argparse
+import concurrent.futures
+from bisect import bisect_right
+from datetime import datetime
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from global_config import PYPI_RELEASE_INDEX, PYPI_OFFLINE
+
+USE_MIRROR = "https://pypi.tuna.tsinghua.edu.cn/pypi/{package_name}/json"
+NOT_MIRROR = "https://pypi.org/pypi/{package_name}/json"
+REQUEST_TIMEOUT = 30
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+RANK_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data_collection', 'rank.txt')
+
+_SCHEMA = [
+    # found = 0：PyPI 上不存在的包，同样记录下来避免重复请求
+    "CREATE TABLE IF NOT EXISTS packages (name TEXT PRIMARY KEY, found INTEGER NOT NULL, fetched_at TEXT NOT NULL)",
+    # ordinal：版本在 JSON "releases" 中的位置，上传时间相同时按原实现取靠前的版本
+    "CREATE TABLE IF NOT EXISTS releases (name TEXT NOT NULL, version TEXT NOT NULL, upload_time TEXT NOT NULL, "
+    "ordinal INTEGER NOT NULL, PRIMARY KEY (name, version))",
+]
+
+_UNKNOWN = object()
+
+
+def normalize_name(package_name):
+    """PEP 503：Foo.Bar / foo_bar / foo-bar 是同一个包"""
+    return re.sub(r"[-_.]+", "-", package_name).lower()
+
+
+def releases_from_json(data):
+    """PyPI JSON -> [(version, upload_time)]，按 "releases" 中的顺序；没有文件的版本忽略，上传时间取第一个文件的"""
+    releases = []
+    for version, files in data["releases"].items():
+        if not files:
+            continue
+        try:
+            upload_time = datetime.strptime(files[0]["upload_time"], TIME_FORMAT).strftime(TIME_FORMAT)
+        except (KeyError, TypeError, ValueError):
+            continue
+        releases.append((version, upload_time))
+    return releases
+
+
+def fetch_releases(package_name, url_template=None):
+    """
+    请求 PyPI JSON API，返回 [(version, upload_time)]；包不存在时返回 None。
+    网络错误、5xx、限流等暂时性错误抛出异常，调用方不应把它们记为"不存在"
+    """
+    url_template = url_template or USE_MIRROR or NOT_MIRROR
+    response = requests.get(url_template.format(package_name=package_name), timeout=REQUEST_TIMEOUT)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("releases"), dict):
+        return None
+    return releases_from_json(data)
+
+
+def cutoff_time(cutoff_date):
+    """'2021-6-1' -> '2021-06-01T00:00:00'，与原实现一样只比较到当天 0 点"""
+    return datetime.strptime(cutoff_date, "%Y-%m-%d").strftime(TIME_FORMAT)
+
+
+class ReleaseIndex:
+    def __init__(self, path=PYPI_RELEASE_INDEX, offline=PYPI_OFFLINE, url_template=None):
+        self.path = path
+        self.offline = offline
+        self.url_template = url_template
+        self._conn = None
+        self._pid = None
+        self._cache = {}  # name -> (upload_times, versions)，不存在的包为 None
+
+    def _connection(self):
+        # 进程池 fork 出的子进程不能沿用父进程的连接
+        if self._conn is None or self._pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+            self._pid = os.getpid()
+            self._cache = {}
+        return self._conn
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def known_packages(self):
+        return {row[0] for row in self._connection().execute("SELECT name FROM packages")}
+
+    def store(self, package_name, releases, commit=True):
+        """releases 为 fetch_releases 的结果，None 表示包不存在；覆盖该包已有的记录"""
+        name = normalize_name(package_name)
+        conn = self._connection()
+        conn.execute("DELETE FROM releases WHERE name=?", (name,))
+        conn.execute("INSERT OR REPLACE INTO packages (name, found, fetched_at) VALUES (?, ?, ?)",
+                     (name, int(releases is not None), datetime.now().strftime(TIME_FORMAT)))
+        if releases:
+            conn.executemany("INSERT OR REPLACE INTO releases (name, version, upload_time, ordinal) VALUES (?, ?, ?, ?)",
+                             [(name, version, upload_time, i) for i, (version, upload_time) in enumerate(releases)])
+        if commit:
+            conn.commit()
+        self._cache.pop(name, None)
+
+    def _load(self, name):
+        entry = self._cache.get(name, _UNKNOWN)
+        if entry is not _UNKNOWN:
+            return entry
+        conn = self._connection()
+        row = conn.execute("SELECT found FROM packages WHERE name=?", (name,)).fetchone()
+        if row is None:
+            return _UNKNOWN
+        entry = None
+        if row[0]:
+            # 上传时间升序；相同时 ordinal 小的排在后面，二分查找取到的是它
+            rows = conn.execute("SELECT upload_time, version FROM releases WHERE name=? "
+                                "ORDER BY upload_time, ordinal DESC", (name,)).fetchall()
+            entry = ([r[0] for r in rows], [r[1] for r in rows])
+        self._cache[name] = entry
+        return entry
+
+    def releases(self, package_name, fetch=True):
+        """
+        索引中的 ([upload_time], [version])，按上传时间升序；不存在的包返回 None。
+        索引中没有该包时请求一次 PyPI（offline 或 fetch=False 时按不存在处理）
+        """
+        name = normalize_name(package_name)
+        entry = self._load(name)
+        if entry is _UNKNOWN:
+            if self.offline or not fetch:
+                return None
+            try:
+                releases = fetch_releases(package_name, self.url_template)
+            except Exception as e:
+                print(f"[Err] Fail to fetch releases of {package_name}: {e}")
+                return None
+            self.store(package_name, releases)
+            entry = self._load(name)
+        return entry
+
+    def newest_before(self, package_name, cutoff_date, fetch=True):
+        """cutoff_date（%Y-%m-%d）当天 0 点及之前上传的最新版本，没有时返回 None"""
+        cutoff = cutoff_time(cutoff_date)
+        entry = self.releases(package_name, fetch)
+        if not entry:
+            return None
+        upload_times, versions = entry
+        i = bisect_right(upload_times, cutoff)
+        return versions[i - 1] if i else None
+
+    async def prefetch(self, package_names, concurrency=32, refresh=False, retries=3, backoff=1.0):
+        """
+        并发请求索引中还没有的包（refresh 时全部重新请求），返回 (fetched, not_found, failed)。
+        同时进行的请求不超过 concurrency 个；暂时性错误最多重试 retries 次，第 k 次重试前等待
+        backoff * 2^k 秒左右（带随机抖动，等待期间不占用并发名额）。
+        请求在线程中执行，结果回到事件循环所在线程后统一写入，SQLite 只有一个写者；offline 时不请求
+        """
+        if self.offline:
+            return 0, 0, 0
+        known = set() if refresh else self.known_packages()
+        todo, seen = [], set()
+        for package_name in package_names:
+            name = normalize_name(package_name)
+            if name not in known and name not in seen:
+                seen.add(name)
+                todo.append(package_name)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+        # 默认线程池最多 min(32, CPU 数 + 4) 个线程，会把更大的 concurrency 截断
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency))
+
+        async def fetch(package_name):
+            for attempt in range(retries + 1):
+                async with semaphore:
+                    try:
+                        releases = await loop.run_in_executor(executor, fetch_releases, package_name, self.url_template)
+                        return package_name, releases, None
+                    except Exception as e:
+                        error = e
+                if attempt < retries:
+                    await asyncio.sleep(backoff * 2 ** attempt * (1 + random.random()))
+            return package_name, None, error
+
+        fetched = not_found = failed = 0
+        try:
+            for i, future in enumerate(asyncio.as_completed([fetch(p) for p in todo]), 1):
+                package_name, releases, error = await future
+                if error is not None:
+                    print(f"[Err] Fail to fetch releases of {package_name}: {error}")
+                    failed += 1
+                    continue
+                self.store(package_name, releases, commit=False)
+                if releases is None:
+                    not_found += 1
+                else:
+                    fetched += 1
+                if i % 100 == 0:
+                    self._connection().commit()
+                    print(f"{i}/{len(todo)} packages")
+        finally:
+            executor.shutdown(wait=False)
+        self._connection().commit()
+        return fetched, not_found, failed
+
+    def export_jsonl(self, path):
+        """每行一个包：{"name", "found", "releases": [[version, upload_time]]}（按原 JSON 中的顺序）"""
+        conn = self._connection()
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for name, found in conn.execute("SELECT name, found FROM packages ORDER BY name").fetchall():
+                rows = conn.execute("SELECT version, upload_time FROM releases WHERE name=? ORDER BY ordinal",
+                                    (name,)).fetchall()
+                f.write(json.dumps({"name": name, "found": bool(found), "releases": [list(r) for r in rows]}) + '\n')
+                count += 1
+        return count
+
+    def load_jsonl(self, path):
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                releases = [tuple(r) for r in record["releases"]] if record.get("found", True) else None
+                self.store(record["name"], releases, commit=False)
+                count += 1
+        self._connection().commit()
+        return count
+
+
+_INDEX = None
+
+def get_release_index():
+    """按 global_config 配置的进程内共享索引"""
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = ReleaseIndex()
+    return _INDEX
+
+
+def read_rank_packages(rank_file=RANK_FILE):
+    with open(rank_file, 'r', encoding='utf-8') as f:
+        return [line.strip().split("@@")[1] for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--index', help='index path', type=str, default=PYPI_RELEASE_INDEX)
+    sub_parsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    p = sub_parsers.add_parser('prefetch', help='fetch release times of all packages in rank.txt')
+    p.add_argument('-r', '--rank', help='package list (rank@@name per line)', type=str, default=RANK_FILE)
+    p.add_argument('-c', '--concurrency', help='concurrent requests', type=int, default=32)
+    p.add_argument('--refresh', help='refetch packages already in the index', action='store_true')
+    p.add_argument('--retries', help='retries per package on transient errors', type=int, default=3)
+
+    p = sub_parsers.add_parser('export', help='dump the index to a JSON-lines snapshot')
+    p.add_argument('-o', '--output', type=str, default=os.path.join(os.path.dirname(PYPI_RELEASE_INDEX), 'pypi_releases.jsonl'))
+
+    p = sub_parsers.add_parser('load', help='seed the index from a JSON-lines snapshot')
+    p.add_argument('-i', '--input', type=str, default=os.path.join(os.path.dirname(PYPI_RELEASE_INDEX), 'pypi_releases.jsonl'))
+
+    p = sub_parsers.add_parser('query', help='newest version uploaded before a date')
+    p.add_argument('package', type=str)
+    p.add_argument('date', type=str, help='%%Y-%%m-%%d')
+
+    args = arg_parser.parse_args()
+    with ReleaseIndex(args.index) as index:
+        if args.command == 'prefetch':
+            start = time.time()
+            fetched, not_found, failed = asyncio.run(index.prefetch(read_rank_packages(args.rank), args.concurrency, args.refresh, args.retries))
+            print(f"fetched {fetched}, not found {not_found}, failed {failed} in {time.time() - start:.1f}s")
+        elif args.command == 'export':
+            print(f"Exported {index.export_jsonl(args.output)} packages to {args.output}")
+        elif args.command == 'load':
+            print(f"Loaded {index.load_jsonl(args.input)} packages into {args.index}")
+        else:
+            print(index.newest_before(args.package, args.date))
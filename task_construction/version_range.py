@@ -0,0 +1,104 @@
+"""
+版本约束解析：把 (package, 约束) 解析为知识库（top_level）中实际入库的版本列表。
+
+    resolver = VersionRangeResolver()
+    resolver.resolve('numpy', '>=1.20,<1.22')     # ['1.20.0', '1.20.1', '1.21.0', ...]
+    resolver.resolve_many([('numpy', '==1.21.0'), ('sklearn', '~~1.0.2'), ...])
+
+package 既可以是 PyPI 包名，也可以是 top_level 中的导入名（如 scikit-learn / sklearn）。
+约束写法与 api_calls.version 一致：'~~X'（未声明版本时按 commit 日期推断的版本）视为 '==X'，
+空约束返回全部版本。每个包的有序版本列表只从数据库加载一次。
+"""
+import os, sys
+import contextlib
+
+from packaging.version import parse as parse_version, InvalidVersion
+from packaging.specifiers import SpecifierSet, InvalidSpecifier
+from packaging.utils import canonicalize_name
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from db_backend import get_backend
+
+
+def normalize_spec(constrain_str):
+    constrain_str = (constrain_str or '').strip()
+    if constrain_str.startswith('~~'):
+        constrain_str = '==' + constrain_str[2:]
+    return constrain_str
+
+
+class VersionRangeResolver:
+    def __init__(self, conn=None, batch_size=500):
+        """conn 为空时使用 global_config 中配置的后端"""
+        self.conn = conn
+        self.batch_size = batch_size
+        self._versions = {}  # canonical name -> [(Version, version_str)]，按版本升序
+        self._loaded = set()
+        self._results = {}   # (package, spec) -> [version_str]
+
+    def _connection(self):
+        if self.conn is None:
+            return get_backend().get_connection()
+        return contextlib.nullcontext(self.conn)
+
+    def load(self, packages):
+        """一次查询加载多个包的版本列表，已加载的包跳过"""
+        packages = {p for p in packages if p and canonicalize_name(p) not in self._loaded}
+        if not packages:
+            return
+        raw = {canonicalize_name(p): set() for p in packages}
+        # top_level 中的包名未规范化，原名与规范化名都参与匹配，再在内存中按规范化名归并
+        names = sorted(packages | set(raw))
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                for i in range(0, len(names), self.batch_size):
+                    batch = names[i:i + self.batch_size]
+                    placeholders = ', '.join(['%s'] * len(batch))
+                    cursor.execute(f"""
+                        SELECT package_name, package_version, top_level FROM top_level
+                        WHERE package_name IN ({placeholders}) OR top_level IN ({placeholders})
+                    """, batch * 2)
+                    for package_name, version, top_level in cursor.fetchall():
+                        for name in (canonicalize_name(package_name), canonicalize_name(top_level or '')):
+                            if name in raw:
+                                raw[name].add(version)
+
+        for name, versions in raw.items():
+            parsed = []
+            for version in versions:
+                try:
+                    parsed.append((parse_version(version), version))
+                except InvalidVersion:
+                    continue
+            parsed.sort()
+            self._versions[name] = parsed
+            self._loaded.add(name)
+
+    def versions(self, package):
+        """包在知识库中的全部版本，按版本升序"""
+        self.load([package])
+        return [v for _, v in self._versions.get(canonicalize_name(package), [])]
+
+    def resolve(self, package, constrain_str):
+        """返回满足约束的已入库版本（升序）；约束无法解析时返回空列表"""
+        spec = normalize_spec(constrain_str)
+        key = (canonicalize_name(package), spec)
+        if key in self._results:
+            return self._results[key]
+
+        self.load([package])
+        try:
+            spec_set = SpecifierSet(spec)
+        except InvalidSpecifier:
+            result = []
+        else:
+            result = [v for parsed, v in self._versions.get(key[0], [])
+                      if spec_set.contains(parsed, prereleases=True)]
+        self._results[key] = result
+        return result
+
+    def resolve_many(self, pairs):
+        """批量解析 [(package, 约束)]，所有包的版本列表一次性加载；返回与输入等长的结果列表"""
+        pairs = list(pairs)
+        self.load({package for package, _ in pairs})
+        return [self.resolve(package, constrain_str) for package, constrain_str in pairs]
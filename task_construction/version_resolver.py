@@ -1,8 +1,8 @@
 """
 BUG: 'utf-8' codec can't decode byte 0xff in position 0: invalid start byte
 """
-import os, re, ast, toml, pickle, configparser, argparse, requests
-from datetime import datetime
+import os, re, ast, toml, pickle, asyncio, configparser, argparse
+from release_index import get_release_index, normalize_name
 
 COMMIT_DATE = None
 
@@ -29,31 +29,20 @@ def get_commit_date(repo_name, commit_sha):
     if commit_sha != repo_info[2]: print(f'{commit_sha} => {repo_info[2]}')
     return repo_info[3]
 
-USE_MIRROR = "https://pypi.tuna.tsinghua.edu.cn/pypi/{package_name}/json"
-NOT_MIRROR = "https://pypi.org/pypi/{package_name}/json"
 def get_newest_tpl_version_before_date(package_name, cutoff_date):
-    url = USE_MIRROR.format(package_name=package_name) if USE_MIRROR else\
-          NOT_MIRROR.format(package_name=package_name)
-    response = requests.get(url)
-
-    try:
-        data = response.json()
-    except Exception:
-        return None # 找不到 TPL
-    
-    cutoff = datetime.strptime(cutoff_date, "%Y-%m-%d")
-    versions = []
-    
-    for version, files in data["releases"].items():
-        if files:  # 忽略没有文件的版本
-            upload_time = datetime.strptime(files[0]["upload_time"], "%Y-%m-%dT%H:%M:%S")
-            if upload_time <= cutoff:
-                versions.append((version, upload_time))
-    
-    versions.sort(key=lambda x: x[1], reverse=True)
-    return versions[0][0] if versions else None
-
-def parse_requirement_line(line: str):
+    """
+    cutoff_date 当天 0 点及之前上传的最新版本，找不到 TPL 时返回 None
+    查本地发布时间索引（release_index.py），索引中没有的包才请求一次 PyPI 并写入索引
+    """
+    return get_release_index().newest_before(package_name, cutoff_date)
+
+def resolve_unpinned(package, commit_date, fetch=True):
+    """无版本说明的依赖 -> (package, '~~<commit 日期前最新版本>')，找不到时版本说明为空"""
+    pkg_version = get_release_index().newest_before(package, commit_date, fetch)
+    return (package, f'~~{pkg_version}') if pkg_version else (package, '')
+
+def parse_requirement_line(line: str, resolve=True):
+    """resolve=False 时无版本说明的依赖返回 (package, None)，之后由 resolve_dependencies 统一解析"""
     line = line.strip()
     if not line or line.startswith('#'):
         return None
@@ -66,11 +55,12 @@ def parse_requirement_line(line: str):
     version_spec = version_spec.strip()
     if version_spec.startswith(('==', '>=', '<=', '>', '<', '~=', '!=')):
         return (package, version_spec)
+    elif not resolve:
+        return (package, None)
     else: # 无版本说明
-        pkg_version = get_newest_tpl_version_before_date(package, COMMIT_DATE)
-        return (package, f'~~{pkg_version}') if pkg_version else (package, '')
+        return resolve_unpinned(package, COMMIT_DATE)
 
-def parse_pyproject_toml(filepath):
+def parse_pyproject_toml(filepath, resolve=True):
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             text = f.read()
@@ -89,10 +79,10 @@ def parse_pyproject_toml(filepath):
             deps |= set(optional_dep_group)
     except KeyError: pass
     
-    deps = [parse_requirement_line(line) for line in list(deps) if line]
+    deps = [parse_requirement_line(line, resolve) for line in list(deps) if line]
     return deps
 
-def parse_requirements_txt(filepath):
+def parse_requirements_txt(filepath, resolve=True):
     _SKIP_LINE = "#-_`"
     def _clean_req_line(line: str) -> str:
         pattern =  r"^([^#;@\\]+)"
@@ -111,18 +101,18 @@ def parse_requirements_txt(filepath):
                 if not line or line[0] in _SKIP_LINE: continue
                 if line.startswith("pip install"):
                     for dep in line[12:].split(' '):
-                        deps.append(parse_requirement_line(dep))
+                        deps.append(parse_requirement_line(dep, resolve))
                     continue
                 if line.startswith('git+'): 
-                    deps.append(parse_requirement_line(line[4:]))
+                    deps.append(parse_requirement_line(line[4:], resolve))
                     continue
                 match = re.search(r"(.+?)=(.+?)=(.+)", line)
                 if match: # conda 格式的 requirement
-                    deps.append(parse_requirement_line(match.group(1)))
+                    deps.append(parse_requirement_line(match.group(1), resolve))
                     continue
                 line = re.sub(r"\+.*$", "", line)  
                 try:
-                    deps.append(parse_requirement_line(line))
+                    deps.append(parse_requirement_line(line, resolve))
                 except Exception as e:
                     print(f"[Err] fail to parse line: '{line}', {e}")
                     exit(0)
@@ -130,7 +120,7 @@ def parse_requirements_txt(filepath):
         print(f"Fail to parse [{filepath}], {e}")
     return deps
 
-def parse_setup_py(filepath):
+def parse_setup_py(filepath, resolve=True):
     with open(filepath, 'r', encoding='utf-8') as f:
         tree = ast.parse(f.read(), filename=filepath)
     class FindInstallRequires(ast.NodeVisitor):
@@ -144,27 +134,27 @@ def parse_setup_py(filepath):
                         if isinstance(kw.value, (ast.List, ast.Tuple)):
                             for elt in kw.value.elts:
                                 if isinstance(elt, ast.Str):
-                                    parsed = parse_requirement_line(elt.s)
+                                    parsed = parse_requirement_line(elt.s, resolve)
                                     if parsed:
                                         self.requires.append(parsed)
                     elif kw.arg == 'extras_require':
                         if isinstance(kw.value, ast.Dict): 
                             for elt in kw.value.keys:
-                                parsed = parse_requirement_line(elt.value)
+                                parsed = parse_requirement_line(elt.value, resolve)
                                 if parsed:
                                         self.requires.append(parsed)
     finder = FindInstallRequires()
     finder.visit(tree)
     return finder.requires
 
-def parse_setup_cfg(filepath):
+def parse_setup_cfg(filepath, resolve=True):
     config = configparser.ConfigParser()
     config.read(filepath)
     deps = []
     if config.has_section('options') and config.has_option('options', 'install_requires'):
         requires = config.get('options', 'install_requires').splitlines()
         for line in requires:
-            parsed = parse_requirement_line(line)
+            parsed = parse_requirement_line(line, resolve)
             if parsed:
                 deps.append(parsed)
     return deps
@@ -182,44 +172,82 @@ def find_dependency_files(project_dir):
 
     return setup_files, requirements_files
 
-def get_all_dependencies(project_dir) -> list:
+def load_cached_dependencies(project_dir):
     pkl_path = os.path.join(project_dir, 'dep_version.pkl')
-    
     try:
         with open(pkl_path, 'rb') as f:
-            all_deps = pickle.load(f)
-        return all_deps
-    except Exception as e: pass
+            return pickle.load(f)
+    except Exception as e:
+        return None
 
-    global COMMIT_DATE
+def get_repo_commit_date(project_dir):
     repo_name, commit_sha = os.path.basename(os.path.normpath(project_dir)).rsplit("-", 1)
-    COMMIT_DATE = get_commit_date(repo_name, commit_sha)
-    if COMMIT_DATE is None: return []
+    return get_commit_date(repo_name, commit_sha)
 
+def collect_dependencies(project_dir, resolve=True):
+    """解析仓库顶层的依赖文件；resolve=False 时无版本说明的依赖为 (package, None)"""
     setup_files, requirements_files = find_dependency_files(project_dir)
     all_deps = []
     for file in setup_files:
         if file.endswith('setup.py'):
-            deps = parse_setup_py(file)
+            deps = parse_setup_py(file, resolve)
             print(f"[setup.py] {file} -> {deps}")
             all_deps.extend(deps)
         elif file.endswith('setup.cfg'):
-            deps = parse_setup_cfg(file)
+            deps = parse_setup_cfg(file, resolve)
             print(f"[setup.cfg] {file} -> {deps}")
             all_deps.extend(deps)
 
     for file in requirements_files:
         if file.endswith('txt'):
-            deps = parse_requirements_txt(file)
+            deps = parse_requirements_txt(file, resolve)
             print(f"[requirements.txt] {file} -> {deps}")
         elif file.endswith('toml'):
-            deps = parse_pyproject_toml(file)
+            deps = parse_pyproject_toml(file, resolve)
             print(f"[pyproject.toml] {file} -> {deps}")
         all_deps.extend(deps)
-
-    # Serialize
-    with open(pkl_path, 'wb') as f:
-        pickle.dump(all_deps, f)
-
     return all_deps
 
+async def resolve_dependencies(project_dirs, concurrency=32, retries=3, backoff=1.0):
+    """
+    批量解析多个仓库的依赖，返回 {project_dir: deps}（与 get_all_dependencies 的结果相同，并同样写入 dep_version.pkl）：
+        1. 解析所有仓库的依赖文件，汇总无版本说明的包名（已有 dep_version.pkl 的仓库直接读取）
+        2. 对发布时间索引中还没有的包并发请求 PyPI（ReleaseIndex.prefetch：有界信号量 + 重试退避），每个包只请求一次
+        3. 按各仓库的 commit 日期在本地索引中查找版本
+    """
+    results, pending = {}, {}
+    for project_dir in project_dirs:
+        cached = load_cached_dependencies(project_dir)
+        if cached is not None:
+            results[project_dir] = cached
+            continue
+        commit_date = get_repo_commit_date(project_dir)
+        if commit_date is None:
+            results[project_dir] = []
+            continue
+        pending[project_dir] = (commit_date, collect_dependencies(project_dir, resolve=False))
+
+    index = get_release_index()
+    unpinned = [dep[0] for _, deps in pending.values() for dep in deps if dep and dep[1] is None]
+    if unpinned:
+        fetched, not_found, failed = await index.prefetch(unpinned, concurrency, retries=retries, backoff=backoff)
+        print(f"[INFO] {len(set(unpinned))} unpinned packages: fetched {fetched}, not found {not_found}, failed {failed}")
+    known = index.known_packages()
+
+    for project_dir, (commit_date, deps) in pending.items():
+        # 预取失败的包不再逐个同步重试，按找不到处理；这样的仓库不写 dep_version.pkl，下次运行时重新解析
+        all_deps, complete = [], True
+        for dep in deps:
+            if dep and dep[1] is None:
+                complete = complete and normalize_name(dep[0]) in known
+                dep = resolve_unpinned(dep[0], commit_date, fetch=False)
+            all_deps.append(dep)
+        if complete:
+            with open(os.path.join(project_dir, 'dep_version.pkl'), 'wb') as f:
+                pickle.dump(all_deps, f)
+        results[project_dir] = all_deps
+    return results
+
+def get_all_dependencies(project_dir) -> list:
+    # 先解析全部依赖文件，再并发解析其中无版本说明的依赖
+    return asyncio.run(resolve_dependencies([project_dir]))[project_dir]